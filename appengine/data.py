@@ -0,0 +1,118 @@
+"""Loads the extracted factorio data used by the webapp."""
+
+import json
+import logging
+import os.path
+
+from factorio import recipe
+from factorio import recipe_database
+from factorio import snapshot
+
+from appengine import icons
+
+
+def load(data_directory_path, check_snapshot=False):
+    """Loads and publishes the factorio data.
+
+    Args:
+        data_directory_path: The path of the factorio-data directory. Must be
+            relative to the directory containing app.yaml.
+        check_snapshot: See build_database.
+    """
+    recipe_database.publish(
+        build_database(data_directory_path, check_snapshot))
+
+
+def build_database(data_directory_path, check_snapshot=False):
+    """Returns a RecipeDatabase, preferring a snapshot if one exists.
+
+    A snapshot is ignored if it cannot be read e.g. because it was written by
+    an older version of factorio.snapshot.
+
+    Args:
+        data_directory_path: The path of the factorio-data directory. Must be
+            relative to the directory containing app.yaml.
+        check_snapshot: If True, a snapshot is also ignored if any of the
+            files that it was created from are newer than it e.g. because
+            they were modified while the server was running (see
+            reloader.py). The check stats every icon so it should only be
+            made when the data can change; extract_factorio_data.py never
+            leaves a snapshot that is older than its sources.
+    """
+    snapshot_path = os.path.join(data_directory_path,
+                                 snapshot.SNAPSHOT_FILE_NAME)
+    if check_snapshot:
+        use_snapshot = is_snapshot_current(data_directory_path, snapshot_path)
+    else:
+        use_snapshot = os.path.exists(snapshot_path)
+    if use_snapshot:
+        try:
+            return build_database_from_snapshot(snapshot_path)
+        except ValueError as e:
+            logging.warning('Ignoring snapshot %r: %s', snapshot_path, e)
+    return build_database_from_json(data_directory_path)
+
+
+def _get_source_paths(data_directory_path):
+    """Yields the paths of the files and directories that a snapshot is
+    created from."""
+    yield os.path.join(data_directory_path, 'recipes.json')
+    yield os.path.join(data_directory_path, 'names.json')
+    icons_path = os.path.join(data_directory_path, 'icons')
+    # The directory is included so that deleted icons are noticed.
+    yield icons_path
+    for root, _, file_names in os.walk(icons_path):
+        for file_name in file_names:
+            yield os.path.join(root, file_name)
+
+
+def get_newest_source_mtime(data_directory_path):
+    """Returns the newest modification time of the files that a snapshot is
+    created from, or None if none of them exist.
+
+    Args:
+        data_directory_path: The path of the factorio-data directory.
+    """
+    newest_mtime = None
+    for path in _get_source_paths(data_directory_path):
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:  # The sources are not deployed with the snapshot.
+            continue
+        if newest_mtime is None or mtime > newest_mtime:
+            newest_mtime = mtime
+    return newest_mtime
+
+
+def is_snapshot_current(data_directory_path, snapshot_path):
+    """Returns True if a snapshot exists and is not older than its sources.
+
+    Args:
+        data_directory_path: The path of the factorio-data directory.
+        snapshot_path: The path of the snapshot file.
+    """
+    try:
+        snapshot_mtime = os.path.getmtime(snapshot_path)
+    except OSError:
+        return False
+    newest_source_mtime = get_newest_source_mtime(data_directory_path)
+    return newest_source_mtime is None or newest_source_mtime <= snapshot_mtime
+
+
+def build_database_from_snapshot(snapshot_path):
+    """Returns a RecipeDatabase loaded from a snapshot file."""
+    return recipe_database.create_database_from_snapshot(
+        snapshot.read_snapshot(snapshot_path))
+
+
+def build_database_from_json(data_directory_path):
+    """Returns a RecipeDatabase loaded from JSON and the icon directory."""
+    with open(os.path.join(data_directory_path, 'names.json'), 'r') as f:
+        names_json = json.load(f)
+    with open(os.path.join(data_directory_path, 'recipes.json'), 'r') as f:
+        recipe_tables = recipe.Recipe.recipe_tables_from_json(f)
+    return recipe_database.create_database(
+        recipe_tables=recipe_tables,
+        names=names_json,
+        icons=icons.build_manifest(
+            os.path.join(data_directory_path, 'icons')))
@@ -2,34 +2,64 @@
 
 import os.path
 
-_NAME_TO_ICON = {}
+from factorio import recipe_database
 
 def init(icon_directory_path):
     """Initializes the factorio icon manager.
 
+    The icons replace those in the current
+    factorio.recipe_database.RecipeDatabase.
+
     Args:
         icon_directory_path: The path of the factorio-data icon directory. Must
                 be relative to the directory containing app.yaml.
     """
+    init_from_manifest(build_manifest(icon_directory_path))
+
+def init_from_manifest(manifest):
+    """Initializes the factorio icon manager from a manifest.
+
+    The icons replace those in the current
+    factorio.recipe_database.RecipeDatabase.
+
+    Args:
+        manifest: A dictionary mapping item names to icon URLs, as returned by
+            build_manifest.
+    """
+    recipe_database.publish(
+        recipe_database.get_current().with_icons(manifest))
+
+def build_manifest(icon_directory_path, app_directory_path=os.curdir):
+    """Returns a dictionary mapping item names to icon URLs.
+
+    Args:
+        icon_directory_path: The path of the factorio-data icon directory.
+        app_directory_path: The path of the directory containing app.yaml.
+    """
+    manifest = {}
     for root, _, file_names in os.walk(icon_directory_path):
         for file_name in file_names:
             item_name = os.path.splitext(file_name)[0]
-            _NAME_TO_ICON[item_name] = (
-                '/' + os.path.relpath(os.path.join(root, file_name)))
+            manifest[item_name] = '/' + os.path.relpath(
+                os.path.join(root, file_name), app_directory_path)
+    return manifest
 
-def get_icon_for_item(name):
+def get_icon_for_item(name, database=None):
     """Return the url of the best icon for the given icon or recipe name.
 
     Args:
         name: The name of a factorio item (e.g. 'iron-gear-wheel' or recipe
             (e.g. 'basic-oil-processing').
+        database: The factorio.recipe_database.RecipeDatabase to use or None to
+            use the current one.
 
     Returns:
         A URL refering to the icon of the requested item (e.g.
         '/factorio-data/icons/assembling-machine-3.png') or a default icon if
         no icon could be found.
     """
-    if name in _NAME_TO_ICON:
-        return _NAME_TO_ICON[name]
+    database = database or recipe_database.get_current()
+    if name in database.icons:
+        return database.icons[name]
     else:
         return '/img/missing-item.png'
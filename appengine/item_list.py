@@ -0,0 +1,72 @@
+"""The list of produceable items shown in the planner's item selectors.
+
+The list is the same for every request that uses the same RecipeDatabase so
+it is built once per database and served as a JavaScript asset whose URL
+contains a hash of its content. Browsers can then cache it indefinitely and
+pages only need to reference it, rather than repeating every item in every
+selector.
+"""
+
+import hashlib
+import json
+
+from factorio import names
+from factorio import recipe
+
+# The path prefix of item list assets. Must match the route in main.py.
+URL_PREFIX = '/items/'
+
+
+class Item(object):
+    """An item that can be selected for production."""
+
+    __slots__ = ('name', 'username')
+
+    def __init__(self, name, username):
+        self.name = name
+        self.username = username
+
+
+class ItemList(object):
+    """The produceable items of a RecipeDatabase.
+
+    Attributes:
+        items: A list of Items sorted by their English names.
+        script: The encoded JavaScript asset, which assigns a list of
+            [<name>, <username>] pairs to the global variable ITEMS.
+        content_hash: A hash of script.
+        url: The URL of the asset.
+    """
+
+    def __init__(self, database):
+        """Initialize the list.
+
+        Args:
+            database: The factorio.recipe_database.RecipeDatabase to list the
+                items of.
+        """
+        self.items = sorted(
+            [Item(result, names.get_best_item_name(result, database))
+             for result in recipe.Recipe.get_results(database)],
+            key=lambda item: item.username)
+        self.script = ('var ITEMS = %s;\n' % json.dumps(
+            [[item.name, item.username] for item in self.items],
+            separators=(',', ':'))).encode('utf-8')
+        self.content_hash = hashlib.sha1(self.script).hexdigest()
+        self.url = '%s%s.js' % (URL_PREFIX, self.content_hash)
+
+
+_database_and_item_list = (None, None)
+
+
+def get_item_list(database):
+    """Returns the ItemList for a RecipeDatabase.
+
+    The list is only built once for the most recently used database.
+    """
+    global _database_and_item_list
+    last_database, item_list = _database_and_item_list
+    if database is not last_database:
+        item_list = ItemList(database)
+        _database_and_item_list = (database, item_list)
+    return item_list
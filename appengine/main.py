@@ -1,71 +1,311 @@
-import os.path
+import json
+import logging
+import os
 import sys
 
-import jinja2
 import webapp2
 
 from factorio import recipe
+from factorio import recipe_database
 from factorio import names
 
+from appengine import item_list
+from appengine import plan_template
 from appengine import produced_item
+from appengine import response_cache
+from appengine import templates
+from appengine import timing
+from appengine import warmup
 
 
 MAX_PRODUCTION_RATE = 10000.0
 MIN_PRODUCTION_RATE = 0.01
+MAX_PLANS_PER_REQUEST = 1000
+# Pages for plans with at least this many items are written while the plan
+# is being calculated. The python27 runtime buffers the whole response before
+# sending it, so streaming is disabled there and only helps when the app is
+# served by a WSGI server that sends responses as they are written.
+STREAM_LARGE_PLANS = not os.environ.get('SERVER_SOFTWARE', '').startswith(
+    'Google App Engine/')
+MIN_STREAMED_PLAN_SIZE = 200
 
-JINJA_ENVIRONMENT = jinja2.Environment(
-    loader=jinja2.FileSystemLoader(os.path.dirname(__file__)),
-    extensions=['jinja2.ext.autoescape'],
-    undefined=jinja2.StrictUndefined,
-    autoescape=True)
+# The plans solved and cached when an instance is warmed up.
+WARMUP_REQUESTS = warmup.DEFAULT_POPULAR_REQUESTS
 
-def get_selected_items(requirements):
+RESPONSE_CACHE = response_cache.ResponseCache()
+PLAN_TEMPLATES = plan_template.PlanTemplateCache()
+
+def get_selected_items(requirements, database):
     class SelectedItem(object):
         def __init__(self, name, rate):
             self.name = name
-            self.username = names.get_best_item_name(name)
+            self.username = names.get_best_item_name(name, database)
             self.rate = rate
 
     return sorted(
         [SelectedItem(name, rate) for (name, rate) in requirements],
         key=lambda selected_item: selected_item.username)
 
-def get_produceable_items():
-    class Item(object):
-        def __init__(self, name):
-            self.name = name
-            self.username = names.get_best_item_name(name)
+def get_requirements(items_and_rates):
+    """Returns the requested items and their clamped production rates.
 
-    return sorted(
-        [Item(result) for result in recipe.Recipe.get_results()],
-        key=lambda item: item.username)
+    Args:
+        items_and_rates: A sequence of 2-tuples (<item>, <rate>) where <rate>
+            is a number or a string. Rates that are not numbers are treated
+            as 1.
+    """
+    requirements = []
+    for item, rate in items_and_rates:
+        try:
+            rate = float(rate)
+        except (TypeError, ValueError):
+            rate = 1.0
+
+        rate = min(MAX_PRODUCTION_RATE, max(MIN_PRODUCTION_RATE, rate))
+        requirements.append((item, rate))
+    return requirements
+
+
+def get_template_values(requirements, database, products):
+    return {
+        'item_list_url': item_list.get_item_list(database).url,
+        'products': products,
+        'selected_items': get_selected_items(requirements, database),
+    }
+
+
+def render_page(requirements, database):
+    """Returns the encoded planner page for the given requirements."""
+    products = PLAN_TEMPLATES.get_produced_items(requirements, database)
+    with timing.stage('render'):
+        template = templates.get_template('main.html')
+        return template.render(
+            get_template_values(requirements, database, products)).encode(
+                'utf-8')
+
+
+def cache_page(requirements, database):
+    """Renders the planner page and adds it to the response cache."""
+    return RESPONSE_CACHE.put(response_cache.canonical_key(requirements),
+                              database,
+                              render_page(requirements, database))
+
+
+class TimedRequestHandler(webapp2.RequestHandler):
+    """A handler that reports the time taken by each stage of its requests.
 
+    When timing is enabled (see appengine.timing), the times are sent in the
+    Server-Timing header, including on responses to aborted requests, and
+    added to the statistics shown by /debug/stats.
+    """
 
-class MainPage(webapp2.RequestHandler):
+    def dispatch(self):
+        timer = timing.start_request()
+        if timer is None:
+            return super(TimedRequestHandler, self).dispatch()
+        try:
+            return super(TimedRequestHandler, self).dispatch()
+        except webapp2.HTTPException as e:
+            # The exception raised by abort() is sent instead of
+            # self.response.
+            e.headers['Server-Timing'] = timer.get_server_timing()
+            raise
+        finally:
+            self.response.headers['Server-Timing'] = timer.get_server_timing()
+            timing.finish_request(timer)
+
+
+class MainPage(TimedRequestHandler):
+
+    def _should_stream(self, requirements, database):
+        """Returns True if the page should be written while it is planned.
+
+        Plans with a cached template are quick to render so the size of the
+        plan is only found, by walking the recipe graph, for new plans.
+        """
+        item_names = [item for item, _ in requirements]
+        return (STREAM_LARGE_PLANS and
+                not PLAN_TEMPLATES.has_template(item_names, database) and
+                database.compiled_graph.count_required_items(item_names) >=
+                MIN_STREAMED_PLAN_SIZE)
+
+    def _stream(self, requirements, database):
+        """Writes the page while the plan is being calculated.
+
+        The rows of the plan are written in the order that they are
+        calculated, rather than with the leaves last, so the streamed page is
+        not cached. Instead, once it has been written, the page is rendered
+        in the usual order and cached, which also caches the plan's template.
+        The page is written after the Server-Timing header is sent so its
+        stages are not timed, and after the status is sent so a recipe cycle
+        that cannot be sustained ends the page early rather than causing a
+        400 response.
+        """
+        products = produced_item.iter_produced_items(
+            recipe.iter_required_production_rates(requirements, database),
+            database)
+        template = templates.get_template('main.html')
+        pieces = template.generate(
+            get_template_values(requirements, database, products))
+
+        def generate_chunks():
+            try:
+                for piece in pieces:
+                    yield piece.encode('utf-8')
+            except ValueError as e:  # An unsustainable recipe cycle.
+                logging.warning('Cannot plan %r: %s', requirements, e)
+                return
+            cache_page(requirements, database)
+
+        self.response.app_iter = generate_chunks()
 
     def get(self):
-        requirements = []
-        for item in self.request.arguments():
+        # Use the same data for the whole request even if new data is
+        # published while it is being handled.
+        database = recipe_database.get_current()
+        with timing.stage('parse'):
+            requirements = get_requirements(
+                (item, self.request.get(item))
+                for item in self.request.arguments())
+
+        with timing.stage('cache'):
+            key = response_cache.canonical_key(requirements)
+            response = RESPONSE_CACHE.get(key, database)
+        if response is None:
+            if self._should_stream(requirements, database):
+                self._stream(requirements, database)
+                return
             try:
-                rate = float(self.request.get(item))
-            except ValueError:
-                rate = 1.0
-
-            rate = min(MAX_PRODUCTION_RATE, max(MIN_PRODUCTION_RATE, rate))
-            requirements.append((item, rate))
-
-        required_production = recipe.calculate_required_production_rates(
-            requirements)
-        products = produced_item.required_production_rates_to_produced_items(
-            required_production)
-        template_values = {
-            'items_to_produce': get_produceable_items(),
-            'products': products,
-            'selected_items': get_selected_items(requirements),
-        }
-        template = JINJA_ENVIRONMENT.get_template('main.html')
-        self.response.write(template.render(template_values))
+                response = cache_page(requirements, database)
+            except ValueError as e:  # An unsustainable recipe cycle.
+                self.abort(400, detail=str(e))
+
+        self.response.etag = response.etag
+        self.response.headers['Cache-Control'] = (
+            'public, max-age=%d' % RESPONSE_CACHE.time_to_live)
+        if response.etag in self.request.if_none_match:
+            self.response.status_int = 304
+        else:
+            self.response.write(response.body)
+
+
+class PlanApiHandler(TimedRequestHandler):
+    """Returns production plans as JSON.
+
+    GET /api/plan?<item>=<rate>&... returns {"items": <plan>} where <plan> is
+    in the format of produced_item.produced_items_to_json.
+
+    POST /api/plan with the body {"plans": [{<item>: <rate>, ...}, ...]}
+    returns {"plans": [...]} with one {"items": <plan>} (or
+    {"error": <message>} if the plan cannot be produced) per requested plan.
+    """
+
+    def _write_json(self, obj):
+        self.response.content_type = 'application/json'
+        with timing.stage('json'):
+            self.response.write(json.dumps(obj, separators=(',', ':')))
+
+    def _plan(self, requirements, database):
+        try:
+            products = PLAN_TEMPLATES.get_produced_items(requirements, database)
+        except ValueError as e:  # An unsustainable recipe cycle.
+            return {'error': str(e)}
+        return {'items': produced_item.produced_items_to_json(products)}
+
+    def get(self):
+        database = recipe_database.get_current()
+        with timing.stage('parse'):
+            requirements = get_requirements(
+                (item, self.request.get(item))
+                for item in self.request.arguments())
+        self._write_json(self._plan(requirements, database))
+
+    def post(self):
+        try:
+            with timing.stage('parse'):
+                plans = json.loads(self.request.body)['plans']
+                if not isinstance(plans, list):
+                    raise TypeError('"plans" must be a list')
+                # Checked before any of the plans are parsed.
+                if len(plans) > MAX_PLANS_PER_REQUEST:
+                    raise ValueError('at most %d plans may be requested' %
+                                     MAX_PLANS_PER_REQUEST)
+                if not all(isinstance(plan, dict) for plan in plans):
+                    raise TypeError('every plan must be an object')
+                plans = [get_requirements(plan.items()) for plan in plans]
+        except (KeyError, TypeError, ValueError) as e:
+            self.abort(400, detail='invalid plan request: %s' % e)
+
+        # Answer every plan using the same data.
+        database = recipe_database.get_current()
+        self._write_json(
+            {'plans': [self._plan(requirements, database)
+                       for requirements in plans]})
+
+
+class ItemListHandler(webapp2.RequestHandler):
+    """Serves the JavaScript list of produceable items.
+
+    The URL contains a hash of the content so the response never changes and
+    can be cached forever.
+    """
+
+    def get(self, content_hash):
+        current_list = item_list.get_item_list(recipe_database.get_current())
+        if content_hash != current_list.content_hash:
+            self.abort(404)
+        self.response.content_type = 'application/javascript'
+        self.response.etag = current_list.content_hash
+        self.response.headers['Cache-Control'] = (
+            'public, max-age=31536000, immutable')
+        if current_list.content_hash in self.request.if_none_match:
+            self.response.status_int = 304
+        else:
+            self.response.write(current_list.script)
+
+
+class WarmupHandler(webapp2.RequestHandler):
+    """Handles App Engine warmup requests, see appengine.warmup."""
+
+    def get(self):
+        database = recipe_database.get_current()
+        timings = warmup.warm_up(
+            PLAN_TEMPLATES,
+            [get_requirements(requirements)
+             for requirements in WARMUP_REQUESTS],
+            prepare_request=cache_page,
+            database=database)
+        self.response.content_type = 'text/plain'
+        for step, seconds in timings:
+            self.response.write('%-60s %8.2fms\n' % (step, seconds * 1000))
+        self.response.write('%-60s %8.2fms\n' % (
+            'total', sum(seconds for _, seconds in timings) * 1000))
+
+
+class DebugStatsHandler(webapp2.RequestHandler):
+    """Reports request latency statistics as JSON.
+
+    Returns {"enabled": <bool>, "stages": <stages>, "response_cache": <stats>}
+    where <stages> is in the format of timing.LatencyStats.get_summary and
+    <stats> contains the hits and misses of the response cache.
+    """
+
+    def get(self):
+        self.response.content_type = 'application/json'
+        self.response.headers['Cache-Control'] = 'no-cache'
+        self.response.write(json.dumps({
+            'enabled': timing.is_enabled(),
+            'stages': timing.STATS.get_summary(),
+            'response_cache': {'hits': RESPONSE_CACHE.hits,
+                               'misses': RESPONSE_CACHE.misses,
+                               'entries': len(RESPONSE_CACHE)},
+        }, indent=2, sort_keys=True))
+
 
 app = webapp2.WSGIApplication([
     ('/', MainPage),
+    ('/api/plan', PlanApiHandler),
+    ('/_ah/warmup', WarmupHandler),
+    ('/debug/stats', DebugStatsHandler),
+    (item_list.URL_PREFIX + r'([0-9a-f]+)\.js', ItemListHandler),
 ], debug=True)
@@ -0,0 +1,248 @@
+"""Rate-independent production plans that can be rescaled.
+
+Every rate in a production plan is a linear function of the requested rates
+and the structure of the plan (the items, their names, icons and order)
+depends only on which items are requested. A PlanTemplate stores that
+structure and the contribution of each requested item to each rate so that
+plans for new rates can be built without consulting the recipe graph.
+"""
+
+import collections
+import copy
+import threading
+
+from factorio import recipe_database
+
+from appengine import produced_item
+from appengine import timing
+
+
+class PlanTemplate(object):
+    """The production plan for a set of items, independent of their rates."""
+
+    def __init__(self, item_names, database, policy=None):
+        """Initialize the template.
+
+        Args:
+            item_names: A collection of the names of the requested items.
+            database: The factorio.recipe_database.RecipeDatabase to use.
+            policy: The production.ProducerPolicy used to choose production
+                machines or None to use the fastest machines.
+
+        Raises:
+            ValueError: if the recipes needed to produce the items form a cycle
+                that cannot be sustained.
+        """
+        self.item_names = tuple(sorted(set(item_names)))
+        self._item_to_index = {
+            item_name: index for index, item_name in enumerate(self.item_names)}
+
+        # The rate of each (<consumer>, <item>) edge is the sum of
+        # <unit-rate> * <requested-rate> over the (<index>, <unit-rate>)
+        # contributions of the requested items.
+        edge_to_contributions = collections.OrderedDict()
+        with timing.stage('solve'):
+            for index, item_name in enumerate(self.item_names):
+                for subitem_name, _, consumers in (
+                        database.bill_of_materials.get_unit_requirements(
+                            item_name)):
+                    for consumer_name, unit_rate in consumers:
+                        edge_to_contributions.setdefault(
+                            (consumer_name, subitem_name), []).append(
+                                (index, unit_rate))
+        self._edges = list(edge_to_contributions)
+        self._contributions = list(edge_to_contributions.values())
+
+        with timing.stage('produced-items'):
+            self._create_prototypes(database, policy)
+            unit_products = self._instantiate([1] * len(self.item_names))
+
+        # The order of the plan depends only on which items supply which, so
+        # it can be found from any plan e.g. one with every rate equal to 1.
+        with timing.stage('sort'):
+            self._order = [
+                product.name for product in produced_item._leaves_last_sort(
+                    unit_products.values())]
+
+    def _create_prototypes(self, database, policy):
+        self._prototypes = {}
+        for _, subitem_name in self._edges:
+            if subitem_name not in self._prototypes:
+                self._prototypes[subitem_name] = (
+                    produced_item.create_produced_item(
+                        subitem_name, database, policy))
+
+    def is_reusable_with(self, old_database, database):
+        """Returns True if the template's structure is valid in a database.
+
+        The structure is valid if every item in the plan is produced in the
+        same way by both databases' recipe graphs (see
+        factorio.recipe.BillOfMaterials.reuse_unit_requirements).
+
+        Args:
+            old_database: The RecipeDatabase that the template was built with.
+            database: A newer RecipeDatabase.
+        """
+        return all(old_database.compiled_graph.get_production(item_name) ==
+                   database.compiled_graph.get_production(item_name)
+                   for item_name in self._prototypes)
+
+    def rebind(self, database, policy=None):
+        """Returns a copy of the template that uses a different database.
+
+        The names, icons and production machines are taken from the new
+        database but the rates and order of the plan are reused, so the
+        template must be reusable with it (see is_reusable_with).
+
+        Args:
+            database: The factorio.recipe_database.RecipeDatabase to use.
+            policy: The production.ProducerPolicy used to choose production
+                machines or None to use the fastest machines.
+        """
+        template = copy.copy(self)
+        with timing.stage('produced-items'):
+            template._create_prototypes(database, policy)
+        return template
+
+    def _instantiate(self, requested_rates):
+        """Returns a dictionary mapping item names to ProductedItems."""
+        products = {item_name: prototype._copy()
+                    for item_name, prototype in self._prototypes.items()}
+        suppliers = {item_name: {} for item_name in products}
+        consumers = {item_name: {} for item_name in products}
+        for (consumer_name, item_name), contributions in zip(
+                self._edges, self._contributions):
+            rate = 0
+            for index, unit_rate in contributions:
+                rate += unit_rate * requested_rates[index]
+            if consumer_name is None:
+                consumers[item_name][None] = rate
+            else:
+                consumers[item_name][products[consumer_name]] = rate
+                suppliers[consumer_name][products[item_name]] = rate
+
+        for item_name, product in products.items():
+            product._complete(suppliers[item_name], consumers[item_name])
+        return products
+
+    def get_produced_items(self, items_and_crafting_rates):
+        """Returns the production plan for the given rates.
+
+        Args:
+            items_and_crafting_rates: A sequence of 2-tuples (<item>, <rate>)
+                where <item> is one of item_names and <rate> is the number
+                that must be produced per unit time.
+
+        Returns:
+            A list of ProductedItems in the same format as
+            produced_item.required_production_rates_to_produced_items.
+        """
+        requested_rates = [0] * len(self.item_names)
+        for item_name, rate in items_and_crafting_rates:
+            requested_rates[self._item_to_index[item_name]] += rate
+        with timing.stage('produced-items'):
+            products = self._instantiate(requested_rates)
+        return [products[item_name] for item_name in self._order]
+
+
+class PlanTemplateCache(object):
+    """A thread-safe LRU cache of PlanTemplates keyed by the requested items.
+
+    When the cache is used with a different RecipeDatabase, the templates
+    built with the previous database are kept aside and reused, with the new
+    names and icons, if the recipes that they depend on have not changed.
+    """
+
+    def __init__(self, max_entries=256, policy=None):
+        """Initialize the cache.
+
+        Args:
+            max_entries: The maximum number of templates to keep.
+            policy: The production.ProducerPolicy used to choose production
+                machines or None to use the fastest machines.
+        """
+        self.max_entries = max_entries
+        self._policy = policy
+        self._lock = threading.Lock()
+        self._items_to_template = collections.OrderedDict()
+        self._database = None
+        self._old_items_to_template = {}
+        self._old_database = None
+
+    def __len__(self):
+        return len(self._items_to_template)
+
+    def has_template(self, item_names, database=None):
+        """Returns True if the PlanTemplate for the item names is cached.
+
+        Does not build the template or change the order in which templates
+        are evicted.
+
+        Args:
+            item_names: A collection of the names of the requested items.
+            database: The factorio.recipe_database.RecipeDatabase to use or
+                None to use the current one.
+        """
+        database = database or recipe_database.get_current()
+        with self._lock:
+            return (database is self._database and
+                    frozenset(item_names) in self._items_to_template)
+
+    def get_template(self, item_names, database=None):
+        """Returns the PlanTemplate for a collection of item names.
+
+        Args:
+            item_names: A collection of the names of the requested items.
+            database: The factorio.recipe_database.RecipeDatabase to use or
+                None to use the current one.
+        """
+        database = database or recipe_database.get_current()
+        key = frozenset(item_names)
+        with self._lock:
+            if database is not self._database:
+                if self._database is not None:
+                    self._old_items_to_template = self._items_to_template
+                    self._old_database = self._database
+                self._items_to_template = collections.OrderedDict()
+                self._database = database
+            template = self._items_to_template.pop(key, None)
+            if template is not None:
+                self._items_to_template[key] = template
+                return template
+            old_template = self._old_items_to_template.pop(key, None)
+            old_database = self._old_database
+
+        # Build the template without holding the lock. Concurrent requests
+        # may build the same template, which is harmless.
+        if old_template is not None and old_template.is_reusable_with(
+                old_database, database):
+            template = old_template.rebind(database, self._policy)
+        else:
+            template = PlanTemplate(key, database, self._policy)
+        with self._lock:
+            if database is self._database:
+                self._items_to_template[key] = template
+                while len(self._items_to_template) > self.max_entries:
+                    self._items_to_template.popitem(last=False)
+        return template
+
+    def get_produced_items(self, items_and_crafting_rates, database=None):
+        """Returns the production plan for the given items and rates.
+
+        Args:
+            items_and_crafting_rates: A sequence of 2-tuples (<item>, <rate>)
+                where <item> is the name of an item that can be produced
+                (e.g. 'pipe') and <rate> is the number that must be produced
+                per unit time.
+            database: The factorio.recipe_database.RecipeDatabase to use or
+                None to use the current one.
+
+        Returns:
+            A list of ProductedItems in the same format as
+            produced_item.required_production_rates_to_produced_items.
+        """
+        items_and_crafting_rates = list(items_and_crafting_rates)
+        template = self.get_template(
+            [item_name for item_name, _ in items_and_crafting_rates],
+            database)
+        return template.get_produced_items(items_and_crafting_rates)
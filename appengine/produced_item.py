@@ -2,9 +2,8 @@
 
 from __future__ import division
 
-import math
-
 from factorio import recipe
+from factorio import recipe_database
 from factorio import production
 from factorio import names
 
@@ -25,184 +24,280 @@ def get_wiki_url(username):
         username.replace(' ', '_'))
 
 
-class ProductedItem(object):
-    """ABC representing a produced item."""
-    def __init__(self):
-        self.suppliers = {}
-        self.consumers = {}
-
-    @property
-    def is_user_requested(self):
-        """True iff the item was requested directly by the user."""
-        return None in self.consumers
-
-    @property
-    def name(self):
-        """The factorio name of the produced item e.g. 'basic-armor'."""
-        raise NotImplementedError()
-
-    @property
-    def username(self):
-        """The English name of the produced item e.g. 'Iron armor'."""
-        return names.get_best_recipe_name(self.name)
-
-    @property
-    def icon(self):
-        """The URL of an icon representing the produced item."""
-        return icons.get_icon_for_item(self.name)
-
-    @property
-    def url(self):
-        """A URL where the user can get more information about the item."""
-        if self.name == self.username:
-            return None  # No real English name.
-        return get_wiki_url(self.username)
-
-    @property
-    def required_production_rate(self):
-        """A float representing the number of the item which must be produced.
-
-        The time scale is factorio time units.
-        """
-        return sum(self.consumers.values())
+_set = object.__setattr__
 
-    @property
-    def production_machine_username(self):
-        """The English name of the machine used to produce the item.
+# The ProductedItem fields that depend only on the item.
+_ITEM_SLOTS = ('name',
+               'username',
+               'icon',
+               'url',
+               '_recipe',
+               '_ranked_producers',
+               '_policy',
+               '_database')
 
-        e.g. 'Chemical plant'. May be None if the produced item is a base
-        material such as water.
-        """
-        raise NotImplementedError()
 
-    @property
-    def num_production_machines_required(self):
-        """An int representing the number of production machines required.
+class ProductedItem(object):
+    """A row of a production plan, ready for templating.
+
+    Every field is computed once, when the row is built, and the row can not
+    be modified after it is complete. Rows are built in two steps: the fields
+    that depend only on the item are set by the constructor and the fields
+    that depend on the rest of the plan are set by _complete.
+
+    Attributes:
+        name: The factorio name of the produced item e.g. 'basic-armor'.
+        username: The English name of the produced item e.g. 'Iron armor'.
+        icon: The URL of an icon representing the produced item.
+        url: A URL where the user can get more information about the item.
+            May be None if the item has no real English name.
+        production_machine_name: The factorio name of the machine used to
+            produce the item e.g. 'chemical-plant'. May be None if the
+            produced item is a base material such as water.
+        production_machine_username: The English name of the machine used to
+            produce the item e.g. 'Chemical plant'. May be None if the
+            produced item is a base material such as water.
+        production_machine_icon: The URL of an icon representing the
+            production machine. May be None if the produced item is a base
+            material such as water.
+        production_machine_url: A URL where the user can get more information
+            about the machine. May be None if the produced item is a base
+            material such as water.
+        suppliers: A dictionary {<ProductedItem>: <rate>} of the ingredients
+            required to produce the item.
+        consumers: A dictionary {<ProductedItem>: <rate>} of the items that
+            consume this one. The key None represents the user.
+        is_user_requested: True iff the item was requested directly by the
+            user.
+        required_production_rate: A float representing the number of the item
+            which must be produced. The time scale is factorio time units.
+        num_production_machines_required: An int representing the number of
+            production machines required. May be None if the produced item is
+            a base material such as water.
+    """
 
-        The number of production machines required depends on the required
-        production rate. May be None if the produced item is a base material
-        such as water.
+    __slots__ = ('name',
+                 'username',
+                 'icon',
+                 'url',
+                 'production_machine_name',
+                 'production_machine_username',
+                 'production_machine_icon',
+                 'production_machine_url',
+                 'suppliers',
+                 'consumers',
+                 'is_user_requested',
+                 'required_production_rate',
+                 'num_production_machines_required',
+                 '_recipe',
+                 '_ranked_producers',
+                 '_policy',
+                 '_database',
+                 '_frozen')
+
+    def __init__(self, name, product_recipe, ranked_producers, policy,
+                 database):
+        """Initialize the fields that depend only on the item.
+
+        Args:
+            name: The factorio name of the produced item.
+            product_recipe: The factorio.recipe.Recipe used to produce the
+                item or None if the item is a base material.
+            ranked_producers: A tuple of the production.Producers that can
+                produce the item, fastest first. Empty if the item is not
+                produced by a machine.
+            policy: The production.ProducerPolicy used to choose between
+                ranked_producers.
+            database: The factorio.recipe_database.RecipeDatabase to use.
         """
-        raise NotImplementedError()
-
-
-    @property
-    def production_machine_icon(self):
-        """The URL of an icon representing the production machine.
-
-        May be None if the produced item is a base material such as water.
+        self.name = name
+        self.username = names.get_best_recipe_name(name, database)
+        self.icon = icons.get_icon_for_item(name, database)
+        if name == self.username:
+            self.url = None  # No real English name.
+        else:
+            self.url = get_wiki_url(self.username)
+        self._recipe = product_recipe
+        self._ranked_producers = ranked_producers
+        self._policy = policy
+        self._database = database
+
+        self._init_plan_fields()
+
+    def _init_plan_fields(self):
+        """Set the fields that depend on the plan to their initial values."""
+        # Bypass __setattr__, which is slow, when building rows.
+        _set(self, 'suppliers', {})
+        _set(self, 'consumers', {})
+        _set(self, 'is_user_requested', False)
+        _set(self, 'required_production_rate', 0)
+        _set(self, 'production_machine_name', None)
+        _set(self, 'production_machine_username', None)
+        _set(self, 'production_machine_icon', None)
+        _set(self, 'production_machine_url', None)
+        _set(self, 'num_production_machines_required', None)
+        _set(self, '_frozen', False)
+
+    def __setattr__(self, name, value):
+        if getattr(self, '_frozen', False):
+            raise AttributeError('cannot modify a complete ProductedItem')
+        _set(self, name, value)
+
+    def _copy(self):
+        """Returns an incomplete copy of an incomplete ProductedItem.
+
+        Only the fields that depend on the item are copied.
         """
-        raise NotImplementedError()
-
-    @property
-    def production_machine_url(self):
-        """A URL where the user can get more information about the machine.
-
-        May be None if the produced item is a base material such as water.
+        if self._frozen:
+            raise ValueError('cannot copy a complete ProductedItem')
+        product = object.__new__(type(self))
+        for slot in _ITEM_SLOTS:
+            _set(product, slot, getattr(self, slot))
+        product._init_plan_fields()
+        return product
+
+    def _complete(self, suppliers, consumers):
+        """Set the fields that depend on the plan and freeze the row.
+
+        Args:
+            suppliers: A dictionary {<ProductedItem>: <rate>} of the
+                ingredients required to produce the item.
+            consumers: A dictionary {<ProductedItem>: <rate>} of the items that
+                consume this one, where None represents the user.
         """
-        return get_wiki_url(self.production_machine_username)
+        required_production_rate = sum(consumers.values())
+        _set(self, 'suppliers', suppliers)
+        _set(self, 'consumers', consumers)
+        _set(self, 'is_user_requested', None in consumers)
+        _set(self, 'required_production_rate', required_production_rate)
+        if self._ranked_producers:
+            producer = self._policy.select(self._ranked_producers,
+                                           self._recipe,
+                                           required_production_rate)
+            username = names.get_best_item_name(producer.name, self._database)
+            _set(self, 'production_machine_name', producer.name)
+            _set(self, 'production_machine_username', username)
+            _set(self, 'production_machine_icon',
+                 icons.get_icon_for_item(producer.name, self._database))
+            _set(self, 'production_machine_url', get_wiki_url(username))
+            _set(self, 'num_production_machines_required',
+                 producer.get_num_required(self._recipe,
+                                           required_production_rate))
+        _set(self, '_database', None)
+        _set(self, '_frozen', True)
 
 
 class BaseProductedItem(ProductedItem):
     """Represents a required base product e.g. water."""
 
-    def __init__(self, name):
-        super(BaseProductedItem, self).__init__()
-        self._name = name
-
-    @property
-    def name(self):
-        return self._name
+    __slots__ = ()
 
-    @property
-    def num_production_machines_required(self):
-        return None
-
-    @property
-    def production_machine_icon(self):
-        return None
-
-    @property
-    def production_machine_url(self):
-        return None
-
-    @property
-    def production_machine_username(self):
-        return None
+    def __init__(self, name, database):
+        super(BaseProductedItem, self).__init__(name, None, (), None, database)
 
 
 class RecipeProductedItem(ProductedItem):
     """Represents a required product produced from a recipe."""
 
-    def __init__(self, product_recipe):
-        super(RecipeProductedItem, self).__init__()
-        self._recipe = product_recipe
+    __slots__ = ()
 
-    @property
-    def name(self):
-        return self._recipe.name
+    def __init__(self, product_recipe, database, policy=None):
+        # There may be no production machine for the category e.g. 'crafting'.
+        ranked_producers = database.producers_by_category.get(
+            product_recipe.category, ())
+        super(RecipeProductedItem, self).__init__(
+            product_recipe.name, product_recipe, ranked_producers,
+            policy or production.FastestPolicy(), database)
 
-    @property
-    def _producer(self):
-        """The production.Producer instance used to manufacture the item.
 
-        May be None if there is no production machine for the items category of
-        manufacture e.g. 'crafting'.
-        """
+def create_produced_item(item_name, database, policy=None):
+    """Returns an incomplete ProductedItem for an item.
+
+    Args:
+        item_name: The name of the produced item e.g. 'pipe'.
+        database: The factorio.recipe_database.RecipeDatabase to use.
+        policy: The production.ProducerPolicy used to choose the production
+            machine or None to use the fastest machine.
+    """
+    if item_name not in recipe.REFINED_FLUIDS:
         try:
-            return production.Producer.get_most_efficient_producer(
-                self._recipe.category)
+            return RecipeProductedItem(
+                recipe.Recipe.get_recipe_by_single_result(item_name, database),
+                database,
+                policy)
         except KeyError:
-            return None
-
-    @property
-    def num_production_machines_required(self):
-        if self._producer is None:
-            return None
-        return int(math.ceil(
-            self.required_production_rate * self._recipe.crafting_time
-            / self._recipe.count_produced
-            / self._producer.crafting_speed
-            ))
-
-    @property
-    def production_machine_icon(self):
-        if self._producer is None:
-            return None
-        return icons.get_icon_for_item(self._producer.name)
-
-    @property
-    def production_machine_url(self):
-        if self._producer is None:
-            return None
-        return get_wiki_url(self.production_machine_username)
-
-    @property
-    def production_machine_username(self):
-        if self._producer is None:
-            return None
-        return names.get_best_item_name(self._producer.name)
+            pass
+    return BaseProductedItem(item_name, database)
+
+
+def _find_cycle(unordered_products, num_unordered_suppliers):
+    """Returns a list of the ProductedItems in a cycle of unordered suppliers.
+
+    Every product in unordered_products must have an unordered supplier.
+    """
+    product = min(unordered_products, key=lambda p: p.name)
+    path = []
+    path_index = {}
+    while product not in path_index:
+        path_index[product] = len(path)
+        path.append(product)
+        product = min((s for s in product.suppliers
+                       if num_unordered_suppliers[s]),
+                      key=lambda s: s.name)
+    return path[path_index[product]:]
 
 
 def _leaves_last_sort(products):
-    """Order the sequence of ProductedItems with roots first and leaves last."""
-    remaining = set(products)
-    seen = set()
+    """Order the sequence of ProductedItems with roots first and leaves last.
+
+    Products are grouped into layers: the first layer contains the products
+    without suppliers and every other product is in the layer after the last
+    of its suppliers. The layers are returned last first, with the products
+    in each layer sorted by name.
+
+    Products in a recipe cycle have no such order. If the only remaining
+    products are part of, or depend on, a cycle then a cycle is found by
+    following unordered suppliers and its products are placed in a layer of
+    their own so that the rest can be ordered.
+    """
+    num_unordered_suppliers = {}
+    dependents = {}
+    for product in products:
+        num_unordered_suppliers[product] = len(product.suppliers)
+        for supplier in product.suppliers:
+            dependents.setdefault(supplier, []).append(product)
+
+    layer = [p for p in products if not num_unordered_suppliers[p]]
+    layers = []
+    num_ordered = 0
+    while num_ordered < len(num_unordered_suppliers):
+        if not layer:
+            layer = _find_cycle(
+                [p for p, count in num_unordered_suppliers.items() if count],
+                num_unordered_suppliers)
+        layers.append(layer)
+        num_ordered += len(layer)
+
+        for product in layer:
+            num_unordered_suppliers[product] = 0
+        next_layer = []
+        for product in layer:
+            for dependent in dependents.get(product, ()):
+                if num_unordered_suppliers[dependent]:
+                    num_unordered_suppliers[dependent] -= 1
+                    if not num_unordered_suppliers[dependent]:
+                        next_layer.append(dependent)
+        layer = next_layer
+
     result = []
-    while remaining:
-        new_seen = set(p for p in remaining
-                       if all(s in seen for s in p.suppliers))
-        result.extend(sorted(new_seen,
-                             reverse=True,
-                             key=lambda product: product.name))
-        seen.update(new_seen)
-        remaining.difference_update(new_seen)
-
-    result.reverse()
+    for layer in reversed(layers):
+        result.extend(sorted(layer, key=lambda product: product.name))
     return result
 
 
-def required_production_rates_to_produced_items(required_production_rates):
+def required_production_rates_to_produced_items(required_production_rates,
+                                                database=None,
+                                                policy=None):
     """Return a list of ProductedItems representing the production requirements.
 
     Args:
@@ -212,28 +307,132 @@ def required_production_rates_to_produced_items(required_production_rates):
             {<item>: <rate>} of ingredients required to produce the item and
             <consumers> is a dictionary {<item>: <rate>} of items that consume
             this one as part of their production. See factorio.recipe.
+        database: The factorio.recipe_database.RecipeDatabase to use or None to
+            use the current one.
+        policy: The production.ProducerPolicy used to choose production
+            machines or None to use the fastest machines.
 
     Returns:
         A list of ProductedItems, with one ProductedItem per item in the input
         sequence.
     """
-    item_name_to_produced_item = {}
+    return required_production_rates_to_produced_items_by_policy(
+        required_production_rates,
+        [policy or production.FastestPolicy()],
+        database)[0]
+
+
+def required_production_rates_to_produced_items_by_policy(
+        required_production_rates, policies, database=None):
+    """Return the ProductedItems for the same requirements and several policies.
+
+    Allows plans using different production machines to be compared without
+    calculating the required production rates more than once.
+
+    Args:
+        required_production_rates: A sequence of 3-tuples
+            (<item>, <suppliers>, <consumers>), see
+            required_production_rates_to_produced_items.
+        policies: A sequence of production.ProducerPolicies.
+        database: The factorio.recipe_database.RecipeDatabase to use or None to
+            use the current one.
+
+    Returns:
+        A list containing, for each policy, a list of ProductedItems as returned
+        by required_production_rates_to_produced_items.
+    """
+    database = database or recipe_database.get_current()
+    required_production_rates = list(required_production_rates)
+    item_name_to_produced_items = {}
     for item_name, _, _ in required_production_rates:
-        if item_name in recipe.REFINED_FLUIDS:
-            product = BaseProductedItem(item_name)
-        else:
-            try:
-                product = RecipeProductedItem(
-                    recipe.Recipe.get_recipe_by_single_result(item_name))
-            except KeyError:
-                product = BaseProductedItem(item_name)
-        item_name_to_produced_item[item_name] = product
+        item_name_to_produced_items[item_name] = [
+            create_produced_item(item_name, database, policy)
+            for policy in policies]
 
     for item_name, suppliers, consumers in required_production_rates:
-        item_name_to_produced_item[item_name].suppliers = {
-            item_name_to_produced_item[subitem_name]: rate
-            for subitem_name, rate in suppliers.items()}
-        item_name_to_produced_item[item_name].consumers = {
-            item_name_to_produced_item.get(subitem_name): rate
-            for subitem_name, rate in consumers.items()}
-    return _leaves_last_sort(item_name_to_produced_item.values())
+        for index, product in enumerate(
+                item_name_to_produced_items[item_name]):
+            product._complete(
+                {item_name_to_produced_items[subitem_name][index]: rate
+                 for subitem_name, rate in suppliers.items()},
+                {(item_name_to_produced_items[subitem_name][index]
+                  if subitem_name is not None else None): rate
+                 for subitem_name, rate in consumers.items()})
+    return [_leaves_last_sort([products[index] for products in
+                               item_name_to_produced_items.values()])
+            for index in range(len(policies))]
+
+
+def iter_produced_items(required_production_rates, database=None,
+                        policy=None):
+    """Yields a ProductedItem for each item as its requirements arrive.
+
+    Args:
+        required_production_rates: An iterable of 3-tuples
+            (<item>, <suppliers>, <consumers>), e.g. as yielded by
+            factorio.recipe.iter_required_production_rates, where each item
+            appears after the items that consume it.
+        database: The factorio.recipe_database.RecipeDatabase to use or None to
+            use the current one.
+        policy: The production.ProducerPolicy used to choose production
+            machines or None to use the fastest machines.
+
+    Yields:
+        A complete ProductedItem for each item, in the order of
+        required_production_rates. The suppliers of a yielded ProductedItem
+        may not be complete yet but their item fields (e.g. name and icon)
+        are set.
+    """
+    database = database or recipe_database.get_current()
+    item_name_to_produced_item = {}
+
+    def get_produced_item(item_name):
+        product = item_name_to_produced_item.get(item_name)
+        if product is None:
+            product = item_name_to_produced_item[item_name] = (
+                create_produced_item(item_name, database, policy))
+        return product
+
+    for item_name, suppliers, consumers in required_production_rates:
+        product = get_produced_item(item_name)
+        product._complete(
+            {get_produced_item(subitem_name): rate
+             for subitem_name, rate in suppliers.items()},
+            {get_produced_item(subitem_name) if subitem_name is not None
+             else None: rate
+             for subitem_name, rate in consumers.items()})
+        yield product
+
+
+def produced_items_to_json(products):
+    """Returns a JSON-serializable representation of a production plan.
+
+    Args:
+        products: A sequence of ProductedItems e.g. as returned by
+            required_production_rates_to_produced_items.
+
+    Returns:
+        A list with one dictionary per ProductedItem, in the same order,
+        containing:
+            'item': The name of the item e.g. 'copper-plate'.
+            'rate': The number of the item that must be produced per unit
+                time.
+            'requested': True iff the item was requested directly.
+            'suppliers': A dictionary {<item>: <rate>} of the ingredients
+                required to produce the item.
+            'consumers': A dictionary {<item>: <rate>} of the items that
+                consume this one, not including the user.
+            'machine': The name of the production machine or None.
+            'machines': The number of production machines required or None.
+    """
+    return [{'item': product.name,
+             'rate': product.required_production_rate,
+             'requested': product.is_user_requested,
+             'suppliers': {supplier.name: rate
+                           for supplier, rate in product.suppliers.items()},
+             'consumers': {consumer.name: rate
+                           for consumer, rate in product.consumers.items()
+                           if consumer is not None},
+             'machine': product.production_machine_name,
+             'machines': product.num_production_machines_required}
+            for product in products]
@@ -0,0 +1,171 @@
+"""WSGI middleware that profiles a sample of requests with cProfile.
+
+Aggregate timings (see appengine.timing) show which stages are slow on
+average but not why a particular request was slow. ProfilingMiddleware runs
+cProfile on a random sample of requests, and on every request slower than a
+threshold, and writes each profile to a .prof file whose name records the
+request. benchmarks/profile_report.py lists the slowest recorded requests.
+
+App Engine instances cannot write files so the middleware is meant for the
+development server and for benchmarks; appengine_config enables it when the
+PROFILE_DIRECTORY environment variable is set.
+"""
+
+import cProfile
+import os
+import os.path
+import random
+import threading
+import time
+import timeit
+
+try:
+    from urllib import quote, unquote, urlencode
+    from urlparse import parse_qsl
+except ImportError:
+    from urllib.parse import quote, unquote, urlencode, parse_qsl
+
+PROFILE_SUFFIX = '.prof'
+
+# The maximum length of the request description in a profile's file name.
+_MAX_TAG_LENGTH = 150
+
+_counter_lock = threading.Lock()
+_counter = [0]
+
+
+def canonical_request(environ):
+    """Returns a description of a request that ignores argument order.
+
+    e.g. 'GET /?iron-gear-wheel=1&pipe=2' for both '/?pipe=2&iron-gear-wheel=1'
+    and '/?iron-gear-wheel=1&pipe=2'.
+    """
+    query = urlencode(sorted(parse_qsl(environ.get('QUERY_STRING', ''),
+                                       keep_blank_values=True)))
+    description = '%s %s' % (environ.get('REQUEST_METHOD', 'GET'),
+                             environ.get('PATH_INFO', '/'))
+    if query:
+        description += '?' + query
+    return description
+
+
+class ProfiledRequest(object):
+    """A profile written by ProfilingMiddleware.
+
+    Attributes:
+        path: The path of the .prof file, readable by pstats.
+        request: The request, as returned by canonical_request.
+        seconds: The time taken to handle the request.
+        timestamp: The time that the request was handled, in seconds since
+            the epoch.
+    """
+
+    def __init__(self, path, request, seconds, timestamp):
+        self.path = path
+        self.request = request
+        self.seconds = seconds
+        self.timestamp = timestamp
+
+
+def get_profile_file_name(request, seconds, timestamp, sequence=0):
+    """Returns the name of the file for a request's profile.
+
+    Args:
+        request: The request, as returned by canonical_request.
+        seconds: The time taken to handle the request.
+        timestamp: The time that the request was handled, in seconds since
+            the epoch.
+        sequence: A number that distinguishes requests with the same
+            timestamp.
+    """
+    return '%d-%d-%.3f-%s%s' % (
+        timestamp * 1000, sequence, seconds * 1000,
+        quote(request, safe='')[:_MAX_TAG_LENGTH], PROFILE_SUFFIX)
+
+
+def parse_profile_path(path):
+    """Returns the ProfiledRequest described by the name of a profile.
+
+    Raises:
+        ValueError: if the file name was not created by get_profile_file_name.
+    """
+    name = os.path.basename(path)
+    if not name.endswith(PROFILE_SUFFIX):
+        raise ValueError('not a profile: %r' % name)
+    timestamp, _, milliseconds, tag = (
+        name[:-len(PROFILE_SUFFIX)].split('-', 3))
+    return ProfiledRequest(path, unquote(tag), float(milliseconds) / 1000,
+                           float(timestamp) / 1000)
+
+
+def list_profiles(directory):
+    """Returns the ProfiledRequests written to a directory, slowest first."""
+    profiles = []
+    for name in os.listdir(directory):
+        try:
+            profiles.append(parse_profile_path(os.path.join(directory, name)))
+        except ValueError:
+            continue
+    return sorted(profiles, key=lambda profile: profile.seconds, reverse=True)
+
+
+class ProfilingMiddleware(object):
+    """Profiles a sample of the requests handled by a WSGI application.
+
+    Profiling every request is only needed to catch the slow ones, so it
+    should only be done with a threshold when measuring under load.
+    """
+
+    def __init__(self, app, directory, sample_rate=0.0, slow_seconds=None,
+                 random=random.random):
+        """Initialize the middleware.
+
+        Args:
+            app: The WSGI application to profile.
+            directory: The directory to write the profiles to. Created if it
+                does not exist.
+            sample_rate: The fraction of requests to profile, between 0 and 1.
+            slow_seconds: If not None then every request is profiled and the
+                profile kept if the request took at least this long.
+            random: A function returning a random number in [0, 1).
+        """
+        self.app = app
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self._random = random
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def __call__(self, environ, start_response):
+        sampled = self.sample_rate and self._random() < self.sample_rate
+        if not sampled and self.slow_seconds is None:
+            return self.app(environ, start_response)
+
+        profiler = cProfile.Profile()
+        start = timeit.default_timer()
+        profiler.enable()
+        try:
+            # Include generating the body, which may be where the work is
+            # done e.g. for streamed pages.
+            result = self.app(environ, start_response)
+            try:
+                body = list(result)
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+        finally:
+            profiler.disable()
+        seconds = timeit.default_timer() - start
+
+        if sampled or seconds >= self.slow_seconds:
+            self._write(profiler, canonical_request(environ), seconds)
+        return body
+
+    def _write(self, profiler, request, seconds):
+        with _counter_lock:
+            _counter[0] += 1
+            sequence = _counter[0]
+        profiler.dump_stats(os.path.join(
+            self.directory,
+            get_profile_file_name(request, seconds, time.time(), sequence)))
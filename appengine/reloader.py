@@ -0,0 +1,100 @@
+"""Reloads the factorio data when the extracted files change.
+
+This allows the data to be re-extracted (see extract_factorio_data.py)
+without restarting the server. Changes are detected by polling the
+modification times and sizes of the files in the factorio-data directory.
+"""
+
+import logging
+import os
+import os.path
+import threading
+
+from factorio import recipe_database
+
+from appengine import data
+
+
+class DataReloader(object):
+    """Polls a factorio-data directory and publishes new data when it changes.
+
+    The new RecipeDatabase is built without blocking requests, which keep
+    using the previous database until the new one is published. Cached
+    production requirements are carried over to the new database unless they
+    depend on recipes that changed.
+    """
+
+    def __init__(self, data_directory_path, poll_interval=5):
+        """Initialize the reloader.
+
+        Args:
+            data_directory_path: The path of the factorio-data directory. Must
+                be relative to the directory containing app.yaml.
+            poll_interval: The number of seconds to wait between checks when
+                started with start().
+        """
+        self._data_directory_path = data_directory_path
+        self._poll_interval = poll_interval
+        self._fingerprint = self._get_fingerprint()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _get_fingerprint(self):
+        """Returns a value that changes when any of the data files change."""
+        fingerprint = []
+        for root, dir_names, file_names in os.walk(self._data_directory_path):
+            dir_names.sort()
+            for file_name in sorted(file_names):
+                path = os.path.join(root, file_name)
+                try:
+                    stat = os.stat(path)
+                except OSError:  # Deleted during the walk.
+                    continue
+                fingerprint.append((path, stat.st_mtime, stat.st_size))
+        return fingerprint
+
+    def check(self):
+        """Reloads and publishes the data if any of the files have changed.
+
+        Returns:
+            True if the data was reloaded, False otherwise.
+        """
+        fingerprint = self._get_fingerprint()
+        if fingerprint == self._fingerprint:
+            return False
+
+        logging.info('Reloading factorio data from %r',
+                     self._data_directory_path)
+        old_database = recipe_database.get_current()
+        new_database = data.build_database(self._data_directory_path,
+                                           check_snapshot=True)
+        reused = new_database.bill_of_materials.reuse_unit_requirements(
+            old_database.bill_of_materials)
+        recipe_database.publish(new_database)
+        self._fingerprint = fingerprint
+        logging.info('Reloaded factorio data, kept %d cached requirements',
+                     reused)
+        return True
+
+    def _run(self):
+        while not self._stopped.wait(self._poll_interval):
+            try:
+                self.check()
+            except Exception:  # Keep serving the old data.
+                logging.exception('Unable to reload factorio data from %r',
+                                  self._data_directory_path)
+
+    def start(self):
+        """Start checking for changes in a background thread."""
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name='DataReloader')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop checking for changes and wait for the thread to exit."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
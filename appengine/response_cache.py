@@ -0,0 +1,151 @@
+"""An in-process cache of rendered responses.
+
+Production plans are often requested repeatedly e.g. when a link such as
+'/?destroyer-capsule=1' is shared. Caching the rendered page avoids solving
+the plan and rendering the template again.
+
+Cached responses are only valid for the RecipeDatabase that they were
+rendered with. The cache is emptied when it is used with a different
+database, e.g. after new data has been loaded by appengine.reloader.
+"""
+
+import collections
+import hashlib
+import threading
+import time
+
+
+class CachedResponse(collections.namedtuple('CachedResponse',
+                                            ['body', 'etag', 'expires'])):
+    """A cached response body.
+
+    Attributes:
+        body: The encoded response body.
+        etag: A strong entity tag for the body, without quotes.
+        expires: The time (as returned by the cache's clock) after which the
+            response must not be used.
+    """
+
+    __slots__ = ()
+
+
+def canonical_key(requirements):
+    """Returns a key that identifies a set of production requirements.
+
+    Args:
+        requirements: A sequence of 2-tuples (<item>, <rate>) where <item> is
+            the name of a requested item and <rate> is the requested rate,
+            after any clamping.
+
+    Returns:
+        A hashable value that is the same for every ordering of requirements.
+    """
+    return tuple(sorted(requirements))
+
+
+class ResponseCache(object):
+    """A thread-safe LRU cache of responses with size and age limits.
+
+    Attributes:
+        hits: The number of times that get returned a response.
+        misses: The number of times that get returned None.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=16 * 1024 * 1024,
+                 time_to_live=300, clock=time.time):
+        """Initialize the cache.
+
+        Args:
+            max_entries: The maximum number of responses to keep.
+            max_bytes: The maximum total size of the response bodies to keep.
+            time_to_live: The number of seconds that a response is kept.
+            clock: A function returning the current time in seconds.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.time_to_live = time_to_live
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._key_to_response = collections.OrderedDict()
+        self._num_bytes = 0
+        self._database = None
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._key_to_response)
+
+    def _check_database(self, database):
+        """Empty the cache if database differs from the one it was filled by.
+
+        Must be called with the lock held.
+        """
+        if database is not self._database:
+            self._key_to_response.clear()
+            self._num_bytes = 0
+            self._database = database
+
+    def _remove(self, key):
+        """Must be called with the lock held."""
+        response = self._key_to_response.pop(key)
+        self._num_bytes -= len(response.body)
+
+    def get(self, key, database):
+        """Returns the cached response for a key or None if there isn't one.
+
+        Args:
+            key: The key returned by canonical_key.
+            database: The factorio.recipe_database.RecipeDatabase that the
+                response must have been rendered with.
+        """
+        with self._lock:
+            self._check_database(database)
+            response = self._key_to_response.get(key)
+            if response is not None and response.expires <= self._clock():
+                self._remove(key)
+                response = None
+
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                # Mark the response as the most recently used.
+                del self._key_to_response[key]
+                self._key_to_response[key] = response
+            return response
+
+    def put(self, key, database, body):
+        """Caches a response body.
+
+        Args:
+            key: The key returned by canonical_key.
+            database: The factorio.recipe_database.RecipeDatabase that the
+                response was rendered with.
+            body: The encoded response body.
+
+        Returns:
+            The CachedResponse for the body. The response is not cached if the
+            body is larger than max_bytes.
+        """
+        response = CachedResponse(body=body,
+                                  etag=hashlib.sha1(body).hexdigest(),
+                                  expires=self._clock() + self.time_to_live)
+        if len(body) > self.max_bytes:
+            return response
+
+        with self._lock:
+            self._check_database(database)
+            if key in self._key_to_response:
+                self._remove(key)
+            self._key_to_response[key] = response
+            self._num_bytes += len(body)
+            while (len(self._key_to_response) > self.max_entries or
+                   self._num_bytes > self.max_bytes):
+                self._remove(next(iter(self._key_to_response)))
+        return response
+
+    def clear(self):
+        """Removes every cached response."""
+        with self._lock:
+            self._key_to_response.clear()
+            self._num_bytes = 0
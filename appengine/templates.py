@@ -0,0 +1,111 @@
+"""The Jinja environment used to render the webapp's templates.
+
+Compiling a template is a noticeable part of the first request handled by a
+new instance. The templates can instead be compiled ahead of time, by
+compile_templates (see extract_factorio_data.py), into Python modules that
+are loaded by init.
+
+Compiled templates only work with the version of Jinja that compiled them
+(e.g. templates compiled by Jinja 2.11 import names that Jinja 2.6, which is
+used on App Engine, does not have) so they are ignored if they were compiled
+by a different version.
+"""
+
+import os.path
+
+import jinja2
+
+TEMPLATE_DIRECTORY_PATH = os.path.dirname(__file__)
+
+# The name of the directory, in factorio-data, containing the compiled
+# templates.
+COMPILED_TEMPLATES_DIR_NAME = 'templates'
+
+# The name of the file, in the directory of compiled templates, containing
+# the version of Jinja that compiled them.
+JINJA_VERSION_FILE_NAME = 'jinja-version.txt'
+
+_compiled_templates_path = None
+_environment = None
+
+
+def _create_environment(loader):
+    return jinja2.Environment(
+        loader=loader,
+        extensions=['jinja2.ext.autoescape'],
+        undefined=jinja2.StrictUndefined,
+        autoescape=True)
+
+
+def init(compiled_templates_path=None):
+    """Set where templates are loaded from.
+
+    The environment is created when it is first used.
+
+    Args:
+        compiled_templates_path: The path of a directory written by
+            compile_templates or None to compile the templates from source.
+            Templates that are not in the directory are compiled from source.
+    """
+    global _compiled_templates_path, _environment
+    _compiled_templates_path = compiled_templates_path
+    _environment = None
+
+
+def _get_compiled_jinja_version(compiled_templates_path):
+    """Returns the version of Jinja that compiled the templates or None."""
+    try:
+        with open(os.path.join(compiled_templates_path,
+                               JINJA_VERSION_FILE_NAME), 'r') as f:
+            return f.read().strip()
+    except IOError:
+        return None
+
+
+def can_load_compiled_templates(compiled_templates_path):
+    """Returns True if the templates in a directory written by
+    compile_templates can be loaded by the installed version of Jinja."""
+    return (_get_compiled_jinja_version(compiled_templates_path) ==
+            jinja2.__version__)
+
+
+def get_environment():
+    """Returns the jinja2.Environment used to render the templates."""
+    global _environment
+    environment = _environment
+    if environment is None:
+        source_loader = jinja2.FileSystemLoader(TEMPLATE_DIRECTORY_PATH)
+        if (_compiled_templates_path is not None and
+                can_load_compiled_templates(_compiled_templates_path)):
+            loader = jinja2.ChoiceLoader(
+                [jinja2.ModuleLoader(_compiled_templates_path), source_loader])
+        else:
+            loader = source_loader
+        environment = _environment = _create_environment(loader)
+    return environment
+
+
+def get_template(name):
+    """Returns the jinja2.Template with the given name e.g. 'main.html'."""
+    return get_environment().get_template(name)
+
+
+def compile_templates(output_path):
+    """Compiles the templates into Python modules that can be loaded by init.
+
+    The templates can only be loaded by the same version of Jinja, which is
+    recorded with them.
+
+    Args:
+        output_path: The path of the directory to write the modules to. Any
+            existing modules are replaced.
+    """
+    environment = _create_environment(
+        jinja2.FileSystemLoader(TEMPLATE_DIRECTORY_PATH))
+    environment.compile_templates(
+        output_path,
+        zip=None,
+        filter_func=lambda name: name.endswith('.html'),
+        ignore_errors=False)
+    with open(os.path.join(output_path, JINJA_VERSION_FILE_NAME), 'w') as f:
+        f.write(jinja2.__version__ + '\n')
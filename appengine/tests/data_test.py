@@ -0,0 +1,98 @@
+"""Tests for appengine.data."""
+
+import io
+import json
+import os
+import os.path
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from factorio import names
+from factorio import snapshot
+
+from appengine import data
+
+
+class TestBuildDatabase(unittest.TestCase):
+
+    def setUp(self):
+        self.data_directory_path = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.data_directory_path, 'icons'))
+        shutil.copy(os.path.join(os.path.dirname(__file__),
+                                 'test-recipe.json'),
+                    os.path.join(self.data_directory_path, 'recipes.json'))
+        with open(os.path.join(self.data_directory_path, 'names.json'),
+                  'w') as f:
+            json.dump({'item-names': {'pipe': 'JSON pipe'},
+                       'recipe-names': {}}, f)
+        self.snapshot_path = os.path.join(self.data_directory_path,
+                                          snapshot.SNAPSHOT_FILE_NAME)
+
+    def tearDown(self):
+        shutil.rmtree(self.data_directory_path)
+
+    def _write_snapshot(self, write):
+        with open(self.snapshot_path, 'wb') as f:
+            write(f)
+        # Newer than the files that it was created from.
+        mtime = os.path.getmtime(self.snapshot_path) + 10
+        os.utime(self.snapshot_path, (mtime, mtime))
+
+    def _write_current_snapshot(self):
+        with open(os.path.join(self.data_directory_path,
+                               'recipes.json'), 'r') as recipes_file:
+            snapshot_data = snapshot.create_snapshot(
+                recipes_file,
+                # Distinguishes the snapshot from the JSON files.
+                io.BytesIO(json.dumps(
+                    {'item-names': {'pipe': 'Snapshot pipe'},
+                     'recipe-names': {}}).encode('utf-8')),
+                {})
+        self._write_snapshot(lambda f: pickle.dump(snapshot_data, f, 2))
+
+    def get_pipe_name(self, check_snapshot=True):
+        return names.get_best_item_name(
+            'pipe', data.build_database(self.data_directory_path,
+                                        check_snapshot))
+
+    def test_without_snapshot(self):
+        self.assertEqual(self.get_pipe_name(), 'JSON pipe')
+
+    def test_current_snapshot(self):
+        self._write_current_snapshot()
+        self.assertEqual(self.get_pipe_name(), 'Snapshot pipe')
+
+    def test_stale_snapshot(self):
+        self._write_current_snapshot()
+        mtime = os.path.getmtime(self.snapshot_path) + 10
+        os.utime(os.path.join(self.data_directory_path, 'names.json'),
+                 (mtime, mtime))
+        self.assertEqual(self.get_pipe_name(), 'JSON pipe')
+        # Without checking, the snapshot is trusted.
+        self.assertEqual(self.get_pipe_name(check_snapshot=False),
+                         'Snapshot pipe')
+
+    def test_snapshot_as_new_as_sources(self):
+        self._write_current_snapshot()
+        mtime = os.path.getmtime(self.snapshot_path)
+        os.utime(os.path.join(self.data_directory_path, 'recipes.json'),
+                 (mtime, mtime))
+        self.assertEqual(self.get_pipe_name(), 'Snapshot pipe')
+
+    def test_old_snapshot_version(self):
+        self._write_snapshot(lambda f: pickle.dump(
+            {'version': 1, 'recipes': {}, 'names': {}, 'icons': {}}, f, 2))
+        self.assertEqual(self.get_pipe_name(), 'JSON pipe')
+
+    def test_unreadable_snapshot(self):
+        for contents in [b'', b'not a pickle', pickle.dumps(['list'], 2)]:
+            self._write_snapshot(lambda f: f.write(contents))
+            self.assertEqual(self.get_pipe_name(), 'JSON pipe')
+            self.assertEqual(self.get_pipe_name(check_snapshot=False),
+                             'JSON pipe')
+
+
+if __name__ == '__main__':
+    unittest.main()
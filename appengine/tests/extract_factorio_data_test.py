@@ -0,0 +1,330 @@
+"""Tests for extract_factorio_data."""
+
+import json
+import os
+import os.path
+import shutil
+import tempfile
+import unittest
+
+try:
+    import extract_factorio_data
+except (ImportError, SyntaxError):  # Requires Python 2.
+    extract_factorio_data = None
+
+
+@unittest.skipIf(extract_factorio_data is None,
+                 'extract_factorio_data requires Python 2')
+class ExtractionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_file(self, relative_path, contents, mtime=None):
+        path = os.path.join(self.directory, relative_path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(contents)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+        return path
+
+
+class TestHashing(ExtractionTestCase):
+
+    def test_hash_files(self):
+        path = self.write_file('a.txt', 'a')
+        original_hash = extract_factorio_data.hash_files([path],
+                                                         self.directory)
+        self.assertEqual(
+            extract_factorio_data.hash_files([path], self.directory),
+            original_hash)
+        self.write_file('a.txt', 'b')
+        self.assertNotEqual(
+            extract_factorio_data.hash_files([path], self.directory),
+            original_hash)
+
+    def test_fingerprint_tree(self):
+        self.write_file('tree/a.png', 'a', mtime=1000)
+        path = self.write_file('tree/b/b.png', 'b', mtime=1000)
+        tree_path = os.path.join(self.directory, 'tree')
+        original_fingerprint = extract_factorio_data.fingerprint_tree(
+            tree_path)
+        self.assertEqual(extract_factorio_data.fingerprint_tree(tree_path),
+                         original_fingerprint)
+        os.utime(path, (2000, 2000))
+        modified_fingerprint = extract_factorio_data.fingerprint_tree(
+            tree_path)
+        self.assertNotEqual(modified_fingerprint, original_fingerprint)
+        os.remove(path)
+        self.assertNotIn(extract_factorio_data.fingerprint_tree(tree_path),
+                         [original_fingerprint, modified_fingerprint])
+
+
+class TestExtractionState(ExtractionTestCase):
+
+    def setUp(self):
+        super(TestExtractionState, self).setUp()
+        self.output_path = os.path.join(self.directory, 'output.json')
+        self.runs = []
+
+    def export(self, contents='{}'):
+        self.runs.append(contents)
+        self.write_file('output.json', contents)
+
+    def run_stage(self, input_hash, force=False):
+        # A new state is used each time, as it is by each extraction.
+        state = extract_factorio_data.ExtractionState(self.directory, force)
+        return state.run_stage('stage', input_hash, [self.output_path],
+                               self.export)
+
+    def test_unchanged_inputs(self):
+        self.assertTrue(self.run_stage('hash'))
+        self.assertFalse(self.run_stage('hash'))
+        self.assertEqual(len(self.runs), 1)
+
+    def test_changed_inputs(self):
+        self.assertTrue(self.run_stage('hash'))
+        self.assertTrue(self.run_stage('new-hash'))
+        self.assertFalse(self.run_stage('new-hash'))
+
+    def test_force(self):
+        self.assertTrue(self.run_stage('hash'))
+        self.assertTrue(self.run_stage('hash', force=True))
+
+    def test_deleted_output(self):
+        self.assertTrue(self.run_stage('hash'))
+        os.remove(self.output_path)
+        self.assertTrue(self.run_stage('hash'))
+        self.assertTrue(os.path.exists(self.output_path))
+
+    def test_changed_output(self):
+        self.assertTrue(self.run_stage('hash'))
+        mtime = os.path.getmtime(self.output_path) + 10
+        self.write_file('output.json', '{"modified": true}', mtime=mtime)
+        self.assertTrue(self.run_stage('hash'))
+        self.assertFalse(self.run_stage('hash'))
+
+    def test_output_directory(self):
+        tree_path = os.path.join(self.directory, 'tree')
+        state = extract_factorio_data.ExtractionState(self.directory)
+        export = lambda: self.write_file('tree/a.png', 'a', mtime=1000)
+        self.assertTrue(state.run_stage('tree', 'hash', [tree_path], export))
+        self.assertFalse(state.run_stage('tree', 'hash', [tree_path], export))
+        os.utime(os.path.join(tree_path, 'a.png'), (2000, 2000))
+        self.assertTrue(state.run_stage('tree', 'hash', [tree_path], export))
+
+
+class TestSnapshotStage(ExtractionTestCase):
+
+    def setUp(self):
+        super(TestSnapshotStage, self).setUp()
+        with open(os.path.join(os.path.dirname(__file__),
+                               'test-recipe.json'), 'r') as f:
+            self.write_file('recipes.json', f.read(), mtime=1000)
+        with open(os.path.join(os.path.dirname(__file__),
+                               'test-names.json'), 'r') as f:
+            self.write_file('names.json', f.read(), mtime=1000)
+        self.write_file('icons/pipe.png', 'pipe', mtime=1000)
+        os.utime(os.path.join(self.directory, 'icons'), (1000, 1000))
+        self.snapshot_path = os.path.join(
+            self.directory, extract_factorio_data.snapshot.SNAPSHOT_FILE_NAME)
+
+    def run_snapshot_stage(self):
+        # A new state is used each time, as it is by each extraction.
+        return extract_factorio_data.run_snapshot_stage(
+            extract_factorio_data.ExtractionState(self.directory),
+            self.directory)
+
+    def is_snapshot_current(self):
+        return extract_factorio_data.data.is_snapshot_current(
+            self.directory, self.snapshot_path)
+
+    def test_unchanged(self):
+        self.assertTrue(self.run_snapshot_stage())
+        self.assertTrue(self.is_snapshot_current())
+        self.assertFalse(self.run_snapshot_stage())
+
+    def test_sources_rewritten_with_same_content(self):
+        self.assertTrue(self.run_snapshot_stage())
+        # Each file is rewritten after the snapshot was last written, as it
+        # would be by a later extraction.
+        for file_name, mtime in [('recipes.json', 2000), ('names.json', 3000)]:
+            with open(os.path.join(self.directory, file_name), 'r') as f:
+                self.write_file(file_name, f.read(), mtime=mtime)
+            self.assertTrue(self.run_snapshot_stage())
+            self.assertTrue(self.is_snapshot_current())
+            self.assertFalse(self.run_snapshot_stage())
+
+
+class TestSyncTree(ExtractionTestCase):
+
+    def setUp(self):
+        super(TestSyncTree, self).setUp()
+        self.first_path = os.path.join(self.directory, 'first')
+        self.second_path = os.path.join(self.directory, 'second')
+        self.target_path = os.path.join(self.directory, 'target')
+        self.write_file('first/a.png', 'first a', mtime=1000)
+        self.write_file('first/sub/b.png', 'first b', mtime=1000)
+        self.write_file('second/a.png', 'second a', mtime=1000)
+
+    def sync_tree(self, link=False):
+        return extract_factorio_data.sync_tree(
+            [self.first_path, self.second_path,
+             os.path.join(self.directory, 'missing')],
+            self.target_path, link)
+
+    def read_target(self, relative_path):
+        with open(os.path.join(self.target_path, relative_path), 'r') as f:
+            return f.read()
+
+    def test_copy(self):
+        self.assertEqual(self.sync_tree(), (2, 0))
+        self.assertEqual(self.read_target('a.png'), 'second a')
+        self.assertEqual(self.read_target('sub/b.png'), 'first b')
+        self.assertEqual(self.sync_tree(), (0, 0))
+
+    def test_copy_changed(self):
+        self.sync_tree()
+        self.write_file('first/sub/b.png', 'new b', mtime=2000)
+        self.assertEqual(self.sync_tree(), (1, 0))
+        self.assertEqual(self.read_target('sub/b.png'), 'new b')
+
+    def test_remove_stale(self):
+        self.sync_tree()
+        self.write_file('target/stale.png', 'stale')
+        os.remove(os.path.join(self.first_path, 'sub', 'b.png'))
+        self.assertEqual(self.sync_tree(), (0, 2))
+        self.assertEqual(
+            extract_factorio_data.list_files(self.target_path),
+            [os.path.join(self.target_path, 'a.png')])
+
+    def test_link(self):
+        self.assertEqual(self.sync_tree(link=True), (2, 0))
+        self.assertTrue(os.path.samefile(
+            os.path.join(self.target_path, 'a.png'),
+            os.path.join(self.second_path, 'a.png')))
+        self.assertEqual(self.read_target('sub/b.png'), 'first b')
+        self.assertEqual(self.sync_tree(link=True), (0, 0))
+
+        os.remove(os.path.join(self.second_path, 'a.png'))
+        self.assertEqual(self.sync_tree(link=True), (1, 0))
+        self.assertTrue(os.path.samefile(
+            os.path.join(self.target_path, 'a.png'),
+            os.path.join(self.first_path, 'a.png')))
+
+
+class TestMergeMods(ExtractionTestCase):
+
+    def setUp(self):
+        super(TestMergeMods, self).setUp()
+        self.output_path = os.path.join(self.directory, 'output')
+        os.mkdir(self.output_path)
+        self.mod_dirs = [os.path.join(self.directory, mod)
+                         for mod in ['base', 'first-mod', 'second-mod']]
+        self.files_per_worker = (
+            extract_factorio_data.PROTOTYPE_FILES_PER_WORKER)
+        self.evaluate_prototypes = extract_factorio_data.evaluate_prototypes
+
+    def tearDown(self):
+        extract_factorio_data.PROTOTYPE_FILES_PER_WORKER = (
+            self.files_per_worker)
+        extract_factorio_data.evaluate_prototypes = self.evaluate_prototypes
+        super(TestMergeMods, self).tearDown()
+
+    def write_prototypes(self, relative_path, prototypes):
+        return self.write_file(relative_path, json.dumps(prototypes))
+
+    def read_output(self, file_name):
+        with open(os.path.join(self.output_path, file_name), 'r') as f:
+            return json.load(f)
+
+    def test_merge_prototypes(self):
+        paths = [
+            self.write_prototypes('1.json', {
+                'pipe': {'type': 'recipe', 'energy_required': 1},
+                'gear': {'type': 'recipe', 'energy_required': 1},
+                'iron-chest': {'type': 'item'}}),
+            # dkjson encodes an empty table as an array.
+            self.write_prototypes('2.json', []),
+            self.write_prototypes('3.json', {
+                'pipe': {'type': 'recipe', 'energy_required': 2},
+                'gear': {'type': 'item'}}),
+        ]
+        extract_factorio_data.merge_prototypes(
+            paths, os.path.join(self.output_path, 'recipes.json'))
+        self.assertEqual(
+            self.read_output('recipes.json'),
+            {'pipe': {'type': 'recipe', 'energy_required': 2},
+             'gear': {'type': 'recipe', 'energy_required': 1}})
+
+    def test_merge_no_prototypes(self):
+        extract_factorio_data.merge_prototypes(
+            [], os.path.join(self.output_path, 'recipes.json'))
+        self.assertEqual(self.read_output('recipes.json'), {})
+
+    def test_export_recipes_one_file_per_worker(self):
+        # The recipe files contain JSON, which is "evaluated" by copying it,
+        # rather than Lua.
+        def evaluate_prototypes(prototype_paths, output_path):
+            [prototype_path] = prototype_paths
+            shutil.copy(prototype_path, output_path)
+        extract_factorio_data.evaluate_prototypes = evaluate_prototypes
+        extract_factorio_data.PROTOTYPE_FILES_PER_WORKER = 1
+
+        self.write_prototypes('base/prototypes/recipe/a.lua', {
+            'pipe': {'type': 'recipe', 'result': 'pipe'},
+            'gear': {'type': 'recipe', 'result': 'gear'}})
+        self.write_prototypes('base/prototypes/recipe/b.lua', {
+            'chest': {'type': 'recipe', 'result': 'chest'}})
+        self.write_prototypes('first-mod/prototypes/recipe/a.lua', {
+            'pipe': {'type': 'recipe', 'result': 'first-pipe'},
+            'chest': {'type': 'recipe', 'result': 'first-chest'}})
+        self.write_prototypes('second-mod/prototypes/recipe/z.lua', {
+            'pipe': {'type': 'recipe', 'result': 'second-pipe'}})
+
+        extract_factorio_data.export_recipes(self.mod_dirs, self.output_path,
+                                             num_workers=2)
+        self.assertEqual(
+            self.read_output('recipes.json'),
+            {'pipe': {'type': 'recipe', 'result': 'second-pipe'},
+             'gear': {'type': 'recipe', 'result': 'gear'},
+             'chest': {'type': 'recipe', 'result': 'first-chest'}})
+        # The files written for each batch are removed.
+        self.assertEqual(os.listdir(self.output_path), ['recipes.json'])
+
+    def test_export_names(self):
+        self.write_file('base/locale/en/base.cfg',
+                        '[item-name]\npipe=Pipe\ngear=Gear\n'
+                        '[recipe-name]\nbasic-oil=Basic oil\n')
+        self.write_file('second-mod/locale/en/mod.cfg',
+                        '[item-name]\npipe=Better pipe\n'
+                        '[fluid-name]\nsteam=Steam\n')
+        extract_factorio_data.export_names(self.mod_dirs, self.output_path)
+        self.assertEqual(
+            self.read_output('names.json'),
+            {'item-names': {'pipe': 'Better pipe',
+                            'gear': 'Gear',
+                            'steam': 'Steam'},
+             'recipe-names': {'basic-oil': 'Basic oil'}})
+
+    def test_export_icons(self):
+        self.write_file('base/graphics/icons/pipe.png', 'base pipe')
+        self.write_file('base/graphics/icons/gear.png', 'base gear')
+        self.write_file('first-mod/graphics/icons/pipe.png', 'mod pipe')
+        extract_factorio_data.export_icons(self.mod_dirs, self.output_path)
+        icons_path = os.path.join(self.output_path, 'icons')
+        self.assertEqual(
+            extract_factorio_data.list_files(icons_path),
+            [os.path.join(icons_path, 'gear.png'),
+             os.path.join(icons_path, 'pipe.png')])
+        with open(os.path.join(icons_path, 'pipe.png'), 'r') as f:
+            self.assertEqual(f.read(), 'mod pipe')
+
+
+if __name__ == '__main__':
+    unittest.main()
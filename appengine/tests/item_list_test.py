@@ -0,0 +1,54 @@
+"""Tests for appengine.item_list."""
+
+import json
+import os.path
+import unittest
+
+from factorio import names
+from factorio import recipe
+from factorio import recipe_database
+
+from appengine import item_list
+
+
+class TestItemList(unittest.TestCase):
+
+    def setUp(self):
+        with open(os.path.join(os.path.dirname(__file__),
+                               'test-names.json'), 'r') as f:
+            names.names_from_json(f)
+        with open(os.path.join(os.path.dirname(__file__),
+                               'test-recipe.json'), 'r') as f:
+            recipe.Recipe.recipes_from_json(f)
+
+    def test_items(self):
+        items = item_list.ItemList(recipe_database.get_current()).items
+        usernames = [item.username for item in items]
+        self.assertEqual(usernames, sorted(usernames))
+        self.assertIn(('copper-cable', 'Copper cable'),
+                      [(item.name, item.username) for item in items])
+
+    def test_script(self):
+        items = item_list.ItemList(recipe_database.get_current())
+        prefix = b'var ITEMS = '
+        self.assertTrue(items.script.startswith(prefix))
+        self.assertEqual(
+            json.loads(items.script[len(prefix):].rstrip(b';\n').decode(
+                'utf-8')),
+            [[item.name, item.username] for item in items.items])
+        self.assertEqual(items.url,
+                         '/items/%s.js' % items.content_hash)
+
+    def test_get_item_list(self):
+        database = recipe_database.get_current()
+        self.assertIs(item_list.get_item_list(database),
+                      item_list.get_item_list(database))
+
+        with open(os.path.join(os.path.dirname(__file__),
+                               'test-recipe.json'), 'r') as f:
+            recipe.Recipe.recipes_from_json(f)
+        new_list = item_list.get_item_list(recipe_database.get_current())
+        self.assertIsNot(new_list, item_list.get_item_list(database))
+
+if __name__ == '__main__':
+    unittest.main()
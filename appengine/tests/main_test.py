@@ -0,0 +1,347 @@
+"""Tests for appengine.main."""
+
+import io
+import json
+import os.path
+import unittest
+
+try:
+    import webob
+    from appengine import main
+except ImportError:
+    main = None
+
+from factorio import names
+from factorio import recipe
+from factorio import recipe_database
+
+from appengine import icons
+from appengine import item_list
+from appengine import response_cache
+from appengine import timing
+
+
+def load_cyclic_recipes():
+    """Publishes recipes in which widgets need a cycle that cannot be
+    sustained."""
+    with open(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir,
+                           'factorio', 'tests', 'test-cyclic-recipe.json'),
+              'r') as f:
+        recipe.Recipe.recipes_from_json(f)
+
+
+@unittest.skipIf(main is None, 'requires webapp2 and Jinja')
+class HandlerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        icons.init(os.path.join(os.path.dirname(__file__), 'icons'))
+        with open(os.path.join(os.path.dirname(__file__),
+                               'test-names.json'), 'r') as f:
+            names.names_from_json(f)
+        # Publishes a new database, which empties the caches.
+        with open(os.path.join(os.path.dirname(__file__),
+                               'test-recipe.json'), 'r') as f:
+            recipe.Recipe.recipes_from_json(f)
+
+    def get_response(self, path, **kwargs):
+        # webapp2.Request would replace the Cache-Control header of the
+        # response.
+        return webob.Request.blank(path, **kwargs).get_response(main.app)
+
+
+class TestMainPage(HandlerTestCase):
+
+    def test_get(self):
+        response = self.get_response('/?copper-cable=3')
+        self.assertEqual(response.status_int, 200)
+        self.assertIn(b'Copper cable', response.body)
+        self.assertEqual(
+            response.headers['Cache-Control'],
+            'public, max-age=%d' % main.RESPONSE_CACHE.time_to_live)
+        self.assertTrue(response.etag)
+
+    def test_etag(self):
+        response = self.get_response('/?copper-cable=3&iron-plate=2')
+        # The same plan requested in a different order.
+        cached_response = self.get_response('/?iron-plate=2&copper-cable=3')
+        self.assertEqual(cached_response.body, response.body)
+        self.assertEqual(cached_response.etag, response.etag)
+
+        not_modified = self.get_response(
+            '/?copper-cable=3&iron-plate=2',
+            headers={'If-None-Match': '"%s"' % response.etag})
+        self.assertEqual(not_modified.status_int, 304)
+        self.assertEqual(not_modified.body, b'')
+        self.assertEqual(not_modified.etag, response.etag)
+
+        modified = self.get_response(
+            '/?copper-cable=4&iron-plate=2',
+            headers={'If-None-Match': '"%s"' % response.etag})
+        self.assertEqual(modified.status_int, 200)
+        self.assertNotEqual(modified.etag, response.etag)
+
+    def test_unsustainable_cycle(self):
+        load_cyclic_recipes()
+        response = self.get_response('/?widget=1')
+        self.assertEqual(response.status_int, 400)
+        self.assertIn(b'cannot be sustained', response.body)
+        self.assertEqual(len(main.RESPONSE_CACHE), 0)
+
+
+class TestItemList(HandlerTestCase):
+
+    def get_item_list(self):
+        return item_list.get_item_list(recipe_database.get_current())
+
+    def test_get(self):
+        current_list = self.get_item_list()
+        response = self.get_response(current_list.url)
+        self.assertEqual(response.status_int, 200)
+        self.assertEqual(response.content_type, 'application/javascript')
+        self.assertEqual(response.body, current_list.script)
+        self.assertEqual(response.etag, current_list.content_hash)
+        self.assertIn('immutable', response.headers['Cache-Control'])
+
+        not_modified = self.get_response(
+            current_list.url,
+            headers={'If-None-Match': '"%s"' % current_list.content_hash})
+        self.assertEqual(not_modified.status_int, 304)
+        self.assertEqual(not_modified.body, b'')
+
+    def test_page_references_list(self):
+        response = self.get_response('/?copper-cable=3')
+        self.assertIn(self.get_item_list().url.encode('utf-8'),
+                      response.body)
+
+    def test_unknown_hash(self):
+        response = self.get_response(item_list.URL_PREFIX + '0123abcd.js')
+        self.assertEqual(response.status_int, 404)
+
+    def test_old_hash_after_reload(self):
+        old_url = self.get_item_list().url
+        with open(os.path.join(os.path.dirname(__file__),
+                               'test-names.json'), 'r') as f:
+            new_names = json.load(f)
+        new_names['item-names']['copper-cable'] = 'Copper wire'
+        names.names_from_json(io.BytesIO(
+            json.dumps(new_names).encode('utf-8')))
+        self.assertNotEqual(self.get_item_list().url, old_url)
+        # Pages cached before the reload still reference the old list, which
+        # they must be usable without.
+        self.assertEqual(self.get_response(old_url).status_int, 404)
+        self.assertIn(b"typeof ITEMS === 'undefined'",
+                      self.get_response('/?copper-cable=3').body)
+
+
+class TestPlanApi(HandlerTestCase):
+
+    def post(self, body):
+        return self.get_response('/api/plan', POST=body,
+                                 content_type='application/json')
+
+    def test_get(self):
+        response = self.get_response('/api/plan?copper-cable=3')
+        self.assertEqual(response.status_int, 200)
+        self.assertEqual(response.content_type, 'application/json')
+        items = json.loads(response.body)['items']
+        self.assertEqual(
+            [(item['item'], item['rate'], item['requested'])
+             for item in items],
+            [('copper-cable', 3, True),
+             ('copper-plate', 1.5, False),
+             ('copper-ore', 1.5, False)])
+
+    def test_post(self):
+        response = self.post(json.dumps(
+            {'plans': [{'copper-cable': 3}, {'iron-plate': '2'}, {}]}))
+        self.assertEqual(response.status_int, 200)
+        plans = json.loads(response.body)['plans']
+        self.assertEqual(len(plans), 3)
+        self.assertEqual(
+            plans[0],
+            json.loads(self.get_response(
+                '/api/plan?copper-cable=3').body))
+        self.assertEqual(
+            [(item['item'], item['rate']) for item in plans[1]['items']],
+            [('iron-plate', 2), ('iron-ore', 2)])
+        self.assertEqual(plans[2], {'items': []})
+
+    def test_post_too_many_plans(self):
+        response = self.post(json.dumps(
+            {'plans': [{'copper-cable': 3}] *
+                      (main.MAX_PLANS_PER_REQUEST + 1)}))
+        self.assertEqual(response.status_int, 400)
+        self.assertIn(b'at most %d plans' % main.MAX_PLANS_PER_REQUEST,
+                      response.body)
+        # The limit is checked before the plans are, so it is reported even
+        # if they are invalid.
+        response = self.post(json.dumps(
+            {'plans': [3] * (main.MAX_PLANS_PER_REQUEST + 1)}))
+        self.assertIn(b'at most %d plans' % main.MAX_PLANS_PER_REQUEST,
+                      response.body)
+
+    def test_post_malformed(self):
+        for body in ['{',
+                     '[]',
+                     '{}',
+                     '{"plans": 3}',
+                     '{"plans": {"copper-cable": 3}}',
+                     '{"plans": [3]}',
+                     '{"plans": [["copper-cable", 3]]}']:
+            response = self.post(body)
+            self.assertEqual(response.status_int, 400, body)
+            self.assertIn(b'invalid plan request', response.body)
+
+    def test_post_plan_not_object(self):
+        response = self.post('{"plans": [{"copper-cable": 3}, [1, 2]]}')
+        self.assertEqual(response.status_int, 400)
+        self.assertIn(b'every plan must be an object', response.body)
+
+    def test_unsustainable_cycle(self):
+        load_cyclic_recipes()
+        response = self.get_response('/api/plan?widget=1')
+        self.assertEqual(response.status_int, 200)
+        self.assertIn('cannot be sustained',
+                      json.loads(response.body)['error'])
+
+
+class TestStreamedMainPage(HandlerTestCase):
+
+    def setUp(self):
+        super(TestStreamedMainPage, self).setUp()
+        self.stream_large_plans = main.STREAM_LARGE_PLANS
+        self.min_streamed_plan_size = main.MIN_STREAMED_PLAN_SIZE
+        # Stream every plan with at least 3 items.
+        main.STREAM_LARGE_PLANS = True
+        main.MIN_STREAMED_PLAN_SIZE = 3
+
+    def tearDown(self):
+        main.STREAM_LARGE_PLANS = self.stream_large_plans
+        main.MIN_STREAMED_PLAN_SIZE = self.min_streamed_plan_size
+        super(TestStreamedMainPage, self).tearDown()
+
+    def test_small_plan_not_streamed(self):
+        response = self.get_response('/?iron-plate=1')
+        self.assertEqual(response.status_int, 200)
+        self.assertTrue(response.etag)
+
+    def test_streamed_then_cached(self):
+        streamed = self.get_response('/?copper-cable=3')
+        self.assertEqual(streamed.status_int, 200)
+        # The ETag is not known until the page has been written.
+        self.assertIsNone(streamed.etag)
+        for item_name in [b'Copper cable', b'Copper plate', b'Copper ore']:
+            self.assertIn(item_name, streamed.body)
+
+        cached = self.get_response('/?copper-cable=3')
+        self.assertEqual(cached.status_int, 200)
+        # The cached page lists the plan in the usual order.
+        self.assertEqual(
+            cached.body,
+            main.render_page(main.get_requirements([('copper-cable', 3)]),
+                             recipe_database.get_current()))
+        self.assertTrue(cached.etag)
+        not_modified = self.get_response(
+            '/?copper-cable=3',
+            headers={'If-None-Match': '"%s"' % cached.etag})
+        self.assertEqual(not_modified.status_int, 304)
+
+    def test_cached_template_not_streamed(self):
+        main.PLAN_TEMPLATES.get_template(['copper-cable'])
+        response = self.get_response('/?copper-cable=3')
+        self.assertEqual(response.status_int, 200)
+        self.assertTrue(response.etag)
+
+    def test_unsustainable_cycle(self):
+        load_cyclic_recipes()
+        response = self.get_response('/?widget=1')
+        # The status was sent before the cycle was found.
+        self.assertEqual(response.status_int, 200)
+        self.assertNotIn(b'</html>', response.body)
+        self.assertEqual(len(main.RESPONSE_CACHE), 0)
+
+    def test_disabled(self):
+        main.STREAM_LARGE_PLANS = False
+        response = self.get_response('/?copper-cable=3')
+        self.assertEqual(response.status_int, 200)
+        self.assertTrue(response.etag)
+
+
+class TestWarmup(HandlerTestCase):
+
+    def setUp(self):
+        super(TestWarmup, self).setUp()
+        self.warmup_requests = main.WARMUP_REQUESTS
+        main.WARMUP_REQUESTS = [[('copper-cable', 1)],
+                                [('unknown-item', 1)]]
+
+    def tearDown(self):
+        main.WARMUP_REQUESTS = self.warmup_requests
+        super(TestWarmup, self).tearDown()
+
+    def test_warmup(self):
+        response = self.get_response('/_ah/warmup')
+        self.assertEqual(response.status_int, 200)
+        self.assertEqual(response.content_type, 'text/plain')
+        self.assertIn(b'total', response.body)
+        self.assertIn(b'main.html', response.body)
+        # The page for the popular plan was cached.
+        database = recipe_database.get_current()
+        self.assertIsNotNone(main.RESPONSE_CACHE.get(
+            response_cache.canonical_key(
+                main.get_requirements([('copper-cable', 1)])),
+            database))
+
+
+class TestTiming(HandlerTestCase):
+
+    def setUp(self):
+        super(TestTiming, self).setUp()
+        timing.set_enabled(True)
+        timing.STATS.clear()
+
+    def tearDown(self):
+        timing.set_enabled(False)
+        timing.STATS.clear()
+        super(TestTiming, self).tearDown()
+
+    def get_stage_names(self, response):
+        return [stage_time.split(';')[0].strip() for stage_time in
+                response.headers['Server-Timing'].split(',')]
+
+    def test_server_timing(self):
+        response = self.get_response('/?copper-cable=3')
+        stage_names = self.get_stage_names(response)
+        self.assertEqual(stage_names[:2], ['parse', 'cache'])
+        self.assertEqual(stage_names[-2:], ['render', 'total'])
+        response = self.get_response('/api/plan?copper-cable=3')
+        self.assertIn('json', self.get_stage_names(response))
+        self.assertNotIn('render', self.get_stage_names(response))
+
+    def test_server_timing_aborted(self):
+        response = self.get_response('/api/plan', POST='{')
+        self.assertEqual(response.status_int, 400)
+        self.assertEqual(self.get_stage_names(response), ['parse', 'total'])
+
+    def test_disabled(self):
+        timing.set_enabled(False)
+        response = self.get_response('/?copper-cable=3')
+        self.assertNotIn('Server-Timing', response.headers)
+
+    def test_debug_stats(self):
+        self.get_response('/?copper-cable=3')
+        self.get_response('/?copper-cable=3')
+        response = self.get_response('/debug/stats')
+        self.assertEqual(response.status_int, 200)
+        self.assertEqual(response.content_type, 'application/json')
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+        stats = json.loads(response.body)
+        self.assertTrue(stats['enabled'])
+        self.assertEqual(stats['stages']['total']['count'], 2)
+        self.assertEqual(stats['stages']['render']['count'], 1)
+        self.assertEqual(stats['response_cache']['entries'], 1)
+        self.assertGreaterEqual(stats['response_cache']['hits'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
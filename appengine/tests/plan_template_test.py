@@ -0,0 +1,124 @@
+"""Tests for appengine.plan_template."""
+
+import io
+import json
+import os.path
+import unittest
+
+from factorio import names
+from factorio import recipe
+from factorio import recipe_database
+
+from appengine import icons
+from appengine import plan_template
+from appengine import produced_item
+
+
+def _describe(products):
+    return [(p.name,
+             p.username,
+             p.is_user_requested,
+             round(p.required_production_rate, 9),
+             p.production_machine_username,
+             p.num_production_machines_required,
+             sorted((s.name, round(rate, 9))
+                    for s, rate in p.suppliers.items()),
+             sorted((c.name if c else '', round(rate, 9))
+                    for c, rate in p.consumers.items()))
+            for p in products]
+
+
+class TestPlanTemplate(unittest.TestCase):
+
+    def setUp(self):
+        icons.init(os.path.join(os.path.dirname(__file__), 'icons'))
+        with open(os.path.join(os.path.dirname(__file__),
+                               'test-names.json'), 'r') as f:
+            names.names_from_json(f)
+        with open(os.path.join(os.path.dirname(__file__),
+                               'test-recipe.json'), 'r') as f:
+            recipe.Recipe.recipes_from_json(f)
+
+    def assertSamePlan(self, items_and_rates, products):
+        expected = produced_item.required_production_rates_to_produced_items(
+            recipe.calculate_required_production_rates(items_and_rates))
+        self.assertEqual(_describe(products), _describe(expected))
+
+    def test_rescale(self):
+        template = plan_template.PlanTemplate(
+            ['copper-cable', 'iron-plate'], recipe_database.get_current())
+        for rates in [[('copper-cable', 3), ('iron-plate', 2)],
+                      [('copper-cable', 30), ('iron-plate', 0.5)],
+                      [('iron-plate', 7), ('copper-cable', 0.01)]]:
+            self.assertSamePlan(rates, template.get_produced_items(rates))
+
+    def test_shared_ingredients(self):
+        template = plan_template.PlanTemplate(
+            ['copper-cable', 'copper-plate'], recipe_database.get_current())
+        rates = [('copper-cable', 4), ('copper-plate', 1)]
+        self.assertSamePlan(rates, template.get_produced_items(rates))
+
+    def test_cache(self):
+        cache = plan_template.PlanTemplateCache(max_entries=1)
+        template = cache.get_template(['copper-cable', 'iron-plate'])
+        self.assertIs(cache.get_template(['iron-plate', 'copper-cable']),
+                      template)
+
+        cache.get_template(['sulfur'])
+        self.assertEqual(len(cache), 1)
+        self.assertIsNot(cache.get_template(['copper-cable', 'iron-plate']),
+                         template)
+
+    def test_has_template(self):
+        cache = plan_template.PlanTemplateCache()
+        self.assertFalse(cache.has_template(['copper-cable']))
+        # Checking does not build the template.
+        self.assertEqual(len(cache), 0)
+        cache.get_template(['copper-cable'])
+        self.assertTrue(cache.has_template(['copper-cable']))
+        self.assertFalse(cache.has_template(['copper-cable'],
+                                            self._create_database({})))
+
+    def _create_database(self, recipes):
+        return recipe_database.get_current().with_recipe_tables(
+            recipe.Recipe.recipe_tables_from_json(
+                io.BytesIO(json.dumps(recipes).encode('utf-8'))))
+
+    def test_cache_new_database(self):
+        cache = plan_template.PlanTemplateCache()
+        template = cache.get_template(['copper-cable'])
+        with open(os.path.join(os.path.dirname(__file__),
+                               'test-recipe.json'), 'r') as f:
+            recipe.Recipe.recipes_from_json(f)
+        new_template = cache.get_template(['copper-cable'])
+        self.assertIsNot(new_template, template)
+        self.assertIs(new_template._edges, template._edges)
+        self.assertIs(cache.get_template(['copper-cable']), new_template)
+        rates = [('copper-cable', 3)]
+        self.assertSamePlan(rates, new_template.get_produced_items(rates))
+
+    def test_cache_new_database_changed_recipes(self):
+        with open(os.path.join(os.path.dirname(__file__),
+                               'test-recipe.json'), 'r') as f:
+            recipes = json.load(f)
+        cache = plan_template.PlanTemplateCache()
+        copper_cable = cache.get_template(['copper-cable'])
+        iron_plate = cache.get_template(['iron-plate'])
+
+        recipes['copper-cable']['result_count'] = 1
+        database = self._create_database(recipes)
+        self.assertIs(cache.get_template(['iron-plate'], database)._edges,
+                      iron_plate._edges)
+        new_copper_cable = cache.get_template(['copper-cable'], database)
+        self.assertIsNot(new_copper_cable._edges, copper_cable._edges)
+        recipe_database.publish(database)
+        rates = [('copper-cable', 3)]
+        self.assertSamePlan(rates, new_copper_cable.get_produced_items(rates))
+
+    def test_get_produced_items(self):
+        cache = plan_template.PlanTemplateCache()
+        rates = [('sulfur', 10)]
+        self.assertSamePlan(rates, cache.get_produced_items(rates))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,6 +4,7 @@ import os.path
 import unittest
 
 from factorio import names
+from factorio import production
 from factorio import recipe
 
 from appengine import icons
@@ -223,5 +224,107 @@ class TestProducedItem(unittest.TestCase):
             'http://www.factorioforums.com/wiki/index.php?title=Iron_ore')
         self.assertEqual(iron_ore_item.required_production_rate, 100)
 
+    def test_roots_first_leaves_last(self):
+        rates = recipe.calculate_required_production_rates(
+            [('copper-cable', 10), ('iron-plate', 10)])
+
+        products = (
+            produced_item.required_production_rates_to_produced_items(rates))
+        self.assertEqual([p.name for p in products],
+                         ['copper-cable',
+                          'copper-plate', 'iron-plate',
+                          'copper-ore', 'iron-ore'])
+
+    def test_complete_item_is_frozen(self):
+        rates = recipe.calculate_required_production_rates(
+            [('copper-plate', 5)])
+
+        copper_plate_item, _ = (
+            produced_item.required_production_rates_to_produced_items(rates))
+        with self.assertRaises(AttributeError):
+            copper_plate_item.required_production_rate = 10
+        with self.assertRaises(AttributeError):
+            copper_plate_item.color = 'red'
+        self.assertEqual(copper_plate_item.required_production_rate, 5)
+
+    def test_produced_items_by_policy(self):
+        rates = recipe.calculate_required_production_rates(
+            [('copper-cable', 1)])
+
+        fastest, fixed_tier = (
+            produced_item.required_production_rates_to_produced_items_by_policy(
+                rates,
+                [production.FastestPolicy(),
+                 production.FixedTierPolicy('assembling-machine-1')]))
+        self.assertEqual([p.name for p in fastest],
+                         ['copper-cable', 'copper-plate', 'copper-ore'])
+        self.assertEqual([p.name for p in fixed_tier],
+                         ['copper-cable', 'copper-plate', 'copper-ore'])
+        self.assertEqual(fastest[0].production_machine_username,
+                         'Assembling machine 3')
+        self.assertEqual(fixed_tier[0].production_machine_username,
+                         'assembling-machine-1')  # No English name.
+        self.assertEqual(fastest[0].suppliers, {fastest[1]: 0.5})
+        self.assertEqual(fixed_tier[0].suppliers, {fixed_tier[1]: 0.5})
+        # Only assembling machines are affected by the policy.
+        self.assertEqual(fixed_tier[1].production_machine_username,
+                         'Electric furnace')
+
+    def test_produced_items_to_json(self):
+        rates = recipe.calculate_required_production_rates(
+            [('copper-plate', 5)])
+
+        self.assertEqual(
+            produced_item.produced_items_to_json(
+                produced_item.required_production_rates_to_produced_items(
+                    rates)),
+            [{'item': 'copper-plate',
+              'rate': 5,
+              'requested': True,
+              'suppliers': {'copper-ore': 5},
+              'consumers': {},
+              'machine': 'electric-furnace',
+              'machines': 9},
+             {'item': 'copper-ore',
+              'rate': 5,
+              'requested': False,
+              'suppliers': {},
+              'consumers': {'copper-plate': 5},
+              'machine': None,
+              'machines': None}])
+
+    def test_iter_produced_items(self):
+        requested = [('copper-cable', 10), ('iron-plate', 10)]
+
+        products = list(produced_item.iter_produced_items(
+            recipe.iter_required_production_rates(requested)))
+        expected = produced_item.required_production_rates_to_produced_items(
+            recipe.calculate_required_production_rates(requested))
+        self.assertEqual(
+            sorted((p.name, p.required_production_rate,
+                    p.num_production_machines_required,
+                    sorted(s.name for s in p.suppliers))
+                   for p in products),
+            sorted((p.name, p.required_production_rate,
+                    p.num_production_machines_required,
+                    sorted(s.name for s in p.suppliers))
+                   for p in expected))
+        # Suppliers are the same objects as the ProductedItems yielded later.
+        cable = products[[p.name for p in products].index('copper-cable')]
+        self.assertIn(list(cable.suppliers)[0], products)
+
+    def test_cycle_order(self):
+        rates = [('widget', {'gadget': 1}, {None: 1}),
+                 ('gadget', {'widget': 1, 'iron-ore': 1}, {'widget': 1}),
+                 ('iron-ore', {}, {'gadget': 1}),
+                 ('doohickey', {'widget': 1}, {None: 1})]
+
+        products = (
+            produced_item.required_production_rates_to_produced_items(rates))
+        # 'gadget' and 'widget' supply each other so they are in the same
+        # layer.
+        self.assertEqual([p.name for p in products],
+                         ['doohickey', 'gadget', 'widget', 'iron-ore'])
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,89 @@
+"""Tests for appengine.profiling."""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from appengine import profiling
+
+
+def application(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [b'Hello', b' World']
+
+
+def slow_application(environ, start_response):
+    time.sleep(0.01)
+    return application(environ, start_response)
+
+
+class TestProfiling(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def call(self, app, query=''):
+        return b''.join(app({'REQUEST_METHOD': 'GET',
+                             'PATH_INFO': '/',
+                             'QUERY_STRING': query},
+                            lambda status, headers: None))
+
+    def test_canonical_request(self):
+        self.assertEqual(
+            'GET /?iron-gear-wheel=1&pipe=2',
+            profiling.canonical_request({'REQUEST_METHOD': 'GET',
+                                         'PATH_INFO': '/',
+                                         'QUERY_STRING': 'pipe=2&'
+                                                         'iron-gear-wheel=1'}))
+        self.assertEqual(
+            'POST /api/plan',
+            profiling.canonical_request({'REQUEST_METHOD': 'POST',
+                                         'PATH_INFO': '/api/plan'}))
+
+    def test_parse_profile_path(self):
+        request = 'GET /?iron-gear-wheel=1&pipe=2'
+        path = os.path.join(
+            self.directory,
+            profiling.get_profile_file_name(request, 0.25, 1500000000, 3))
+        profile = profiling.parse_profile_path(path)
+        self.assertEqual(request, profile.request)
+        self.assertEqual(path, profile.path)
+        self.assertAlmostEqual(0.25, profile.seconds)
+        self.assertAlmostEqual(1500000000, profile.timestamp)
+        self.assertRaises(ValueError, profiling.parse_profile_path,
+                          'README.txt')
+
+    def test_not_sampled(self):
+        app = profiling.ProfilingMiddleware(
+            application, self.directory, sample_rate=0.5,
+            random=lambda: 0.5)
+        self.assertEqual(b'Hello World', self.call(app))
+        self.assertEqual([], profiling.list_profiles(self.directory))
+
+    def test_sampled(self):
+        app = profiling.ProfilingMiddleware(
+            application, self.directory, sample_rate=0.5,
+            random=lambda: 0.4)
+        self.assertEqual(b'Hello World', self.call(app, 'pipe=1'))
+        [profile] = profiling.list_profiles(self.directory)
+        self.assertEqual('GET /?pipe=1', profile.request)
+
+    def test_slow_requests(self):
+        fast_app = profiling.ProfilingMiddleware(
+            application, self.directory, slow_seconds=0.005)
+        slow_app = profiling.ProfilingMiddleware(
+            slow_application, self.directory, slow_seconds=0.005)
+        self.assertEqual(b'Hello World', self.call(fast_app, 'pipe=1'))
+        self.assertEqual(b'Hello World', self.call(slow_app, 'pipe=2'))
+        [profile] = profiling.list_profiles(self.directory)
+        self.assertEqual('GET /?pipe=2', profile.request)
+        self.assertGreaterEqual(profile.seconds, 0.005)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+"""Tests for appengine.reloader."""
+
+import json
+import os
+import os.path
+import shutil
+import tempfile
+import unittest
+
+from factorio import recipe
+from factorio import recipe_database
+from factorio import snapshot
+
+from appengine import data
+from appengine import reloader
+
+
+class TestDataReloader(unittest.TestCase):
+
+    def setUp(self):
+        self.original_database = recipe_database.get_current()
+        self.data_directory_path = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.data_directory_path, 'icons'))
+        with open(os.path.join(os.path.dirname(__file__),
+                               'test-recipe.json'), 'r') as f:
+            self.recipes = json.load(f)
+        self._write_json('recipes.json', self.recipes)
+        self._write_json('names.json',
+                         {'item-names': {}, 'recipe-names': {}})
+        data.load(self.data_directory_path)
+        self.reloader = reloader.DataReloader(self.data_directory_path)
+
+    def tearDown(self):
+        recipe_database.publish(self.original_database)
+        shutil.rmtree(self.data_directory_path)
+
+    def _write_json(self, file_name, obj, mtime_offset=10):
+        path = os.path.join(self.data_directory_path, file_name)
+        with open(path, 'w') as f:
+            json.dump(obj, f)
+        # Make sure that the change is visible even with a coarse mtime.
+        mtime = os.path.getmtime(path) + mtime_offset
+        os.utime(path, (mtime, mtime))
+
+    def _write_snapshot(self):
+        """Writes a snapshot of the current files that is newer than them."""
+        snapshot_path = os.path.join(self.data_directory_path,
+                                     snapshot.SNAPSHOT_FILE_NAME)
+        with open(os.path.join(self.data_directory_path,
+                               'recipes.json'), 'r') as recipes_file:
+            with open(os.path.join(self.data_directory_path,
+                                   'names.json'), 'r') as names_file:
+                snapshot.write_snapshot(
+                    snapshot.create_snapshot(recipes_file, names_file, {}),
+                    snapshot_path)
+        mtime = os.path.getmtime(snapshot_path) + 20
+        os.utime(snapshot_path, (mtime, mtime))
+        return snapshot_path
+
+    def test_check_unchanged(self):
+        database = recipe_database.get_current()
+        self.assertFalse(self.reloader.check())
+        self.assertIs(recipe_database.get_current(), database)
+
+    def test_check_changed_names(self):
+        self._write_json('names.json',
+                         {'item-names': {'iron-plate': 'Iron plate'},
+                          'recipe-names': {}})
+        self.assertTrue(self.reloader.check())
+        self.assertEqual(
+            recipe_database.get_current().item_names,
+            {'iron-plate': 'Iron plate'})
+        self.assertFalse(self.reloader.check())
+
+    def test_check_changed_icons(self):
+        with open(os.path.join(self.data_directory_path, 'icons',
+                               'iron-plate.png'), 'w'):
+            pass
+        self.assertTrue(self.reloader.check())
+        self.assertIn('iron-plate', recipe_database.get_current().icons)
+
+    def test_check_keeps_unaffected_requirements(self):
+        bill_of_materials = recipe_database.get_current().bill_of_materials
+        copper_cable = bill_of_materials.get_unit_requirements('copper-cable')
+        iron_plate = bill_of_materials.get_unit_requirements('iron-plate')
+
+        self.recipes['copper-plate']['energy_required'] = 2
+        self.recipes['copper-cable']['result_count'] = 1
+        self._write_json('recipes.json', self.recipes)
+        self.assertTrue(self.reloader.check())
+
+        bill_of_materials = recipe_database.get_current().bill_of_materials
+        self.assertIs(bill_of_materials.get_unit_requirements('iron-plate'),
+                      iron_plate)
+        self.assertIsNot(
+            bill_of_materials.get_unit_requirements('copper-cable'),
+            copper_cable)
+        self.assertEqual(
+            recipe.calculate_required_production_rates([('copper-cable', 2)]),
+            [('copper-cable', {'copper-plate': 2.0}, {None: 2}),
+             ('copper-ore', {}, {'copper-plate': 2.0}),
+             ('copper-plate', {'copper-ore': 2.0}, {'copper-cable': 2.0})])
+
+    def test_build_database_uses_current_snapshot(self):
+        snapshot_path = self._write_snapshot()
+        self.assertTrue(data.is_snapshot_current(self.data_directory_path,
+                                                 snapshot_path))
+
+    def test_check_changed_names_with_stale_snapshot(self):
+        snapshot_path = self._write_snapshot()
+        self.reloader = reloader.DataReloader(self.data_directory_path)
+        # Newer than the snapshot.
+        self._write_json('names.json',
+                         {'item-names': {'iron-plate': 'Iron plate'},
+                          'recipe-names': {}},
+                         mtime_offset=60)
+        self.assertFalse(data.is_snapshot_current(self.data_directory_path,
+                                                  snapshot_path))
+        self.assertTrue(self.reloader.check())
+        self.assertEqual(
+            recipe_database.get_current().item_names,
+            {'iron-plate': 'Iron plate'})
+
+    def test_start_and_stop(self):
+        polling_reloader = reloader.DataReloader(self.data_directory_path,
+                                                 poll_interval=0.01)
+        polling_reloader.start()
+        polling_reloader.stop()
+
+if __name__ == '__main__':
+    unittest.main()
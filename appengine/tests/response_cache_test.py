@@ -0,0 +1,86 @@
+"""Tests for appengine.response_cache."""
+
+import unittest
+
+from appengine import response_cache
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000
+
+    def __call__(self):
+        return self.now
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.database = object()
+
+    def test_canonical_key(self):
+        self.assertEqual(
+            response_cache.canonical_key([('b', 1.0), ('a', 2.0)]),
+            response_cache.canonical_key([('a', 2.0), ('b', 1.0)]))
+        self.assertNotEqual(
+            response_cache.canonical_key([('a', 1.0)]),
+            response_cache.canonical_key([('a', 2.0)]))
+
+    def test_get_and_put(self):
+        cache = response_cache.ResponseCache(clock=self.clock)
+        self.assertIsNone(cache.get('key', self.database))
+        put_response = cache.put('key', self.database, b'body')
+        get_response = cache.get('key', self.database)
+        self.assertEqual(get_response, put_response)
+        self.assertEqual(get_response.body, b'body')
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 1)
+
+    def test_etag(self):
+        cache = response_cache.ResponseCache(clock=self.clock)
+        response1 = cache.put('key1', self.database, b'body')
+        response2 = cache.put('key2', self.database, b'body')
+        response3 = cache.put('key3', self.database, b'other body')
+        self.assertEqual(response1.etag, response2.etag)
+        self.assertNotEqual(response1.etag, response3.etag)
+
+    def test_expiry(self):
+        cache = response_cache.ResponseCache(time_to_live=10,
+                                             clock=self.clock)
+        cache.put('key', self.database, b'body')
+        self.clock.now += 9
+        self.assertIsNotNone(cache.get('key', self.database))
+        self.clock.now += 1
+        self.assertIsNone(cache.get('key', self.database))
+        self.assertEqual(len(cache), 0)
+
+    def test_max_entries(self):
+        cache = response_cache.ResponseCache(max_entries=2, clock=self.clock)
+        cache.put('key1', self.database, b'body1')
+        cache.put('key2', self.database, b'body2')
+        cache.get('key1', self.database)
+        cache.put('key3', self.database, b'body3')
+        # 'key2' is the least recently used.
+        self.assertIsNotNone(cache.get('key1', self.database))
+        self.assertIsNone(cache.get('key2', self.database))
+        self.assertIsNotNone(cache.get('key3', self.database))
+
+    def test_max_bytes(self):
+        cache = response_cache.ResponseCache(max_bytes=10, clock=self.clock)
+        cache.put('key1', self.database, b'12345')
+        cache.put('key2', self.database, b'123456')
+        self.assertIsNone(cache.get('key1', self.database))
+        self.assertIsNotNone(cache.get('key2', self.database))
+        cache.put('key3', self.database, b'12345678901')
+        self.assertIsNone(cache.get('key3', self.database))
+        self.assertIsNotNone(cache.get('key2', self.database))
+
+    def test_new_database(self):
+        cache = response_cache.ResponseCache(clock=self.clock)
+        cache.put('key', self.database, b'body')
+        self.assertIsNone(cache.get('key', object()))
+        self.assertEqual(len(cache), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+"""Tests for appengine.templates."""
+
+import os.path
+import shutil
+import tempfile
+import unittest
+
+try:
+    import jinja2
+    from appengine import templates
+except ImportError:
+    jinja2 = None
+
+
+@unittest.skipIf(jinja2 is None, 'requires Jinja')
+class TestTemplates(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        templates.init()
+        shutil.rmtree(self.directory)
+
+    def test_compiled_templates_loaded(self):
+        templates.compile_templates(self.directory)
+        self.assertTrue(templates.can_load_compiled_templates(self.directory))
+        templates.init(self.directory)
+        self.assertIsInstance(templates.get_environment().loader,
+                              jinja2.ChoiceLoader)
+        self.assertIsNotNone(templates.get_template('main.html'))
+
+    def test_compiled_by_other_version_ignored(self):
+        templates.compile_templates(self.directory)
+        with open(os.path.join(self.directory,
+                               templates.JINJA_VERSION_FILE_NAME), 'w') as f:
+            f.write('2.6\n')
+        self.assertFalse(templates.can_load_compiled_templates(self.directory))
+        templates.init(self.directory)
+        self.assertIsInstance(templates.get_environment().loader,
+                              jinja2.FileSystemLoader)
+        self.assertIsNotNone(templates.get_template('main.html'))
+
+    def test_unknown_version_ignored(self):
+        templates.compile_templates(self.directory)
+        os.remove(os.path.join(self.directory,
+                               templates.JINJA_VERSION_FILE_NAME))
+        self.assertFalse(templates.can_load_compiled_templates(self.directory))
+
+
+if __name__ == '__main__':
+    unittest.main()
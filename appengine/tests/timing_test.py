@@ -0,0 +1,82 @@
+"""Tests for appengine.timing."""
+
+import json
+import re
+import unittest
+
+from appengine import timing
+
+
+class TestTiming(unittest.TestCase):
+
+    def setUp(self):
+        timing.set_enabled(True)
+
+    def tearDown(self):
+        timing.set_enabled(False)
+
+    def test_disabled(self):
+        timing.set_enabled(False)
+        self.assertIsNone(timing.start_request())
+        self.assertIs(timing.stage('parse'), timing.stage('render'))
+        with timing.stage('parse'):
+            pass
+
+    def test_stage_outside_request(self):
+        self.assertIs(timing.stage('parse'), timing._NULL_STAGE)
+
+    def test_request(self):
+        stats = timing.LatencyStats()
+        timer = timing.start_request()
+        with timing.stage('parse'):
+            pass
+        with timing.stage('render'):
+            pass
+        with timing.stage('parse'):
+            pass
+        self.assertEqual(['parse', 'render'],
+                         [name for name, _ in timer.stage_times])
+        server_timing = timer.get_server_timing()
+        self.assertTrue(re.match(
+            r'^parse;dur=[0-9.]+, render;dur=[0-9.]+, total;dur=[0-9.]+$',
+            server_timing), server_timing)
+        timing.finish_request(timer, stats)
+        self.assertIs(timing.stage('parse'), timing._NULL_STAGE)
+        self.assertEqual({'parse', 'render', 'total'},
+                         set(stats.get_summary()))
+
+    def test_histogram_percentiles(self):
+        histogram = timing.LatencyHistogram()
+        self.assertIsNone(histogram.get_percentile(50))
+        for ms in range(1, 101):
+            histogram.add(ms / 1000.0)
+        for percentile in [50, 95, 99]:
+            latency = histogram.get_percentile(percentile)
+            self.assertGreaterEqual(latency, percentile / 1000.0)
+            self.assertLessEqual(latency, percentile / 1000.0 * 1.1)
+        histogram.add(1e6)
+        self.assertEqual(timing.LatencyHistogram.BOUNDS[-1],
+                         histogram.get_percentile(100))
+
+    def test_summary(self):
+        stats = timing.LatencyStats()
+        for _ in range(99):
+            stats.add('solve', 0.001)
+        stats.add('solve', 0.5)
+        summary = stats.get_summary()['solve']
+        self.assertEqual(100, summary['count'])
+        self.assertAlmostEqual(1, summary['p50'], delta=0.1)
+        self.assertAlmostEqual(1, summary['p99'], delta=0.1)
+        stats.add('solve', 0.5)
+        self.assertAlmostEqual(500, stats.get_summary()['solve']['p99'],
+                               delta=50)
+        stats.add('solve', 1e6)
+        # Can be encoded as JSON.
+        self.assertEqual(stats.get_summary(),
+                         json.loads(json.dumps(stats.get_summary())))
+        stats.clear()
+        self.assertEqual({}, stats.get_summary())
+
+
+if __name__ == '__main__':
+    unittest.main()
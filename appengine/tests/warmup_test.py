@@ -0,0 +1,66 @@
+"""Tests for appengine.warmup."""
+
+import os.path
+import unittest
+
+try:
+    import jinja2
+except ImportError:
+    jinja2 = None
+
+from factorio import recipe
+from factorio import recipe_database
+
+from appengine import item_list
+from appengine import plan_template
+from appengine import warmup
+
+
+class TestWarmup(unittest.TestCase):
+
+    def setUp(self):
+        with open(os.path.join(os.path.dirname(__file__),
+                               'test-recipe.json'), 'r') as f:
+            recipe.Recipe.recipes_from_json(f)
+        self.plan_templates = plan_template.PlanTemplateCache()
+
+    def test_warm_up(self):
+        prepared = []
+        timings = warmup.warm_up(
+            self.plan_templates,
+            popular_requests=[[('copper-cable', 1)],
+                              [('copper-cable', 1), ('iron-plate', 2)],
+                              [('science-pack-1', 1)]],
+            template_names=[],
+            prepare_request=lambda requirements, database: prepared.append(
+                requirements))
+
+        self.assertEqual(
+            [step for step, _ in timings],
+            ['item list',
+             'plan copper-cable',
+             'prepare plan copper-cable',
+             'plan copper-cable,iron-plate',
+             'prepare plan copper-cable,iron-plate'])
+        for _, seconds in timings:
+            self.assertGreaterEqual(seconds, 0)
+        self.assertEqual(prepared, [[('copper-cable', 1)],
+                                    [('copper-cable', 1), ('iron-plate', 2)]])
+        self.assertEqual(len(self.plan_templates), 2)
+
+        database = recipe_database.get_current()
+        template = self.plan_templates.get_template(['copper-cable'])
+        self.assertIs(self.plan_templates.get_template(['copper-cable'],
+                                                       database),
+                      template)
+        self.assertIs(item_list.get_item_list(database),
+                      item_list.get_item_list(database))
+
+    @unittest.skipIf(jinja2 is None, 'requires Jinja')
+    def test_warm_up_templates(self):
+        timings = warmup.warm_up(self.plan_templates, popular_requests=[])
+        self.assertEqual([step for step, _ in timings],
+                         ['item list', 'template main.html'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,215 @@
+"""Lightweight timing of the stages of handling a request.
+
+Code on the request path marks its stages with:
+
+    with timing.stage('render'):
+        ...
+
+While a request is being timed (see start_request), the time spent in each
+stage is recorded for the request, sent in its Server-Timing header and
+aggregated into latency histograms that are reported by /debug/stats.
+
+Timing is disabled by default. When it is disabled, stage() returns a shared
+context manager that does nothing.
+"""
+
+import bisect
+import threading
+import timeit
+
+_clock = timeit.default_timer
+
+_enabled = False
+_local = threading.local()
+
+
+def set_enabled(enabled):
+    """Enable or disable timing for requests started afterwards."""
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled():
+    return _enabled
+
+
+class _NullStage(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage(object):
+    __slots__ = ('_timer', '_name', '_start')
+
+    def __init__(self, timer, name):
+        self._timer = timer
+        self._name = name
+
+    def __enter__(self):
+        self._start = _clock()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._timer.add(self._name, _clock() - self._start)
+        return False
+
+
+def stage(name):
+    """Returns a context manager that times a stage of the current request.
+
+    Args:
+        name: The name of the stage e.g. 'render'. A token, as defined by
+            the Server-Timing specification. The times of stages with the
+            same name are added together.
+    """
+    if not _enabled:
+        return _NULL_STAGE
+    timer = getattr(_local, 'timer', None)
+    if timer is None:
+        return _NULL_STAGE
+    return _Stage(timer, name)
+
+
+class RequestTimer(object):
+    """The time spent in each stage of a single request."""
+
+    def __init__(self):
+        self.start = _clock()
+        self.stage_times = []
+        self._stage_to_index = {}
+
+    def add(self, name, seconds):
+        """Adds time spent in a stage."""
+        index = self._stage_to_index.get(name)
+        if index is None:
+            self._stage_to_index[name] = len(self.stage_times)
+            self.stage_times.append((name, seconds))
+        else:
+            self.stage_times[index] = (name, self.stage_times[index][1] +
+                                       seconds)
+
+    def get_server_timing(self):
+        """Returns the value of the Server-Timing header for the request.
+
+        e.g. 'parse;dur=0.051, render;dur=3.200, total;dur=3.310'
+        """
+        stage_times = self.stage_times + [('total', _clock() - self.start)]
+        return ', '.join('%s;dur=%.3f' % (name, seconds * 1000)
+                         for name, seconds in stage_times)
+
+
+def start_request():
+    """Starts timing a request handled by the current thread.
+
+    Returns:
+        A RequestTimer that must be passed to finish_request or None if
+        timing is disabled.
+    """
+    if not _enabled:
+        return None
+    timer = _local.timer = RequestTimer()
+    return timer
+
+
+def finish_request(timer, stats=None):
+    """Finishes timing a request started with start_request.
+
+    Args:
+        timer: The RequestTimer returned by start_request.
+        stats: The LatencyStats to add the request's times to or None to use
+            STATS.
+    """
+    _local.timer = None
+    stats = stats or STATS
+    for name, seconds in timer.stage_times:
+        stats.add(name, seconds)
+    stats.add('total', _clock() - timer.start)
+
+
+class LatencyHistogram(object):
+    """A histogram of latencies with logarithmically sized buckets.
+
+    Latencies are recorded with a relative error of at most 10%, which keeps
+    the histogram small and fast to update regardless of the number of
+    latencies recorded.
+    """
+
+    # The upper bounds of the buckets, in seconds, from 10us to ~100s.
+    BOUNDS = [1e-5 * 1.1 ** i for i in range(170)]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+
+    def get_percentile(self, percentile):
+        """Returns an upper bound of the latency at the given percentile.
+
+        Args:
+            percentile: The percentile e.g. 95.
+
+        Returns:
+            The latency in seconds, or None if no latencies were recorded.
+            Latencies above the largest bucket are reported as its upper
+            bound, so that they can be encoded as JSON.
+        """
+        if not self.count:
+            return None
+        rank = percentile / 100.0 * self.count
+        total = 0
+        for index, count in enumerate(self.counts):
+            total += count
+            if total >= rank and count:
+                return self.BOUNDS[min(index, len(self.BOUNDS) - 1)]
+        return self.BOUNDS[-1]
+
+
+class LatencyStats(object):
+    """Thread-safe latency histograms for each stage of handling requests."""
+
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stage_to_histogram = {}
+
+    def add(self, name, seconds):
+        with self._lock:
+            histogram = self._stage_to_histogram.get(name)
+            if histogram is None:
+                histogram = self._stage_to_histogram[name] = (
+                    LatencyHistogram())
+            histogram.add(seconds)
+
+    def get_summary(self):
+        """Returns the count and latency percentiles of each stage.
+
+        Returns:
+            A dictionary {<stage>: {'count': <count>, 'p50': <ms>, 'p95': <ms>,
+            'p99': <ms>}} where <ms> is a latency in milliseconds.
+        """
+        with self._lock:
+            summary = {}
+            for name, histogram in self._stage_to_histogram.items():
+                stage_summary = summary[name] = {'count': histogram.count}
+                for percentile in self.PERCENTILES:
+                    stage_summary['p%d' % percentile] = round(
+                        histogram.get_percentile(percentile) * 1000, 3)
+            return summary
+
+    def clear(self):
+        with self._lock:
+            self._stage_to_histogram.clear()
+
+
+STATS = LatencyStats()
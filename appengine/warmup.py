@@ -0,0 +1,80 @@
+"""Prepares a new instance to serve requests quickly.
+
+App Engine sends a warmup request (see main.WarmupHandler) to a new instance
+before sending it user requests. Warming up builds the indexes and compiles
+the templates that the first requests would otherwise pay for and solves
+popular plans so that they are already cached.
+"""
+
+import logging
+import time
+
+from factorio import recipe_database
+
+from appengine import item_list
+
+# Plans that are requested often, as sequences of (<item>, <rate>) pairs.
+DEFAULT_POPULAR_REQUESTS = [
+    [('science-pack-1', 1)],
+    [('science-pack-2', 1)],
+    [('science-pack-3', 1)],
+    [('alien-science-pack', 1)],
+]
+
+DEFAULT_TEMPLATE_NAMES = ['main.html']
+
+
+def warm_up(plan_templates,
+            popular_requests=DEFAULT_POPULAR_REQUESTS,
+            template_names=DEFAULT_TEMPLATE_NAMES,
+            prepare_request=None,
+            database=None):
+    """Fills the caches needed to serve requests.
+
+    Args:
+        plan_templates: The plan_template.PlanTemplateCache to solve the
+            popular requests into.
+        popular_requests: A sequence of plans to solve, each a sequence of
+            (<item>, <rate>) pairs. Plans containing items that cannot be
+            produced are skipped.
+        template_names: The names of the templates to compile.
+        prepare_request: A function called with each popular plan and the
+            database after it is solved e.g. to render and cache the page for
+            the plan. May be None.
+        database: The factorio.recipe_database.RecipeDatabase to use or None
+            to use the current one.
+
+    Returns:
+        A list of (<step>, <seconds>) pairs describing the time taken by each
+        step of warming up, in the order that they were run.
+    """
+    database = database or recipe_database.get_current()
+    timings = []
+
+    def timed(step, function, *args):
+        start = time.time()
+        function(*args)
+        timings.append((step, time.time() - start))
+
+    timed('item list', item_list.get_item_list, database)
+
+    if template_names:
+        # Imported here so that warming up does not require Jinja if there
+        # are no templates to compile.
+        from appengine import templates
+        for template_name in template_names:
+            timed('template %s' % template_name,
+                  templates.get_template, template_name)
+
+    for requirements in popular_requests:
+        item_names = [item_name for item_name, _ in requirements]
+        step = 'plan %s' % ','.join(item_names)
+        if not all(item_name in database.recipes_by_single_result
+                   for item_name in item_names):
+            logging.info('Not warming up unproduceable %s', step)
+            continue
+        timed(step, plan_templates.get_produced_items, requirements, database)
+        if prepare_request is not None:
+            timed('prepare %s' % step, prepare_request, requirements,
+                  database)
+    return timings
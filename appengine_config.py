@@ -3,11 +3,52 @@
 See https://cloud.google.com/appengine/docs/python/tools/appengineconfig?csw=1#Python_Module_Configuration
 """
 
-from appengine import icons
+import os
 
-from factorio import names
-from factorio import recipe
+from appengine import data
+from appengine import templates
+from appengine import timing
 
-icons.init('factorio-data/icons')
-names.names_from_json(open('factorio-data/names.json', 'r'))
-recipe.Recipe.recipes_from_json(open('factorio-data/recipes.json', 'r'))
+DATA_DIRECTORY_PATH = 'factorio-data'
+
+IS_DEVELOPMENT_SERVER = os.environ.get('SERVER_SOFTWARE', '').startswith(
+    'Development')
+
+# The extracted data only changes while the development server is running.
+data.load(DATA_DIRECTORY_PATH, check_snapshot=IS_DEVELOPMENT_SERVER)
+
+if os.environ.get('ENABLE_TIMING', '').lower() == 'true':
+    timing.set_enabled(True)
+
+if IS_DEVELOPMENT_SERVER:
+    # Only needed, and only imported, by the development server.
+    from appengine import reloader
+
+    # Pick up re-extracted data without restarting the development server.
+    reloader.DataReloader(DATA_DIRECTORY_PATH).start()
+else:
+    # Use the templates compiled by extract_factorio_data.py. The
+    # development server compiles them from source so that changes to them
+    # are picked up.
+    templates.init(os.path.join(DATA_DIRECTORY_PATH,
+                                templates.COMPILED_TEMPLATES_DIR_NAME))
+
+
+def webapp_add_wsgi_middleware(app):
+    """Profile requests if PROFILE_DIRECTORY is set, see appengine.profiling.
+
+    PROFILE_SAMPLE_RATE is the fraction of requests to profile and, if set,
+    every request taking at least PROFILE_SLOW_MS milliseconds is profiled.
+    """
+    profile_directory = os.environ.get('PROFILE_DIRECTORY')
+    if not profile_directory:
+        return app
+
+    from appengine import profiling
+
+    slow_ms = os.environ.get('PROFILE_SLOW_MS')
+    return profiling.ProfilingMiddleware(
+        app,
+        profile_directory,
+        sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', 0)),
+        slow_seconds=float(slow_ms) / 1000 if slow_ms else None)
@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+"""Measures the throughput of the webapp without a network or a server.
+
+Requests modelled on real traffic are sent directly to appengine.main.app
+through WSGI from several threads in each of several processes. The
+throughput, latency and memory use are written as JSON so that the results
+of two revisions can be compared. Run from the directory containing app.yaml:
+
+    $ python -m benchmarks.loadtest --output before.json
+    $ python -m benchmarks.loadtest --output after.json --baseline before.json
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import multiprocessing
+import random
+import resource
+import sys
+import threading
+import timeit
+import wsgiref.util
+
+try:
+    from urllib import urlencode
+except ImportError:
+    from urllib.parse import urlencode
+
+SCIENCE_PACKS = ['science-pack-1', 'science-pack-2', 'science-pack-3',
+                 'military-science-pack', 'production-science-pack',
+                 'high-tech-science-pack', 'alien-science-pack']
+
+# The kinds of request made and how often each is made, relative to the
+# others.
+QUERY_MIX = [
+    ('single item', 50),
+    ('science packs', 20),
+    ('factory', 10),
+    ('unknown item', 5),
+    ('extreme rate', 5),
+    ('api', 10),
+]
+
+# Rates are usually small round numbers, so the same plans are requested
+# repeatedly, as they are by people sharing links.
+COMMON_RATES = [0.5, 1, 1, 1, 2, 5, 10, 60]
+
+
+class QueryGenerator(object):
+    """Generates (<kind>, <path>, <query string>) requests from QUERY_MIX."""
+
+    def __init__(self, item_names, seed, max_rate):
+        """Initialize the generator.
+
+        Args:
+            item_names: A sequence of the names of the items that can be
+                produced.
+            seed: The seed of the random number generator.
+            max_rate: The largest rate that can be requested e.g.
+                appengine.main.MAX_PRODUCTION_RATE.
+        """
+        self._item_names = sorted(item_names)
+        self._science_packs = [name for name in SCIENCE_PACKS
+                               if name in item_names]
+        self._max_rate = max_rate
+        self._random = random.Random(seed)
+        self._kinds = []
+        for kind, weight in QUERY_MIX:
+            if kind == 'science packs' and not self._science_packs:
+                continue
+            self._kinds.extend([kind] * weight)
+
+    def _rate(self):
+        return self._random.choice(COMMON_RATES)
+
+    def _items(self, names):
+        return [(name, self._rate()) for name in names]
+
+    def next_request(self):
+        kind = self._random.choice(self._kinds)
+        path = '/'
+        if kind == 'single item':
+            items = self._items([self._random.choice(self._item_names)])
+        elif kind == 'science packs':
+            items = self._items(self._random.sample(
+                self._science_packs,
+                self._random.randint(1, len(self._science_packs))))
+        elif kind == 'factory':
+            items = self._items(self._random.sample(
+                self._item_names,
+                min(len(self._item_names), self._random.randint(10, 20))))
+        elif kind == 'unknown item':
+            items = [('unknown-item-%d' % self._random.randint(0, 1000),
+                      self._rate())]
+        elif kind == 'extreme rate':
+            items = [(self._random.choice(self._item_names),
+                      self._random.choice([self._max_rate, 1e9]))]
+        else:
+            path = '/api/plan'
+            items = self._items(self._random.sample(
+                self._item_names,
+                min(len(self._item_names), self._random.randint(1, 5))))
+        return kind, path, urlencode(sorted(items))
+
+
+def call_app(app, path, query_string):
+    """Sends a GET request to a WSGI application and returns its status."""
+    environ = {'PATH_INFO': path, 'QUERY_STRING': query_string}
+    wsgiref.util.setup_testing_defaults(environ)
+    status = []
+    result = app(environ,
+                 lambda s, headers, exc_info=None: status.append(s))
+    try:
+        for _ in result:
+            pass
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return int(status[0].split()[0])
+
+
+def run_process(data_path, num_threads, num_requests, seed):
+    """Loads the webapp and sends it requests from several threads.
+
+    Args:
+        data_path: The path of the factorio-data directory.
+        num_threads: The number of threads sending requests.
+        num_requests: The number of requests sent by each thread.
+        seed: The seed of the query generators.
+
+    Returns:
+        A dictionary containing 'seconds', the time taken to send the
+        requests, 'requests', a list of (<kind>, <status>, <seconds>) tuples,
+        and 'max_rss_kb', the peak memory used by the process.
+    """
+    from appengine import data
+    data.load(data_path)
+    from appengine import item_list
+    from appengine import main
+    from factorio import recipe_database
+
+    item_names = [item.name for item in item_list.get_item_list(
+        recipe_database.get_current()).items]
+    requests = []
+    errors = []
+
+    def send_requests(thread_index):
+        generator = QueryGenerator(item_names, '%s-%d' % (seed, thread_index),
+                                   main.MAX_PRODUCTION_RATE)
+        try:
+            for _ in range(num_requests):
+                kind, path, query_string = generator.next_request()
+                start = timeit.default_timer()
+                status = call_app(main.app, path, query_string)
+                requests.append(
+                    (kind, status, timeit.default_timer() - start))
+        except Exception as e:
+            errors.append(e)
+            raise
+
+    threads = [threading.Thread(target=send_requests, args=(index,))
+               for index in range(num_threads)]
+    start = timeit.default_timer()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise RuntimeError('load test thread failed: %r' % errors[0])
+    return {'seconds': timeit.default_timer() - start,
+            'requests': requests,
+            'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+
+def _run_process_args(args):
+    return run_process(*args)
+
+
+def _percentile(sorted_values, percentile):
+    index = int(round(percentile / 100.0 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def summarize_latencies(seconds):
+    """Returns the count and p50/p99 latencies, in ms, of a list of times."""
+    seconds = sorted(seconds)
+    return {'count': len(seconds),
+            'p50_ms': round(_percentile(seconds, 50) * 1000, 3),
+            'p99_ms': round(_percentile(seconds, 99) * 1000, 3)}
+
+
+def run(data_path, num_processes, num_threads, num_requests, seed):
+    """Runs the load test and returns its report.
+
+    Args:
+        data_path: The path of the factorio-data directory.
+        num_processes: The number of processes sending requests.
+        num_threads: The number of threads sending requests in each process.
+        num_requests: The number of requests sent by each thread.
+        seed: The seed of the query generators.
+
+    Returns:
+        A dictionary that can be serialized as JSON.
+    """
+    process_args = [(data_path, num_threads, num_requests,
+                     '%s-%d' % (seed, index))
+                    for index in range(num_processes)]
+    if num_processes == 1:
+        results = [run_process(*process_args[0])]
+    else:
+        pool = multiprocessing.Pool(num_processes)
+        try:
+            results = pool.map(_run_process_args, process_args)
+        finally:
+            pool.close()
+            pool.join()
+
+    requests = [request for result in results
+                for request in result['requests']]
+    kind_to_seconds = {}
+    status_counts = {}
+    for kind, status, seconds in requests:
+        kind_to_seconds.setdefault(kind, []).append(seconds)
+        status_counts[str(status)] = status_counts.get(str(status), 0) + 1
+
+    # The processes run concurrently so the test takes as long as the
+    # slowest of them.
+    elapsed = max(result['seconds'] for result in results)
+    report = {
+        'config': {'processes': num_processes,
+                   'threads': num_threads,
+                   'requests_per_thread': num_requests,
+                   'seed': seed,
+                   'python': sys.version.split()[0]},
+        'requests_per_second': round(len(requests) / elapsed, 1),
+        'latency': summarize_latencies(
+            [seconds for _, _, seconds in requests]),
+        'latency_by_kind': {kind: summarize_latencies(seconds)
+                            for kind, seconds in kind_to_seconds.items()},
+        'statuses': status_counts,
+        'max_rss_kb': max(result['max_rss_kb'] for result in results),
+    }
+    return report
+
+
+def compare(baseline, report):
+    """Returns lines describing the change from a baseline report."""
+
+    def change(name, old, new):
+        if not old:
+            return '%-30s %10s -> %10s' % (name, old, new)
+        return '%-30s %10s -> %10s (%+.1f%%)' % (
+            name, old, new, (new - old) * 100.0 / old)
+
+    lines = [
+        change('requests/sec', baseline['requests_per_second'],
+               report['requests_per_second']),
+        change('p50 ms', baseline['latency']['p50_ms'],
+               report['latency']['p50_ms']),
+        change('p99 ms', baseline['latency']['p99_ms'],
+               report['latency']['p99_ms']),
+        change('max rss kb', baseline['max_rss_kb'], report['max_rss_kb']),
+    ]
+    for kind in sorted(report['latency_by_kind']):
+        if kind in baseline['latency_by_kind']:
+            lines.append(change(
+                '%s p99 ms' % kind,
+                baseline['latency_by_kind'][kind]['p99_ms'],
+                report['latency_by_kind'][kind]['p99_ms']))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Measure the throughput of the webapp.')
+    parser.add_argument(
+        '--data_path', metavar='PATH',
+        default='factorio-data',
+        help='path to the extracted factorio data, relative to the directory '
+        'containing app.yaml.')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='the number of processes sending requests.')
+    parser.add_argument('--threads', type=int, default=4,
+                        help='the number of threads in each process.')
+    parser.add_argument('--requests', type=int, default=500,
+                        help='the number of requests sent by each thread.')
+    parser.add_argument('--seed', default='factorio',
+                        help='the seed used to generate the requests.')
+    parser.add_argument('--output', metavar='PATH',
+                        help='write the JSON report to this file rather than '
+                        'to stdout.')
+    parser.add_argument('--baseline', metavar='PATH',
+                        help='a report, written by an earlier run, to '
+                        'compare the results with.')
+    args = parser.parse_args()
+
+    report = run(args.data_path, args.processes, args.threads, args.requests,
+                 args.seed)
+    report_json = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report_json + '\n')
+    else:
+        print(report_json)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        for line in compare(baseline, report):
+            print(line, file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""Lists the slowest requests profiled by appengine.profiling.
+
+For each request, the functions that took the most time are shown. Run from
+the directory containing app.yaml:
+
+    $ python -m benchmarks.profile_report /tmp/profiles
+    $ python -m benchmarks.profile_report /tmp/profiles --sort cumulative
+"""
+
+from __future__ import print_function
+
+import argparse
+import pstats
+import sys
+
+from appengine import profiling
+
+
+def write_report(directory, num_requests, num_functions, sort, stream):
+    """Writes the slowest requests in a directory and their top functions.
+
+    Args:
+        directory: The directory written by profiling.ProfilingMiddleware.
+        num_requests: The number of requests to report, slowest first.
+        num_functions: The number of functions to report per request.
+        sort: The pstats sort key e.g. 'tottime' or 'cumulative'.
+        stream: The file to write the report to.
+    """
+    profiles = profiling.list_profiles(directory)
+    print('%d profiled requests in %s' % (len(profiles), directory),
+          file=stream)
+    for profile in profiles[:num_requests]:
+        print(file=stream)
+        print('%10.2fms  %s' % (profile.seconds * 1000, profile.request),
+              file=stream)
+        stats = pstats.Stats(profile.path, stream=stream)
+        stats.strip_dirs().sort_stats(sort).print_stats(num_functions)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='List the slowest profiled requests.')
+    parser.add_argument(
+        'directory',
+        help='the directory containing the profiles, see PROFILE_DIRECTORY '
+        'in appengine_config.py.')
+    parser.add_argument(
+        '--requests', type=int, default=10,
+        help='the number of requests to report, slowest first.')
+    parser.add_argument(
+        '--functions', type=int, default=15,
+        help='the number of functions to report for each request.')
+    parser.add_argument(
+        '--sort', default='tottime',
+        help='the order of the functions, e.g. tottime or cumulative.')
+    args = parser.parse_args()
+    write_report(args.directory, args.requests, args.functions, args.sort,
+                 sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
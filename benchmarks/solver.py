@@ -0,0 +1,406 @@
+#!/usr/bin/env python
+"""Benchmarks the solver on large synthetic recipe graphs.
+
+factorio/tests/test-recipe.json and the real game data are too small to
+show how the solver scales. This benchmark generates recipes in the format of
+recipes.json with a configurable shape and times loading them, solving
+plans, building the ProductedItems of the plans and ordering them.
+
+Every solver variant (the bill of materials, the incremental solver, the
+batch solver and plan templates) is also checked against a simple recursive
+reference solver, so faster variants can be checked for identical plans.
+Run from the directory containing app.yaml:
+
+    $ python -m benchmarks.solver
+    $ python -m benchmarks.solver --sizes 1000 --depth 12 --fan_in 5
+    $ python -m benchmarks.solver --sizes 1000 --write_recipes recipes.json
+"""
+
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import io
+import json
+import random
+import sys
+import timeit
+
+from factorio import recipe
+from factorio import recipe_database
+
+from appengine import plan_template
+from appengine import produced_item
+
+DEFAULT_SIZES = [100, 1000, 10000, 50000]
+
+# Rates that differ by at most this fraction are considered equal by the
+# differential check, since the variants add rates in different orders.
+RELATIVE_TOLERANCE = 1e-9
+
+
+def generate_recipes(num_recipes,
+                     depth=8,
+                     fan_in=3,
+                     shared_density=0.2,
+                     fluid_share=0.05,
+                     seed=0):
+    """Returns synthetic recipes in the format of recipes.json.
+
+    Items are arranged in tiers. The recipes in the first tier smelt raw
+    resources, which have no recipes, and every recipe in a later tier has
+    at least one ingredient from the tier before it, so the longest chain of
+    ingredients is depth recipes long. The recipes do not form cycles.
+
+    Args:
+        num_recipes: The number of recipes to generate.
+        depth: The number of tiers.
+        fan_in: The maximum number of ingredients of a recipe.
+        shared_density: The probability that an ingredient, other than the
+            first, is one of a small set of shared intermediates (like
+            'electronic-circuit') rather than any item in an earlier tier.
+        fluid_share: The fraction of items that are fluids.
+        seed: The seed of the random number generator.
+
+    Returns:
+        A dictionary {<recipe name>: <recipe>} that can be serialized to
+        recipes.json.
+    """
+    rng = random.Random(seed)
+    depth = max(1, min(depth, num_recipes))
+    resources = ['resource-%d' % index
+                 for index in range(max(2, num_recipes // 100))]
+    fluids = set()
+    recipes = {}
+
+    lower_items = []
+    shared_items = []
+    previous_tier = resources
+    for tier_index in range(depth):
+        tier_size = (num_recipes // depth +
+                     (1 if tier_index < num_recipes % depth else 0))
+        tier = []
+        for index in range(tier_size):
+            is_fluid = tier_index and rng.random() < fluid_share
+            name = '%s-%d-%d' % ('fluid' if is_fluid else 'item',
+                                 tier_index, index)
+            if is_fluid:
+                fluids.add(name)
+
+            ingredient_names = [rng.choice(previous_tier)]
+            for _ in range(rng.randint(1, fan_in) - 1):
+                if tier_index == 0:
+                    ingredient_names.append(rng.choice(resources))
+                elif shared_items and rng.random() < shared_density:
+                    ingredient_names.append(rng.choice(shared_items))
+                else:
+                    ingredient_names.append(rng.choice(lower_items))
+            ingredient_names = sorted(set(ingredient_names))
+
+            ingredients = []
+            for ingredient_name in ingredient_names:
+                if ingredient_name in fluids:
+                    ingredients.append({'type': 'fluid',
+                                        'name': ingredient_name,
+                                        'amount': rng.choice([10, 20, 40])})
+                else:
+                    ingredients.append([ingredient_name, rng.randint(1, 5)])
+
+            recipe_object = {
+                'type': 'recipe',
+                'name': name,
+                'ingredients': ingredients,
+                'energy_required': rng.choice([0.5, 1, 2, 5, 10]),
+            }
+            if is_fluid:
+                recipe_object['category'] = 'chemistry'
+                recipe_object['results'] = [
+                    {'type': 'fluid', 'name': name,
+                     'amount': rng.choice([10, 20, 50])}]
+            else:
+                if tier_index == 0:
+                    recipe_object['category'] = 'smelting'
+                elif fluids.intersection(ingredient_names):
+                    recipe_object['category'] = 'crafting-with-fluid'
+                recipe_object['result'] = name
+                recipe_object['result_count'] = rng.choice([1, 1, 1, 2, 5])
+            recipes[name] = recipe_object
+            tier.append(name)
+
+        lower_items.extend(tier)
+        shared_items.extend(tier[:max(1, len(tier) // 50)])
+        previous_tier = tier
+    return recipes
+
+
+def load_database(recipes):
+    """Returns a RecipeDatabase containing the given recipes."""
+    recipe_tables = recipe.Recipe.recipe_tables_from_json(
+        io.BytesIO(json.dumps(recipes).encode('utf-8')))
+    return recipe_database.create_database(recipe_tables=recipe_tables)
+
+
+def reference_production_rates(items_and_crafting_rates, database):
+    """A simple recursive version of calculate_required_production_rates.
+
+    Only supports recipe graphs without cycles.
+    """
+    suppliers_by_item = {}
+    consumers_by_item = {}
+
+    def add(item_name, consumer_name, rate):
+        suppliers_by_item.setdefault(item_name, {})
+        consumers = consumers_by_item.setdefault(item_name, {})
+        consumers[consumer_name] = consumers.get(consumer_name, 0) + rate
+        if consumer_name is not None:
+            suppliers = suppliers_by_item[consumer_name]
+            suppliers[item_name] = suppliers.get(item_name, 0) + rate
+
+        item_recipe = database.recipes_by_single_result.get(item_name)
+        if item_recipe is None:
+            return
+        crafts = rate / item_recipe.count_produced
+        for ingredient_name, amount in item_recipe.ingredients.items():
+            add(ingredient_name, item_name, crafts * amount)
+
+    for item_name, rate in items_and_crafting_rates:
+        add(item_name, None, rate)
+    return sorted([(item_name, suppliers_by_item[item_name], consumers)
+                   for item_name, consumers in consumers_by_item.items()],
+                  key=lambda o: o[0])
+
+
+def _is_close(a, b):
+    return abs(a - b) <= RELATIVE_TOLERANCE * max(abs(a), abs(b), 1e-300)
+
+
+def find_differences(expected, actual, path=''):
+    """Returns descriptions of the differences between two plans.
+
+    Args:
+        expected: A plan e.g. as returned by
+            calculate_required_production_rates or
+            produced_item.produced_items_to_json.
+        actual: The plan to compare with expected.
+        path: A description of where the plans are in an enclosing value.
+    """
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        differences = []
+        for key in sorted(set(expected) | set(actual), key=str):
+            if key not in actual:
+                differences.append('%s[%r] missing' % (path, key))
+            elif key not in expected:
+                differences.append('%s[%r] unexpected' % (path, key))
+            else:
+                differences.extend(find_differences(
+                    expected[key], actual[key], '%s[%r]' % (path, key)))
+        return differences
+    if (isinstance(expected, (list, tuple)) and
+            isinstance(actual, (list, tuple))):
+        if len(expected) != len(actual):
+            return ['%s has length %d, expected %d' % (
+                path, len(actual), len(expected))]
+        differences = []
+        for index, (e, a) in enumerate(zip(expected, actual)):
+            differences.extend(find_differences(
+                e, a, '%s[%d]' % (path, index)))
+        return differences
+    if (isinstance(expected, float) or isinstance(actual, float)) and (
+            not isinstance(expected, bool) and not isinstance(actual, bool)):
+        if expected is not None and actual is not None and _is_close(
+                expected, actual):
+            return []
+    elif expected == actual:
+        return []
+    return ['%s is %r, expected %r' % (path, actual, expected)]
+
+
+def check_variants(requests, database):
+    """Checks that every solver variant agrees with the reference solver.
+
+    Args:
+        requests: A list of plans to check, each a list of (<item>, <rate>)
+            pairs.
+        database: The RecipeDatabase to use.
+
+    Returns:
+        A list of descriptions of the differences found.
+    """
+    differences = []
+    templates = plan_template.PlanTemplateCache(max_entries=len(requests))
+    for requirements in requests:
+        expected = reference_production_rates(requirements, database)
+        variants = [
+            ('calculate_required_production_rates',
+             recipe.calculate_required_production_rates(requirements,
+                                                        database)),
+            ('iter_required_production_rates',
+             sorted(recipe.iter_required_production_rates(requirements,
+                                                          database),
+                    key=lambda o: o[0])),
+        ]
+        try:
+            [batch] = recipe.calculate_required_production_rates_batch(
+                [item_name for item_name, _ in requirements],
+                [[rate for _, rate in requirements]],
+                database)
+            variants.append(('calculate_required_production_rates_batch',
+                             batch))
+        except ImportError:  # NumPy is not available.
+            pass
+        for name, actual in variants:
+            differences.extend('%s %r: %s' % (name, requirements, difference)
+                               for difference in find_differences(
+                                   expected, actual))
+
+        expected_plan = produced_item.produced_items_to_json(
+            produced_item.required_production_rates_to_produced_items(
+                expected, database))
+        actual_plan = produced_item.produced_items_to_json(
+            templates.get_produced_items(requirements, database))
+        differences.extend('PlanTemplate %r: %s' % (requirements, difference)
+                           for difference in find_differences(
+                               expected_plan, actual_plan))
+    return differences
+
+
+def _time(function, *args):
+    start = timeit.default_timer()
+    result = function(*args)
+    return result, timeit.default_timer() - start
+
+
+def benchmark(num_recipes, num_requests, shape, seed):
+    """Times each stage of producing plans for a synthetic dataset.
+
+    Args:
+        num_recipes: The number of recipes to generate.
+        num_requests: The number of plans to time.
+        shape: A dictionary of keyword arguments for generate_recipes.
+        seed: The seed used to generate the recipes and the plans.
+
+    Returns:
+        A list of (<stage>, <seconds>) pairs, where <seconds> is the total
+        time taken by the stage for all of the plans, and the list of plans.
+    """
+    recipes = generate_recipes(num_recipes, seed=seed, **shape)
+    rng = random.Random(seed)
+    item_names = sorted(name for name, recipe_object in recipes.items()
+                        if 'result' in recipe_object)
+    # Mostly single items, as most people request, and some factories.
+    requests = [[(item_name, rng.choice([1, 2, 10]))
+                 for item_name in rng.sample(
+                     item_names,
+                     min(len(item_names), 1 if index % 5 else 10))]
+                for index in range(num_requests)]
+
+    database, load_seconds = _time(load_database, recipes)
+    timings = [('load', load_seconds)]
+
+    def solve_all():
+        return [recipe.calculate_required_production_rates(requirements,
+                                                           database)
+                for requirements in requests]
+
+    # The bill of materials caches the unit requirements of each item, so
+    # the first solve is slower.
+    _, cold_seconds = _time(solve_all)
+    rates, warm_seconds = _time(solve_all)
+    timings.append(('solve (cold)', cold_seconds))
+    timings.append(('solve (warm)', warm_seconds))
+
+    _, seconds = _time(lambda: [
+        list(recipe.iter_required_production_rates(requirements, database))
+        for requirements in requests])
+    timings.append(('solve (incremental)', seconds))
+
+    plans, seconds = _time(lambda: [
+        list(produced_item.iter_produced_items(required_rates, database))
+        for required_rates in rates])
+    timings.append(('materialize', seconds))
+
+    _, seconds = _time(lambda: [produced_item._leaves_last_sort(plan)
+                                for plan in plans])
+    timings.append(('order', seconds))
+
+    templates = plan_template.PlanTemplateCache(max_entries=num_requests)
+    for name in ['template (cold)', 'template (warm)']:
+        _, seconds = _time(lambda: [
+            templates.get_produced_items(requirements, database)
+            for requirements in requests])
+        timings.append((name, seconds))
+    return timings, database, requests
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the solver on synthetic recipes.')
+    parser.add_argument(
+        '--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+        help='comma-separated numbers of recipes to benchmark.')
+    parser.add_argument('--requests', type=int, default=100,
+                        help='the number of plans to time for each size.')
+    parser.add_argument('--depth', type=int, default=8,
+                        help='the number of tiers of recipes.')
+    parser.add_argument('--fan_in', type=int, default=3,
+                        help='the maximum number of ingredients of a recipe.')
+    parser.add_argument('--shared_density', type=float, default=0.2,
+                        help='the probability that an ingredient is a shared '
+                        'intermediate.')
+    parser.add_argument('--fluid_share', type=float, default=0.05,
+                        help='the fraction of items that are fluids.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no_check', action='store_true',
+                        help='do not check the solver variants against the '
+                        'reference solver.')
+    parser.add_argument('--write_recipes', metavar='PATH',
+                        help='write the recipes for the first size to PATH, '
+                        'in the format of recipes.json, and exit.')
+    parser.add_argument('--output', metavar='PATH',
+                        help='also write the timings as JSON to PATH.')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    shape = {'depth': args.depth,
+             'fan_in': args.fan_in,
+             'shared_density': args.shared_density,
+             'fluid_share': args.fluid_share}
+
+    if args.write_recipes:
+        with open(args.write_recipes, 'w') as f:
+            json.dump(generate_recipes(sizes[0], seed=args.seed, **shape), f,
+                      indent=2, sort_keys=True)
+        return
+
+    report = {'shape': shape, 'requests': args.requests, 'sizes': {}}
+    failed = False
+    for size in sizes:
+        timings, database, requests = benchmark(size, args.requests, shape,
+                                                args.seed)
+        print('%d recipes' % size)
+        for stage, seconds in timings:
+            if stage == 'load':
+                print('  %-22s %10.2fms' % (stage, seconds * 1000))
+            else:
+                print('  %-22s %10.2fms total %10.3fms per plan' % (
+                    stage, seconds * 1000, seconds * 1000 / len(requests)))
+        report['sizes'][size] = {stage: seconds for stage, seconds in timings}
+
+        if not args.no_check:
+            differences = check_variants(requests, database)
+            print('  %-22s %s' % (
+                'differential check',
+                'FAILED' if differences else 'OK (%d plans)' % len(requests)))
+            for difference in differences[:20]:
+                print('    %s' % difference)
+            failed = failed or bool(differences)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
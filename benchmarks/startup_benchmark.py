@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""Compares the time taken to load the factorio data from JSON and snapshots.
+
+Each load is timed in a fresh Python process, including the time taken to
+import the modules needed, to approximate the cold start of an App Engine
+instance. The time taken to check that the snapshot is not older than the
+files that it was created from, which only the development server does, is
+reported separately. Run from the directory containing app.yaml:
+
+    $ python -m benchmarks.startup_benchmark --data_path factorio-data
+"""
+
+import argparse
+import os.path
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from appengine import icons
+from factorio import snapshot
+
+_LOAD_JSON_CODE = '''
+import time
+start = time.time()
+from appengine import data
+data.build_database_from_json(%(data_path)r)
+print(time.time() - start)
+'''
+
+_LOAD_SNAPSHOT_CODE = '''
+import time
+start = time.time()
+from appengine import data
+data.build_database_from_snapshot(%(snapshot_path)r)
+print(time.time() - start)
+'''
+
+_CHECK_SNAPSHOT_CODE = '''
+import time
+start = time.time()
+from appengine import data
+data.is_snapshot_current(%(data_path)r, %(snapshot_path)r)
+print(time.time() - start)
+'''
+
+
+def time_in_new_process(code, repeat):
+    """Returns the sorted times reported by running code in new processes."""
+    times = []
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, '-c', code])
+        times.append(float(output))
+    return sorted(times)
+
+
+def write_report(name, times):
+    sys.stdout.write('%-10s min %8.2fms  median %8.2fms\n' % (
+        name, times[0] * 1000, times[len(times) // 2] * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare JSON and snapshot start-up times.')
+    parser.add_argument(
+        '--data_path', metavar='PATH',
+        default='factorio-data',
+        help='path to the extracted factorio data, relative to the directory '
+        'containing app.yaml.')
+    parser.add_argument(
+        '--repeat', type=int, default=10,
+        help='the number of times to load the data using each method.')
+    args = parser.parse_args()
+
+    temp_dir = None
+    snapshot_path = os.path.join(args.data_path, snapshot.SNAPSHOT_FILE_NAME)
+    if not os.path.exists(snapshot_path):
+        temp_dir = tempfile.mkdtemp()
+        snapshot_path = os.path.join(temp_dir, snapshot.SNAPSHOT_FILE_NAME)
+        with open(os.path.join(args.data_path, 'recipes.json'), 'r') as r:
+            with open(os.path.join(args.data_path, 'names.json'), 'r') as n:
+                snapshot.write_snapshot(
+                    snapshot.create_snapshot(
+                        r, n, icons.build_manifest(
+                            os.path.join(args.data_path, 'icons'))),
+                    snapshot_path)
+
+    try:
+        write_report('json', time_in_new_process(
+            _LOAD_JSON_CODE % {'data_path': args.data_path}, args.repeat))
+        write_report('snapshot', time_in_new_process(
+            _LOAD_SNAPSHOT_CODE % {'snapshot_path': snapshot_path},
+            args.repeat))
+        write_report('check', time_in_new_process(
+            _CHECK_SNAPSHOT_CODE % {'data_path': args.data_path,
+                                    'snapshot_path': snapshot_path},
+            args.repeat))
+    finally:
+        if temp_dir is not None:
+            shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    main()
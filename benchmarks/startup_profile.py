@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+"""Profiles the cold start of the webapp.
+
+Reports the time taken to import each module and to perform each step of
+starting an instance and handling its first request, measured in a fresh
+Python process. With --compare, the cold start time is compared with and
+without precompiled templates. Run from the directory containing app.yaml:
+
+    $ python -m benchmarks.startup_profile --data_path factorio-data
+    $ python -m benchmarks.startup_profile --data_path factorio-data --compare
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os.path
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import __builtin__ as builtins
+except ImportError:
+    import builtins
+
+_FIRST_REQUEST_PATH = '/?electronic-circuit=1'
+
+
+class ImportProfiler(object):
+    """Records the time taken to import each module for the first time.
+
+    Attributes:
+        module_times: A dictionary {<module>: (<cumulative>, <self>)} where
+            <cumulative> is the time taken to import the module, including
+            the modules that it imported, and <self> excludes them.
+    """
+
+    def __init__(self):
+        self.module_times = {}
+        self._original_import = None
+        self._stack = []
+
+    def _import(self, name, globals=None, locals=None, fromlist=(),
+                *args, **kwargs):
+        if not name:  # A relative import e.g. "from . import <module>".
+            new_modules = ['.'.join(fromlist or ())]
+        elif name not in sys.modules:
+            new_modules = [name]
+        else:
+            # Modules may also be loaded by "from <package> import <module>".
+            package = sys.modules[name]
+            new_modules = ['%s.%s' % (name, f) for f in fromlist or ()
+                           if f != '*' and not hasattr(package, f)]
+        if not new_modules:
+            return self._original_import(name, globals, locals, fromlist,
+                                         *args, **kwargs)
+
+        self._stack.append(0)
+        start = time.time()
+        try:
+            return self._original_import(name, globals, locals, fromlist,
+                                         *args, **kwargs)
+        finally:
+            elapsed = time.time() - start
+            child_time = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += elapsed
+            label = new_modules[0]
+            if label not in self.module_times:
+                self.module_times[label] = (elapsed, elapsed - child_time)
+
+    def start(self):
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._import
+
+    def stop(self):
+        builtins.__import__ = self._original_import
+
+
+def profile_startup(data_path, compiled_templates_path):
+    """Starts the webapp, handles a request and returns the timings.
+
+    Must be called in a process that has not imported the webapp.
+
+    Returns:
+        A dictionary with the keys 'steps', a list of (<step>, <time>) pairs
+        in the order that they were run, and 'modules', see
+        ImportProfiler.module_times.
+    """
+    profiler = ImportProfiler()
+    profiler.start()
+    steps = []
+
+    def step(name, function):
+        start = time.time()
+        result = function()
+        steps.append((name, time.time() - start))
+        return result
+
+    try:
+        data = step('import appengine.data',
+                    lambda: __import__('appengine.data').data)
+        step('load data', lambda: data.load(data_path))
+        templates = step('import appengine.templates',
+                         lambda: __import__('appengine.templates').templates)
+        step('init templates', lambda: templates.init(compiled_templates_path))
+        main = step('import appengine.main',
+                    lambda: __import__('appengine.main').main)
+        webapp2 = __import__('webapp2')
+        for name in ['first request', 'second request']:
+            step(name, lambda: webapp2.Request.blank(
+                _FIRST_REQUEST_PATH).get_response(main.app))
+    finally:
+        profiler.stop()
+    return {'steps': steps, 'modules': profiler.module_times}
+
+
+def run_in_new_process(data_path, compiled_templates_path):
+    """Runs profile_startup in a new process and returns its result."""
+    output = subprocess.check_output([
+        sys.executable, '-m', 'benchmarks.startup_profile',
+        '--data_path', data_path,
+        '--child',
+        '--compiled_templates_path', compiled_templates_path or ''])
+    return json.loads(output.decode('utf-8'))
+
+
+def write_profile(profile, num_modules):
+    print('%-28s %10s' % ('Step', 'Time'))
+    for name, elapsed in profile['steps']:
+        print('%-28s %8.2fms' % (name, elapsed * 1000))
+    print('%-28s %8.2fms' % (
+        'total', sum(elapsed for _, elapsed in profile['steps']) * 1000))
+
+    print()
+    print('%-40s %10s %10s' % ('Module', 'Cumulative', 'Self'))
+    module_times = sorted(profile['modules'].items(),
+                          key=lambda item: item[1][1], reverse=True)
+    for name, (cumulative, self_time) in module_times[:num_modules]:
+        print('%-40s %8.2fms %8.2fms' % (
+            name, cumulative * 1000, self_time * 1000))
+
+
+def compare(data_path, repeat):
+    """Compares cold starts with and without precompiled templates."""
+    from appengine import templates
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        compiled_templates_path = os.path.join(temp_dir, 'templates')
+        templates.compile_templates(compiled_templates_path)
+        for name, path in [('source templates', None),
+                           ('compiled templates', compiled_templates_path)]:
+            totals = sorted(
+                sum(elapsed for _, elapsed in
+                    run_in_new_process(data_path, path)['steps'])
+                for _ in range(repeat))
+            print('%-20s min %8.2fms  median %8.2fms' % (
+                name, totals[0] * 1000, totals[len(totals) // 2] * 1000))
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Profile the start-up of the webapp.')
+    parser.add_argument(
+        '--data_path', metavar='PATH',
+        default='factorio-data',
+        help='path to the extracted factorio data, relative to the directory '
+        'containing app.yaml.')
+    parser.add_argument(
+        '--compiled_templates_path', metavar='PATH',
+        default=None,
+        help='path to templates compiled by appengine.templates.'
+        'compile_templates. Templates are compiled from source if not set.')
+    parser.add_argument(
+        '--modules', type=int, default=20,
+        help='the number of modules to report, slowest first.')
+    parser.add_argument(
+        '--compare', action='store_true',
+        help='compare cold starts with and without compiled templates.')
+    parser.add_argument(
+        '--repeat', type=int, default=10,
+        help='the number of cold starts to time when comparing.')
+    parser.add_argument('--child', action='store_true',
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        json.dump(profile_startup(args.data_path,
+                                  args.compiled_templates_path or None),
+                  sys.stdout)
+    elif args.compare:
+        compare(args.data_path, args.repeat)
+    else:
+        write_profile(
+            run_in_new_process(args.data_path, args.compiled_templates_path),
+            args.modules)
+
+
+if __name__ == '__main__':
+    main()
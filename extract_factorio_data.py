@@ -2,52 +2,348 @@
 
 import json
 import argparse
+import hashlib
 import os.path
 import platform
 import subprocess
 import errno
 import shutil
 import logging
+import multiprocessing
 import sys
+import tempfile
+import threading
+import time
 import ConfigParser
+from multiprocessing import pool
+
+from appengine import data
+from appengine import icons
+from appengine import templates
+from factorio import recipe
+from factorio import recipe_database
+from factorio import snapshot
 
 def parse_path(value):
     """Returns the given path with ~ and environment variables expanded."""
     return os.path.expanduser(os.path.expandvars(value))
 
-def export_recipes(factorio_data_dir, output_data_dir):
-    export_path = os.path.abspath('export')
-    recipes_dir_path = os.path.join(factorio_data_dir, 'base/prototypes/recipe')
-    recipe_files_paths = []
+APP_DIRECTORY_PATH = os.path.dirname(os.path.abspath(__file__))
+EXPORT_PATH = os.path.join(APP_DIRECTORY_PATH, 'export')
 
-    for root, dirs, files in os.walk(recipes_dir_path):
-        recipe_files_paths.extend(os.path.join(root, f) for f in files)
+# The file, in the output directory, recording the inputs of each stage.
+STATE_FILE_NAME = 'extract-state.json'
 
-    recipe_json_path = os.path.join(output_data_dir, 'recipes.json')
-    args = [os.path.join(export_path, 'export_recipes.lua')] + recipe_files_paths
-    with open(recipe_json_path, 'w') as recipe_json_file:    
-        logging.info('Exporting recipes from %r to %r...',
-                     recipes_dir_path,
-                     recipe_json_path)
+# The number of prototype files evaluated by each export_recipes.lua process.
+# Bounds the memory used by the processes and by merging their output.
+PROTOTYPE_FILES_PER_WORKER = 32
+
+def list_files(directory_path):
+    """Returns the paths of the files in a directory tree, sorted."""
+    paths = []
+    for root, dirs, files in os.walk(directory_path):
+        paths.extend(os.path.join(root, f) for f in files)
+    return sorted(paths)
+
+def hash_files(paths, base_path):
+    """Returns a hash of the names, relative to base_path, and contents of
+    the given files, in the given order."""
+    digest = hashlib.sha1()
+    for path in paths:
+        digest.update(os.path.relpath(path, base_path) + '\0')
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 16), ''):
+                digest.update(block)
+        digest.update('\0')
+    return digest.hexdigest()
+
+def fingerprint_tree(directory_path):
+    """Returns a hash of the names, sizes and modification times of the files
+    in a directory tree.
+
+    Much faster than hashing the contents of large trees, such as the icons,
+    and sufficient because files are only copied when their size or
+    modification time changes (see sync_tree).
+    """
+    digest = hashlib.sha1()
+    for path in list_files(directory_path):
+        stat = os.stat(path)
+        digest.update('%s\0%d\0%d\0' % (
+            os.path.relpath(path, directory_path),
+            stat.st_size,
+            stat.st_mtime))
+    return digest.hexdigest()
+
+def fingerprint_paths(paths, base_path):
+    """Returns a hash of the names, relative to base_path, sizes and
+    modification times of the given files and directory trees, or None if
+    any of them do not exist."""
+    digest = hashlib.sha1()
+    for path in paths:
+        relative_path = os.path.relpath(path, base_path)
+        if os.path.isdir(path):
+            digest.update('%s\0%s\0' % (relative_path, fingerprint_tree(path)))
+            continue
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        digest.update('%s\0%d\0%d\0' % (
+            relative_path, stat.st_size, stat.st_mtime))
+    return digest.hexdigest()
+
+class ExtractionState(object):
+    """Records the inputs that each stage's output was extracted from.
+
+    A stage can be skipped if the hash of its inputs is unchanged since it
+    was last run and its outputs have not been modified or deleted since.
+    Thread-safe.
+    """
+
+    def __init__(self, output_data_dir, force=False):
+        """Initialize the state.
+
+        Args:
+            output_data_dir: The directory containing the extracted data.
+            force: If True, every stage is run even if its inputs are
+                unchanged.
+        """
+        self._output_data_dir = output_data_dir
+        self._path = os.path.join(output_data_dir, STATE_FILE_NAME)
+        self._force = force
+        self._lock = threading.Lock()
+        # Maps each stage to [<input hash>, <output fingerprint>].
+        try:
+            with open(self._path, 'r') as f:
+                self._stage_to_hashes = json.load(f)
+        except (IOError, ValueError):
+            self._stage_to_hashes = {}
+
+    def run_stage(self, stage, input_hash, output_paths, function, *args):
+        """Runs function(*args) unless the stage's output is up to date.
+
+        Args:
+            stage: The name of the stage e.g. 'recipes'.
+            input_hash: A hash of everything that the stage's output depends
+                on.
+            output_paths: The paths of the files or directories written by
+                the stage.
+            function: The function that runs the stage.
+
+        Returns:
+            True if the stage was run, False if it was skipped.
+        """
+        output_fingerprint = fingerprint_paths(output_paths,
+                                               self._output_data_dir)
+        with self._lock:
+            up_to_date = (
+                not self._force and
+                output_fingerprint is not None and
+                self._stage_to_hashes.get(stage) == [input_hash,
+                                                     output_fingerprint])
+        if up_to_date:
+            logging.info('Skipping %s, its inputs are unchanged', stage)
+            return False
+
+        start = time.time()
+        function(*args)
+        logging.info('Extracted %s in %.2fs', stage, time.time() - start)
+        output_fingerprint = fingerprint_paths(output_paths,
+                                               self._output_data_dir)
+        with self._lock:
+            self._stage_to_hashes[stage] = [input_hash, output_fingerprint]
+            temp_path = self._path + '.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump(self._stage_to_hashes, f, indent=2, sort_keys=True)
+            os.rename(temp_path, self._path)
+        return True
+
+def get_mod_directories(factorio_data_dir, mod_paths=()):
+    """Returns the directories of the mods to extract, in load order.
+
+    Args:
+        factorio_data_dir: The path of factorio's data directory. Its base mod
+            is loaded first.
+        mod_paths: The paths of unpacked mod directories to load after the
+            base mod, in load order.
+    """
+    return [os.path.join(factorio_data_dir, 'base')] + list(mod_paths)
+
+def get_recipe_files(mod_dirs):
+    """Returns the recipe prototype files of the given mods, in load order."""
+    paths = []
+    for mod_dir in mod_dirs:
+        paths.extend(list_files(os.path.join(mod_dir, 'prototypes/recipe')))
+    return paths
+
+def evaluate_prototypes(prototype_paths, output_path):
+    """Runs export_recipes.lua on prototype files and writes the resulting
+    JSON to output_path."""
+    args = ([os.path.join(EXPORT_PATH, 'export_recipes.lua')] +
+            list(prototype_paths))
+    with open(output_path, 'w') as output_file:
         export = subprocess.Popen(
                 args=args,
-                cwd=export_path,
-                stdout=recipe_json_file.fileno())
+                cwd=EXPORT_PATH,
+                stdout=output_file.fileno())
         if export.wait() != 0:
-            raise Exception('crap')
+            raise Exception('export_recipes.lua failed on %r' %
+                            (prototype_paths,))
 
-def export_icons(factorio_data_dir, output_data_dir):
-    source_icon_path = os.path.join(factorio_data_dir, 'base/graphics/icons')
-    target_icon_path = os.path.join(output_data_dir, 'icons')
-    if os.path.exists(target_icon_path):
-        if os.path.isdir(target_icon_path):
-            shutil.rmtree(target_icon_path)
+def merge_prototypes(prototype_json_paths, output_path,
+                     prototype_type='recipe'):
+    """Merges prototypes exported by evaluate_prototypes into one JSON file.
+
+    Like data:extend, a prototype replaces any earlier prototype with the
+    same name, so the files must be given in load order. Only one file is
+    loaded at a time so memory use does not grow with the number of files.
+
+    Args:
+        prototype_json_paths: The paths of the files written by
+            evaluate_prototypes, in load order.
+        output_path: The path of the JSON file to write, in the same format
+            as the files being merged.
+        prototype_type: The type of the prototypes to keep e.g. 'recipe'.
+    """
+    def load(path):
+        with open(path, 'r') as f:
+            prototypes = json.load(f)
+        # dkjson encodes an empty table as an array.
+        return prototypes or {}
+
+    # The index of the file containing the final version of each prototype.
+    name_to_index = {}
+    for index, path in enumerate(prototype_json_paths):
+        for name, prototype in load(path).items():
+            if prototype.get('type') == prototype_type:
+                name_to_index[name] = index
+
+    # Write to a temporary file so that a failed export does not leave
+    # partial output behind.
+    temp_path = output_path + '.tmp'
+    with open(temp_path, 'w') as output_file:
+        separator = '{\n'
+        for index, path in enumerate(prototype_json_paths):
+            prototypes = load(path)
+            for name in sorted(prototypes):
+                prototype = prototypes[name]
+                if (name_to_index.get(name) == index and
+                        prototype.get('type') == prototype_type):
+                    output_file.write('%s%s: %s' % (
+                        separator,
+                        json.dumps(name),
+                        json.dumps(prototype, sort_keys=True)))
+                    separator = ',\n'
+        output_file.write('{}\n' if separator == '{\n' else '\n}\n')
+    os.rename(temp_path, output_path)
+
+def export_recipes(mod_dirs, output_data_dir, num_workers=None):
+    """Exports the recipes of the given mods to recipes.json.
+
+    The prototype files are evaluated in batches by concurrent
+    export_recipes.lua processes.
+
+    Args:
+        mod_dirs: The directories of the mods, in load order. See
+            get_mod_directories.
+        output_data_dir: The directory to write recipes.json to.
+        num_workers: The maximum number of concurrent processes or None to
+            use one per CPU.
+    """
+    recipe_files_paths = get_recipe_files(mod_dirs)
+    recipe_json_path = os.path.join(output_data_dir, 'recipes.json')
+    batches = [recipe_files_paths[i:i + PROTOTYPE_FILES_PER_WORKER]
+               for i in range(0, len(recipe_files_paths),
+                              PROTOTYPE_FILES_PER_WORKER)]
+    logging.info('Exporting %d recipe files from %d mods to %r...',
+                 len(recipe_files_paths), len(mod_dirs), recipe_json_path)
+
+    work_dir = tempfile.mkdtemp(dir=output_data_dir)
+    try:
+        batch_json_paths = [os.path.join(work_dir, 'prototypes-%05d.json' % i)
+                            for i in range(len(batches))]
+        thread_pool = pool.ThreadPool(
+            max(1, min(len(batches),
+                       num_workers or multiprocessing.cpu_count())))
+        try:
+            # Each thread waits for an export_recipes.lua process.
+            thread_pool.map(lambda args: evaluate_prototypes(*args),
+                            zip(batches, batch_json_paths))
+        finally:
+            thread_pool.close()
+            thread_pool.join()
+        merge_prototypes(batch_json_paths, recipe_json_path)
+    finally:
+        shutil.rmtree(work_dir)
+
+def sync_tree(source_paths, target_path, link=False):
+    """Makes a directory tree a copy of others, copying only what changed.
+
+    Files are copied when their size or modification time differs from the
+    target's and files that are not in the sources are removed.
+
+    Args:
+        source_paths: The directories to copy. A file replaces any file with
+            the same relative path in an earlier directory. Directories that
+            do not exist are ignored.
+        target_path: The directory to update. Created if it does not exist.
+        link: If True, files are hard-linked rather than copied. The
+            directories must be on the same file system.
+
+    Returns:
+        A 2-tuple (<number of files copied>, <number of files removed>).
+    """
+    if os.path.exists(target_path) and not os.path.isdir(target_path):
+        raise Exception('unexpected file at %r' % target_path)
+
+    relative_path_to_source = {}
+    for source_path in source_paths:
+        for source_file_path in list_files(source_path):
+            relative_path_to_source[
+                os.path.relpath(source_file_path, source_path)] = (
+                    source_file_path)
+
+    num_copied = 0
+    for relative_path, source_file_path in sorted(
+            relative_path_to_source.items()):
+        target_file_path = os.path.join(target_path, relative_path)
+        source_stat = os.stat(source_file_path)
+        try:
+            target_stat = os.stat(target_file_path)
+        except OSError:
+            target_stat = None
+        if target_stat is not None and (
+                (source_stat.st_size, int(source_stat.st_mtime)) ==
+                (target_stat.st_size, int(target_stat.st_mtime))):
+            continue
+
+        create_output_data_dir(os.path.dirname(target_file_path))
+        if target_stat is not None:
+            os.remove(target_file_path)
+        if link:
+            os.link(source_file_path, target_file_path)
         else:
-            raise Exception('unexpected file at %r' % target_icon_path)
+            shutil.copy2(source_file_path, target_file_path)
+        num_copied += 1
+
+    num_removed = 0
+    for target_file_path in list_files(target_path):
+        if (os.path.relpath(target_file_path, target_path) not in
+                relative_path_to_source):
+            os.remove(target_file_path)
+            num_removed += 1
+    return num_copied, num_removed
 
-    logging.info('Copying %r to %r...', source_icon_path, target_icon_path)
-    shutil.copytree(source_icon_path,
-                    target_icon_path)
+def get_icon_directories(mod_dirs):
+    return [os.path.join(mod_dir, 'graphics/icons') for mod_dir in mod_dirs]
+
+def export_icons(mod_dirs, output_data_dir, link=False):
+    source_icon_paths = get_icon_directories(mod_dirs)
+    target_icon_path = os.path.join(output_data_dir, 'icons')
+    logging.info('Syncing %r to %r...', source_icon_paths, target_icon_path)
+    num_copied, num_removed = sync_tree(source_icon_paths, target_icon_path,
+                                        link)
+    logging.info('Copied %d icons and removed %d', num_copied, num_removed)
 
 
 _THING_SECTION_NAMES = ['entity-name',
@@ -56,20 +352,32 @@ _THING_SECTION_NAMES = ['entity-name',
                         'item-name']
 _RECIPE_SECTION_NAMES = ['recipe-name']
 
-def export_names(factorio_data_dir, output_data_dir):
-    source_icon_path = os.path.join(factorio_data_dir, 'base/locale/en/base.cfg')
+def get_names_files(mod_dirs):
+    """Returns the English locale files of the given mods, in load order."""
+    paths = []
+    for mod_dir in mod_dirs:
+        paths.extend(path for path in
+                     list_files(os.path.join(mod_dir, 'locale/en'))
+                     if path.endswith('.cfg'))
+    return paths
+
+def export_names(mod_dirs, output_data_dir):
+    source_icon_paths = get_names_files(mod_dirs)
     target_icon_path = os.path.join(output_data_dir, 'names.json')
 
+    # Names in later files replace those in earlier ones.
     config = ConfigParser.RawConfigParser()
-    config.read([source_icon_path])
+    config.read(source_icon_paths)
 
     thing_names = {}
     for section_name in _THING_SECTION_NAMES:
-        thing_names.update(config.items(section_name))
+        if config.has_section(section_name):
+            thing_names.update(config.items(section_name))
 
     recipe_names = {}
     for section_name in _RECIPE_SECTION_NAMES:
-        recipe_names.update(config.items(section_name))
+        if config.has_section(section_name):
+            recipe_names.update(config.items(section_name))
 
     with open(target_icon_path, 'w') as target_file:
         json.dump({'item-names': thing_names,
@@ -77,6 +385,123 @@ def export_names(factorio_data_dir, output_data_dir):
                    sort_keys=True,
                    indent=2)
 
+def export_snapshot(output_data_dir):
+    """Writes a snapshot of the exported data for fast loading by the app."""
+    snapshot_path = os.path.join(output_data_dir, snapshot.SNAPSHOT_FILE_NAME)
+    logging.info('Writing snapshot to %r...', snapshot_path)
+    icon_manifest = icons.build_manifest(
+        os.path.join(output_data_dir, 'icons'), APP_DIRECTORY_PATH)
+    recipe_json_path = os.path.join(output_data_dir, 'recipes.json')
+    names_json_path = os.path.join(output_data_dir, 'names.json')
+    with open(recipe_json_path, 'r') as recipe_json_file:
+        with open(names_json_path, 'r') as names_json_file:
+            snapshot.write_snapshot(
+                snapshot.create_snapshot(recipe_json_file,
+                                         names_json_file,
+                                         icon_manifest),
+                snapshot_path)
+
+def export_templates(output_data_dir):
+    """Compiles the webapp's templates into Python modules."""
+    templates_path = os.path.join(output_data_dir,
+                                  templates.COMPILED_TEMPLATES_DIR_NAME)
+    logging.info('Compiling templates to %r...', templates_path)
+    templates.compile_templates(templates_path)
+
+def get_module_files(*modules):
+    """Returns the source files of the given modules."""
+    return [os.path.splitext(module.__file__)[0] + '.py' for module in modules]
+
+def run_snapshot_stage(state, output_path):
+    """Writes the snapshot unless it is current.
+
+    The modification times of the snapshot's sources are part of the input
+    hash so that the snapshot is rewritten whenever they are, even with the
+    same content. Otherwise the app would consider it to be stale (see
+    data.is_snapshot_current) and always load the JSON instead.
+
+    Returns:
+        True if the snapshot was written.
+    """
+    return state.run_stage(
+        'snapshot',
+        hash_files([os.path.join(output_path, 'recipes.json'),
+                    os.path.join(output_path, 'names.json')] +
+                   get_module_files(snapshot, icons, recipe,
+                                    recipe_database),
+                   APP_DIRECTORY_PATH) +
+        fingerprint_tree(os.path.join(output_path, 'icons')) +
+        repr(data.get_newest_source_mtime(output_path)),
+        [os.path.join(output_path, snapshot.SNAPSHOT_FILE_NAME)],
+        export_snapshot, output_path)
+
+def extract(factorio_data_path, output_path, force=False, link_icons=False,
+            mod_paths=(), num_workers=None):
+    """Extracts the data used by the webapp, skipping unchanged stages.
+
+    The recipes, icons, names and templates are extracted concurrently and
+    then the snapshot is written from them.
+
+    Args:
+        factorio_data_path: The path of factorio's data directory.
+        output_path: The directory to write the extracted data to.
+        force: If True, every stage is run even if its inputs are unchanged.
+        link_icons: If True, icons are hard-linked rather than copied.
+        mod_paths: The paths of unpacked mod directories to load after the
+            base mod, in load order.
+        num_workers: The maximum number of processes used to evaluate recipe
+            prototypes or None to use one per CPU.
+    """
+    mod_dirs = get_mod_directories(factorio_data_path, mod_paths)
+    create_output_data_dir(output_path)
+    state = ExtractionState(output_path, force)
+    recipes_json_path = os.path.join(output_path, 'recipes.json')
+    names_json_path = os.path.join(output_path, 'names.json')
+    icons_path = os.path.join(output_path, 'icons')
+    templates_path = os.path.join(output_path,
+                                  templates.COMPILED_TEMPLATES_DIR_NAME)
+
+    stages = [
+        ('recipes',
+         lambda: hash_files(get_recipe_files(mod_dirs) +
+                            list_files(EXPORT_PATH), factorio_data_path),
+         [recipes_json_path],
+         export_recipes, (mod_dirs, output_path, num_workers)),
+        ('icons',
+         lambda: hashlib.sha1(''.join(
+             '%s\0%s\0' % (path, fingerprint_tree(path))
+             for path in get_icon_directories(mod_dirs))).hexdigest(),
+         [icons_path],
+         export_icons, (mod_dirs, output_path, link_icons)),
+        ('names',
+         lambda: hash_files(get_names_files(mod_dirs), factorio_data_path),
+         [names_json_path],
+         export_names, (mod_dirs, output_path)),
+        ('templates',
+         # Compiled templates depend on the version of Jinja.
+         lambda: templates.jinja2.__version__ + hash_files(
+             [path for path in list_files(templates.TEMPLATE_DIRECTORY_PATH)
+              if path.endswith('.html')] + get_module_files(templates),
+             APP_DIRECTORY_PATH),
+         [templates_path],
+         export_templates, (output_path,)),
+    ]
+
+    def run_stage(stage):
+        name, get_input_hash, output_paths, function, args = stage
+        return state.run_stage(name, get_input_hash(), output_paths, function,
+                               *args)
+
+    thread_pool = pool.ThreadPool(len(stages))
+    try:
+        # map re-raises the first exception raised by a stage.
+        thread_pool.map(run_stage, stages)
+    finally:
+        thread_pool.close()
+        thread_pool.join()
+
+    run_snapshot_stage(state, output_path)
+
 def create_output_data_dir(path):
     try:
         os.makedirs(path)
@@ -106,6 +531,27 @@ def main():
         type=parse_path,
         help='path to the data (datastore, blobstore, etc.) associated with the '
         'application.')
+    parser.add_argument(
+        '--mod_path', metavar='PATH',
+        dest='mod_paths', action='append', default=[],
+        type=parse_path,
+        help='path to an unpacked mod directory to extract after the base '
+        'mod. May be repeated, in load order; later mods override the '
+        'recipes, names and icons of earlier ones. Only the recipe '
+        'prototypes in prototypes/recipe are read from each mod, so recipes '
+        'defined or changed elsewhere (e.g. in data-updates.lua) are not '
+        'extracted.')
+    parser.add_argument(
+        '--jobs', type=int, default=None,
+        help='the number of processes used to evaluate recipe prototypes. '
+        'Defaults to the number of CPUs.')
+    parser.add_argument(
+        '--force', action='store_true',
+        help='extract everything, even if the game data has not changed.')
+    parser.add_argument(
+        '--link_icons', action='store_true',
+        help='hard-link the icons rather than copying them. The game data and '
+        'the output must be on the same file system.')
 
     args = parser.parse_args()
 
@@ -116,11 +562,8 @@ def main():
         'Extracting data\nfrom: %s\nto:   %s\n' % (factorio_data_path,
                                                    output_path))
 
-    create_output_data_dir(output_path)
-
-    export_recipes(factorio_data_path, output_path)
-    export_icons(factorio_data_path, output_path)
-    export_names(factorio_data_path, output_path)
+    extract(factorio_data_path, output_path, args.force, args.link_icons,
+            args.mod_paths, args.jobs)
     sys.stderr.write('Done!\n')
 
 
@@ -0,0 +1,238 @@
+"""Production planning using linear programming over every recipe.
+
+Unlike factorio.recipe.calculate_required_production_rates, which follows
+the single recipe that produces each item, this solver considers every
+recipe, including recipes with several results (e.g.
+'advanced-oil-processing') and alternative recipes for the same item (e.g.
+'light-oil-cracking' for 'petroleum-gas').
+
+This module requires NumPy and SciPy, which are optional dependencies. It
+is a standalone library for scripts and is not used by the webapp, which
+plans with factorio.recipe.
+"""
+
+from __future__ import division
+
+try:
+    import numpy
+    import scipy
+    from scipy import optimize
+    from scipy import sparse
+    from scipy.sparse import linalg
+except ImportError:
+    numpy = None
+
+# The cost of one craft per unit time of any recipe, relative to the cost of
+# consuming one base item (e.g. 'crude-oil') per unit time. Keeps the solver
+# from running recipes whose output is not needed.
+_CRAFTING_COST = 1e-6
+
+# Rates smaller than this are treated as zero.
+_TOLERANCE = 1e-9
+
+
+def _get_linprog_method():
+    """Returns the scipy.optimize.linprog method to use.
+
+    The 'highs' method was added in SciPy 1.5 but the last SciPy release for
+    Python 2.7 is 1.2, which has the 'simplex' method instead. 'simplex' was
+    removed in SciPy 1.11. Both return optimal vertices, which are needed to
+    reuse the basis of a solution.
+    """
+    version = tuple(int(part) for part in scipy.__version__.split('.')[:2])
+    return 'highs' if version >= (1, 5) else 'simplex'
+
+
+class MatrixSolver(object):
+    """Plans production by solving for the crafting rate of each recipe.
+
+    Each recipe is a column of a sparse item-by-recipe matrix whose entries
+    are the number of items produced (positive) or consumed (negative) by one
+    craft of the recipe. Items that no recipe produces (e.g. 'iron-ore') are
+    base items. The solver finds the non-negative crafting rates that
+    minimize the consumption of base items while producing every other item
+    at least as fast as it is consumed and requested. Byproducts may be
+    produced faster than they are consumed.
+
+    The linear program for a set of requested items is remembered along with
+    a factorization of its optimal basis. A later request for the same items
+    at different rates is answered by a single triangular solve if that basis
+    remains feasible, which is the common case.
+    """
+
+    def __init__(self, recipes):
+        """Initialize the solver.
+
+        Args:
+            recipes: A sequence of factorio.recipe.Recipes to plan with.
+
+        Raises:
+            ImportError: if NumPy or SciPy is not available.
+        """
+        if numpy is None:
+            raise ImportError('MatrixSolver requires NumPy and SciPy')
+
+        self._recipes = sorted(recipes, key=lambda r: r.name)
+        item_names = set()
+        for r in self._recipes:
+            item_names.update(r.ingredients)
+            item_names.update(r.results)
+        self._item_names = sorted(item_names)
+        self._item_to_index = {
+            name: index for index, name in enumerate(self._item_names)}
+
+        rows = []
+        columns = []
+        counts = []
+        self._item_to_producers = {}
+        for column, r in enumerate(self._recipes):
+            net_counts = {}
+            for item_name, count in r.ingredients.items():
+                net_counts[item_name] = net_counts.get(item_name, 0) - count
+            for item_name, count in r.results.items():
+                net_counts[item_name] = net_counts.get(item_name, 0) + count
+                if count > 0:
+                    self._item_to_producers.setdefault(
+                        item_name, []).append(column)
+            for item_name, count in net_counts.items():
+                rows.append(self._item_to_index[item_name])
+                columns.append(column)
+                counts.append(count)
+
+        self._matrix = sparse.csc_matrix(
+            (counts, (rows, columns)),
+            shape=(len(self._item_names), len(self._recipes)))
+        self._item_set_to_problem = {}
+
+    def solve(self, items_and_crafting_rates):
+        """Find the crafting rate of each recipe needed to produce items.
+
+        Args:
+            items_and_crafting_rates: A list of 2-tuples (<item>, <rate>) where
+                <item> is the name of an item that can be produced (e.g.
+                'petroleum-gas') and <rate> is the number that must be produced
+                per unit time.
+
+        Returns:
+            A dictionary {<recipe>: <rate>} where <recipe> is the name of a
+            recipe and <rate> is the number of times that it must be crafted
+            per unit time. Recipes that are not needed are omitted.
+
+        Raises:
+            ValueError: if the requested items cannot be produced.
+        """
+        item_to_rate = {}
+        for item_name, rate in items_and_crafting_rates:
+            if item_name in self._item_to_producers:
+                item_to_rate[item_name] = item_to_rate.get(item_name, 0) + rate
+
+        if not item_to_rate:
+            return {}
+
+        item_set = frozenset(item_to_rate)
+        problem = self._item_set_to_problem.get(item_set)
+        if problem is None:
+            problem = self._item_set_to_problem[item_set] = (
+                _LinearProgram(self, item_set))
+        recipe_rates = problem.solve(item_to_rate)
+        return {self._recipes[column].name: float(rate)
+                for column, rate in zip(problem.columns, recipe_rates)
+                if rate > _TOLERANCE}
+
+
+class _LinearProgram(object):
+    """The linear program for producing a particular set of items."""
+
+    def __init__(self, solver, item_set):
+        # Restrict the program to the recipes that can contribute to the
+        # requested items.
+        columns = set()
+        seen = set(item_set)
+        pending = list(item_set)
+        while pending:
+            item_name = pending.pop()
+            for column in solver._item_to_producers.get(item_name, ()):
+                if column in columns:
+                    continue
+                columns.add(column)
+                for ingredient_name in solver._recipes[column].ingredients:
+                    if ingredient_name not in seen:
+                        seen.add(ingredient_name)
+                        pending.append(ingredient_name)
+        self.columns = sorted(columns)
+
+        matrix = solver._matrix[:, self.columns].tocsr()
+        used_rows = numpy.unique(matrix.nonzero()[0])
+        self._rows = [row for row in used_rows
+                      if solver._item_names[row] in solver._item_to_producers]
+        base_rows = [
+            row for row in used_rows
+            if solver._item_names[row] not in solver._item_to_producers]
+        self._row_item_names = [solver._item_names[row] for row in self._rows]
+
+        self._matrix = matrix[self._rows, :].tocsc()
+        # Minimize the consumption of base items.
+        self._cost = (-numpy.asarray(matrix[base_rows, :].sum(axis=0)).ravel()
+                      + _CRAFTING_COST)
+        self._basis_rows = None
+        self._basis_columns = None
+        self._basis_lu = None
+
+    def _demand(self, item_to_rate):
+        return numpy.array([item_to_rate.get(item_name, 0)
+                            for item_name in self._row_item_names],
+                           dtype=float)
+
+    def _is_feasible(self, recipe_rates, demand):
+        if (recipe_rates < -_TOLERANCE).any():
+            return False
+        surplus = self._matrix.dot(recipe_rates) - demand
+        return not (surplus < -_TOLERANCE * (1 + abs(demand))).any()
+
+    def solve(self, item_to_rate):
+        demand = self._demand(item_to_rate)
+        if self._basis_lu is not None:
+            recipe_rates = numpy.zeros(len(self.columns))
+            recipe_rates[self._basis_columns] = self._basis_lu.solve(
+                demand[self._basis_rows])
+            # The optimality of a basis does not depend on the demand so the
+            # solution is optimal if it is feasible.
+            if self._is_feasible(recipe_rates, demand):
+                return numpy.maximum(recipe_rates, 0)
+
+        method = _get_linprog_method()
+        # Only 'highs' accepts sparse matrices.
+        constraints = -self._matrix if method == 'highs' else (
+            -self._matrix.toarray())
+        result = optimize.linprog(self._cost,
+                                  A_ub=constraints,
+                                  b_ub=-demand,
+                                  bounds=(0, None),
+                                  method=method)
+        if result.status != 0:
+            raise ValueError('cannot produce %s: %s' % (
+                ', '.join(sorted(item_to_rate)), result.message))
+        recipe_rates = result.x
+        self._factorize_basis(recipe_rates, demand)
+        return recipe_rates
+
+    def _factorize_basis(self, recipe_rates, demand):
+        """Remember the basis of an optimal solution for future requests."""
+        self._basis_lu = None
+        basis_columns = numpy.flatnonzero(recipe_rates > _TOLERANCE)
+        surplus = self._matrix.dot(recipe_rates) - demand
+        active = self._matrix[:, basis_columns]
+        # Rows with a surplus are satisfied by any nearby solution and rows
+        # that the basic recipes neither produce nor consume stay satisfied
+        # as long as they are not requested.
+        basis_rows = numpy.flatnonzero(
+            (abs(surplus) <= _TOLERANCE * (1 + abs(demand)))
+            & ((active.getnnz(axis=1) > 0) | (demand != 0)))
+        if len(basis_rows) != len(basis_columns) or not len(basis_rows):
+            return
+        try:
+            self._basis_lu = linalg.splu(active[basis_rows, :].tocsc())
+        except RuntimeError:  # The basis is singular.
+            return
+        self._basis_rows = basis_rows
+        self._basis_columns = basis_columns
@@ -7,41 +7,49 @@ For example
 
 import json
 
-_ITEM_NAMES = None
-_RECIPE_NAMES = None
+from factorio import recipe_database
 
 
 def names_from_json(json_stream):
-    """Loads the names from a stream containing JSON data."""
-    global _ITEM_NAMES, _RECIPE_NAMES
-    names = json.load(json_stream)
-    _ITEM_NAMES = names['item-names']
-    _RECIPE_NAMES = names['recipe-names']
+    """Loads the names from a stream containing JSON data.
+
+    The names replace those in the current
+    factorio.recipe_database.RecipeDatabase.
+    """
+    recipe_database.publish(
+        recipe_database.get_current().with_names(json.load(json_stream)))
 
 
-def get_best_item_name(item_id):
+def get_best_item_name(item_id, database=None):
     """Returns the best English name for an item.
 
     Args:
         item_id: The internal factorio name of an item e.g. 'basic-armor'.
+        database: The factorio.recipe_database.RecipeDatabase to use or None to
+            use the current one.
 
     Returns:
         The English name of the item (e.g. 'Iron Armor'). If no user-friendly
         name is available then the input name is returned.
     """
-    return _ITEM_NAMES.get(item_id, item_id)
+    database = database or recipe_database.get_current()
+    return database.item_names.get(item_id, item_id)
 
 
-def get_best_recipe_name(recipe_id):
+def get_best_recipe_name(recipe_id, database=None):
     """Returns the best English name for a recipe.
 
     Args:
         recipe_id: The internal factorio name of a recipe e.g.
         'heavy-oil-cracking'.
+        database: The factorio.recipe_database.RecipeDatabase to use or None to
+            use the current one.
 
     Returns:
         The English name of the item (e.g. 'Heavy oil cracking to light oil',
         'iron-gear-wheel'). If no user-friendly name is available then the input
         name is returned.
     """
-    return _RECIPE_NAMES.get(recipe_id) or get_best_item_name(recipe_id)
+    database = database or recipe_database.get_current()
+    return (database.recipe_names.get(recipe_id) or
+            get_best_item_name(recipe_id, database))
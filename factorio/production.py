@@ -1,8 +1,36 @@
 """Data and computations related to production machines."""
 
-class Producer(object):
+from __future__ import division
+
+import math
+import warnings
+
+from factorio import recipe_database
+
+# Rates are sums of floats, which differ in the last bits depending on the
+# order in which they were added. A number of machines that is this close to
+# an integer is treated as that integer so that rounding errors cannot add
+# or remove a machine.
+_MACHINE_COUNT_TOLERANCE = 1e-9
+
+class _ProducerType(type):
+    """Provides the producer table that used to be a class attribute of
+    Producer.
+
+    Deprecated: use RecipeDatabase.producers_by_category.
+    """
+
+    @property
+    def crafting_category_to_producers(cls):
+        warnings.warn('Producer.crafting_category_to_producers is deprecated, '
+                      'use RecipeDatabase.producers_by_category',
+                      DeprecationWarning, stacklevel=2)
+        return {category: set(producers) for category, producers in
+                recipe_database.get_current().producers_by_category.items()}
+
+
+class Producer(_ProducerType('_ProducerBase', (object,), {})):
     """A machine that can produce items."""
-    crafting_category_to_producers = {}
 
     def __init__(self, name, crafting_categories, crafting_speed):
         """Initialize the producer.
@@ -17,12 +45,34 @@ class Producer(object):
         self.crafting_categories = frozenset(crafting_categories)
         self.crafting_speed = crafting_speed
 
+    def get_num_required(self, product_recipe, production_rate):
+        """Returns the number of these producers needed to produce an item.
+
+        Args:
+            product_recipe: The factorio.recipe.SingleResultRecipe used to
+                produce the item.
+            production_rate: The number of the item that must be produced per
+                unit time.
+
+        Returns:
+            An int representing the number of producers required.
+        """
+        num_required = (
+            production_rate * product_recipe.crafting_time
+            / product_recipe.count_produced
+            / self.crafting_speed
+            )
+        return int(math.ceil(
+            num_required - _MACHINE_COUNT_TOLERANCE * num_required))
+
     @classmethod
-    def get_most_efficient_producer(cls, category):
+    def get_most_efficient_producer(cls, category, database=None):
         """Returns the most efficient Producer for a crafting category.
 
         Args:
             category: The crafting category e.g. 'chemisty' or 'smelting'.
+            database: The factorio.recipe_database.RecipeDatabase to use or
+                None to use the current one.
 
         Returns:
             A producer that can produce that crafting category.
@@ -30,35 +80,115 @@ class Producer(object):
         Raises:
             KeyError: if no Producer can produce the given crafting category.
         """
-        return max(cls.crafting_category_to_producers[category],
-                   key=lambda p: p.crafting_speed)
+        database = database or recipe_database.get_current()
+        return database.producers_by_category[category][0]
 
     @classmethod
-    def _add_producer(cls, producer):
+    def init(cls):
+        """Does nothing.
+
+        Deprecated: PRODUCERS are indexed when each RecipeDatabase is created
+        (see factorio.recipe_database.create_database).
+        """
+        warnings.warn('Producer.init is deprecated and does nothing',
+                      DeprecationWarning, stacklevel=2)
+
+
+# A subset of the data taken from:
+#     - base/prototypes/entities/entities.lua
+#     - base/prototypes/entities/demo-entities.lua
+PRODUCERS = (
+    Producer('electric-furnace', {'smelting'}, 2),
+    Producer('assembling-machine-1', {'crafting'}, 0.5),
+    Producer('assembling-machine-2',
+             {'crafting', 'advanced-crafting', 'crafting-with-fluid'}, 0.75),
+    Producer('assembling-machine-3',
+             {'crafting', 'advanced-crafting', 'crafting-with-fluid'}, 1.25),
+    Producer('chemical-plant', {'chemistry'}, 1.25),
+    Producer('oil-refinery', {'oil-processing'}, 1),
+)
+
+
+def create_producer_index(producers):
+    """Returns the producers for each crafting category, fastest first.
+
+    Args:
+        producers: A sequence of Producers.
+
+    Returns:
+        A dictionary {<category>: <producers>} where <category> is a crafting
+        category e.g. 'smelting' and <producers> is a tuple of the Producers
+        that support it, ordered by decreasing crafting speed and then by name.
+    """
+    category_to_producers = {}
+    for producer in producers:
         for crafting_category in producer.crafting_categories:
-            cls.crafting_category_to_producers.setdefault(
-                crafting_category, set()).add(producer)
+            category_to_producers.setdefault(
+                crafting_category, []).append(producer)
+    return {category: tuple(sorted(category_producers,
+                                   key=lambda p: (-p.crafting_speed, p.name)))
+            for category, category_producers in category_to_producers.items()}
 
-    @classmethod
-    def init(cls):
-        """Load the producer information.
 
-        A subset of the data taken from:
-            - base/prototypes/entities/entities.lua
-            - base/prototypes/entities/demo-entities.lua
+class ProducerPolicy(object):
+    """ABC for choosing the Producer used to produce an item."""
+
+    name = None
+
+    def select(self, ranked_producers, product_recipe, production_rate):
+        """Returns the Producer to use.
+
+        Args:
+            ranked_producers: A non-empty tuple of the Producers that support
+                the recipe's crafting category, fastest first.
+            product_recipe: The factorio.recipe.SingleResultRecipe used to
+                produce the item.
+            production_rate: The number of the item that must be produced per
+                unit time.
         """
-        cls._add_producer(Producer('electric-furnace', {'smelting'}, 2))
-        cls._add_producer(Producer('assembling-machine-1', {'crafting'}, 0.5))
-        cls._add_producer(
-            Producer(
-                'assembling-machine-2',
-                {'crafting', 'advanced-crafting', 'crafting-with-fluid'}, 0.75))
-        cls._add_producer(
-            Producer(
-                'assembling-machine-3',
-                {'crafting', 'advanced-crafting', 'crafting-with-fluid'}, 1.25))
-        cls._add_producer(Producer('chemical-plant', {'chemistry'}, 1.25))
-        cls._add_producer(Producer('oil-refinery', {'oil-processing'}, 1))
-
-
-Producer.init()
+        raise NotImplementedError()
+
+
+class FastestPolicy(ProducerPolicy):
+    """Use the fastest producer."""
+
+    name = 'fastest'
+
+    def select(self, ranked_producers, product_recipe, production_rate):
+        return ranked_producers[0]
+
+
+class FixedTierPolicy(ProducerPolicy):
+    """Use a particular producer e.g. 'assembling-machine-2'.
+
+    The fastest producer is used for recipes that the named producer does not
+    support.
+    """
+
+    def __init__(self, producer_name):
+        self.name = producer_name
+
+    def select(self, ranked_producers, product_recipe, production_rate):
+        for producer in ranked_producers:
+            if producer.name == self.name:
+                return producer
+        return ranked_producers[0]
+
+
+class FewestMachinesPolicy(ProducerPolicy):
+    """Use the slowest producer that needs the fewest machines.
+
+    e.g. if two assembling-machine-3s or two assembling-machine-2s are needed
+    then assembling-machine-2s are used.
+    """
+
+    name = 'fewest-machines'
+
+    def select(self, ranked_producers, product_recipe, production_rate):
+        fewest_required = ranked_producers[0].get_num_required(
+            product_recipe, production_rate)
+        for producer in reversed(ranked_producers):
+            if (producer.get_num_required(product_recipe, production_rate) ==
+                    fewest_required):
+                return producer
+        return ranked_producers[0]
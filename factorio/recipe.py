@@ -2,21 +2,52 @@
 
 from __future__ import division
 
+import array
+import collections
 import json
+import threading
+import warnings
+
+from factorio import recipe_database
 
 
 REFINED_FLUIDS = ['heavy-oil', 'light-oil', 'petroleum-gas']
 
+# The number of unit matrices kept by each BillOfMaterials, see
+# BillOfMaterials.get_unit_matrix.
+MAX_CACHED_UNIT_MATRICES = 64
+
+
+class _RecipeType(type):
+    """Provides the recipe tables that used to be class attributes of Recipe.
+
+    Deprecated: use the tables of a RecipeDatabase e.g.
+    factorio.recipe_database.get_current().recipes_by_name.
+    """
+
+    @property
+    def recipes_by_name(cls):
+        warnings.warn('Recipe.recipes_by_name is deprecated, use '
+                      'RecipeDatabase.recipes_by_name', DeprecationWarning,
+                      stacklevel=2)
+        return recipe_database.get_current().recipes_by_name
+
+    @property
+    def recipes_by_single_result(cls):
+        warnings.warn('Recipe.recipes_by_single_result is deprecated, use '
+                      'RecipeDatabase.recipes_by_single_result',
+                      DeprecationWarning, stacklevel=2)
+        return recipe_database.get_current().recipes_by_single_result
+
 
-class Recipe(object):
+class Recipe(_RecipeType('_RecipeBase', (object,), {'__slots__': ()})):
     """An ABC for all factorio recipes.
 
     A recipe is a list of ingredients that can be combined using a production
     machine (e.g. an chemical plant) to produce a set of results.
     """
 
-    recipes_by_name = {}
-    recipes_by_single_result = {}
+    __slots__ = ()
 
     @classmethod
     def _from_json(cls, obj):
@@ -25,33 +56,53 @@ class Recipe(object):
 
         if 'result' in obj or ('results' in obj and len(obj['results']) == 1):
             return SingleResultRecipe.from_json(obj)
-        # TODO(brian@sweetapp.com): Should handle multiple result recipes.
+        return MultipleResultRecipe.from_json(obj)
 
     @classmethod
     def recipes_from_json(cls, json_stream):
-        """Loads recipes from a stream containing JSON data."""
-        cls.recipes_by_name = {}
-        cls.recipes_by_single_result = {}
+        """Loads recipes from a stream containing JSON data.
+
+        The recipes replace those in the current
+        factorio.recipe_database.RecipeDatabase.
+        """
+        recipe_database.publish(
+            recipe_database.get_current().with_recipe_tables(
+                cls.recipe_tables_from_json(json_stream)))
+
+    @classmethod
+    def recipe_tables_from_json(cls, json_stream):
+        """Parses and indexes recipes from a stream containing JSON data.
+
+        Returns:
+            A dictionary of recipe tables that can be stored in a snapshot. See
+            factorio.snapshot.
+        """
+        recipes_by_name = {}
+        recipes_by_single_result = {}
 
         recipe_objects = json.load(json_stream)
         for recipe_object in recipe_objects.values():
             recipe = cls._from_json(recipe_object)
-            if recipe is None:
-                continue
-
-            assert recipe.name not in cls.recipes_by_name, (
+            assert recipe.name not in recipes_by_name, (
                 'duplicate recipe %r' % recipe.name)
-            cls.recipes_by_name[recipe.name] = recipe
+            recipes_by_name[recipe.name] = recipe
             if isinstance(recipe, SingleResultRecipe):
-                cls.recipes_by_single_result[recipe.result] = recipe
+                recipes_by_single_result[recipe.result] = recipe
+        return {
+            'recipes_by_name': recipes_by_name,
+            'recipes_by_single_result': recipes_by_single_result,
+            'compiled_graph': CompiledRecipeGraph(recipes_by_single_result),
+        }
 
     @classmethod
-    def get_recipe_by_name(cls, recipe_name):
+    def get_recipe_by_name(cls, recipe_name, database=None):
         """Returns a Recipe given a name e.g. 'iron-gear-wheel'.
 
         Args:
             recipe_name: The name of the recipe e.g. 'iron-gear-wheel' or
                 'solid-fuel-from-heavy-oil'.
+            database: The factorio.recipe_database.RecipeDatabase to use or
+                None to use the current one.
 
         Returns:
             The Recipe instance with the given name.
@@ -59,15 +110,18 @@ class Recipe(object):
         Raises:
             KeyError: if no Recipe with the given name exists.
         """
-        return cls.recipes_by_name[recipe_name]
+        database = database or recipe_database.get_current()
+        return database.recipes_by_name[recipe_name]
 
     @classmethod
-    def get_recipe_by_single_result(cls, item_name):
+    def get_recipe_by_single_result(cls, item_name, database=None):
         """Returns a Recipe that has the given item as its only product.
 
         Args:
             item_name: The name of the item being produced e.g.
                     'iron-gear-wheel'.
+            database: The factorio.recipe_database.RecipeDatabase to use or
+                None to use the current one.
 
         Returns:
             A Recipe that can produce the given item and only the given item
@@ -77,17 +131,32 @@ class Recipe(object):
         Raises:
             KeyError: if no recipe has the given item as its sole output.
         """
-        return cls.recipes_by_single_result[item_name]
+        database = database or recipe_database.get_current()
+        return database.recipes_by_single_result[item_name]
 
     @classmethod
-    def get_results(cls):
-        """Returns the name of every item that can be produced."""
+    def get_results(cls, database=None):
+        """Returns the name of every item that can be produced.
+
+        Args:
+            database: The factorio.recipe_database.RecipeDatabase to use or
+                None to use the current one.
+        """
         # TODO(brian@sweetapp.com): Should include all recipe outputs.
-        return cls.recipes_by_single_result.keys()
+        database = database or recipe_database.get_current()
+        return database.recipes_by_single_result.keys()
 
 class SingleResultRecipe(Recipe):
     """A recipe with a single result e.g. 'iron-gear-wheel'"""
 
+    __slots__ = ('name',
+                 'category',
+                 'crafting_time',
+                 'ingredients',
+                 'result',
+                 'result_type',
+                 'count_produced')
+
     def __init__(self,
                  name,
                  ingredients,
@@ -116,6 +185,11 @@ class SingleResultRecipe(Recipe):
                 self.ingredients,
                 self.count_produced))
 
+    @property
+    def results(self):
+        """A dictionary {<item>: <count>} of the items that are produced."""
+        return {self.result: self.count_produced}
+
     def crafting_rate(self):
         """The number of items that can be produced per unit time."""
         return self.count_produced / self.crafting_time
@@ -137,14 +211,8 @@ class SingleResultRecipe(Recipe):
             count_produced = obj.get('result_count', 1)
             result_type = None
 
-        ingredients = {}
-        for ingredient in obj['ingredients']:
-            if isinstance(ingredient, dict):
-                ingredients[ingredient['name']] = ingredient['amount']
-            else:
-                ingredients[ingredient[0]] = ingredient[1]
         return cls(name=obj['name'],
-                   ingredients=ingredients,
+                   ingredients=_ingredients_from_json(obj),
                    result=result,
                    result_type=result_type,
                    category=obj.get('category', 'crafting'),
@@ -152,22 +220,271 @@ class SingleResultRecipe(Recipe):
                    count_produced=count_produced)
 
 
-class _ProductionNode(object):
-    def __init__(self, item_name):
-        self.item_name = item_name
-        self.suppliers = {}
-        self.consumers = {}
+class MultipleResultRecipe(Recipe):
+    """A recipe with several results e.g. 'advanced-oil-processing'"""
+
+    __slots__ = ('name', 'category', 'crafting_time', 'ingredients', 'results')
+
+    def __init__(self,
+                 name,
+                 ingredients,
+                 results,
+                 category='crafting',
+                 crafting_time=0.5):
+        self.name = name
+        self.category = category
+        self.crafting_time = crafting_time
+        self.ingredients = ingredients
+        self.results = results
+
+    def __repr__(self):
+        return (
+            '<%s(name=%r results=%r crafting_time=%r category=%r, '
+            'ingredients=%r)' % (
+                self.__class__.__name__,
+                self.name,
+                self.results,
+                self.crafting_time,
+                self.category,
+                self.ingredients))
+
+    @classmethod
+    def from_json(cls, obj):
+        """Return a MultipleResultRecipe given a JSON object."""
+        assert obj['type'] == 'recipe', 'expected recipe, got %r, %r' % (
+            obj['type'], obj)
+
+        results = {}
+        for result in obj['results']:
+            results[result['name']] = results.get(
+                result['name'], 0) + result['amount']
+        return cls(name=obj['name'],
+                   ingredients=_ingredients_from_json(obj),
+                   results=results,
+                   category=obj.get('category', 'crafting'),
+                   crafting_time=obj.get('energy_required', 0.5))
+
+
+def _ingredients_from_json(obj):
+    ingredients = {}
+    for ingredient in obj['ingredients']:
+        if isinstance(ingredient, dict):
+            ingredients[ingredient['name']] = ingredient['amount']
+        else:
+            ingredients[ingredient[0]] = ingredient[1]
+    return ingredients
+
+
+class CompiledRecipeGraph(object):
+    """The graph of items and the ingredients used to produce them.
+
+    Items are identified by integer ids and the ingredients of every item are
+    stored contiguously in arrays (in compressed sparse row format) so that
+    the graph can be traversed without hashing item names.
+
+    The graph is also condensed into its strongly connected components. Items
+    that are not part of a recipe cycle are each their own component. The
+    items in a recipe cycle (e.g. an item that is an ingredient of its own
+    ingredient) share a component and their production rates are found by
+    solving a small linear system.
+
+    Attributes:
+        item_names: A list mapping item ids to item names.
+        item_ids: A dictionary mapping item names to item ids.
+        counts_produced: An array mapping item ids to the number of items
+            produced by one craft of the item's recipe.
+        ingredient_offsets: An array where the ingredients of the item with id
+            i are at positions ingredient_offsets[i] to
+            ingredient_offsets[i + 1] (exclusive) of ingredient_ids and
+            ingredient_counts.
+        ingredient_ids: An array of ingredient item ids.
+        ingredient_counts: An array of the number of each ingredient consumed
+            by one craft.
+        component_ids: An array mapping item ids to the id of their strongly
+            connected component. The components of an item's ingredients have
+            smaller ids than the item's own component, unless they are in the
+            same component.
+        cyclic_components: A dictionary mapping the ids of the components
+            that contain a recipe cycle to a sorted tuple of their item ids.
+    """
 
-    def add_supplier(self, item_name, required_rate):
-        self.suppliers[item_name] = self.suppliers.get(
-            item_name, 0) + required_rate
+    __slots__ = ('item_names',
+                 'item_ids',
+                 'counts_produced',
+                 'ingredient_offsets',
+                 'ingredient_ids',
+                 'ingredient_counts',
+                 'component_ids',
+                 'cyclic_components')
 
-    def add_requirement(self, item_name, required_rate):
-        self.consumers[item_name] = self.consumers.get(
-            item_name, 0) + required_rate
+    def __init__(self, recipes_by_single_result):
+        """Initialize the graph.
+
+        Args:
+            recipes_by_single_result: A dictionary mapping item names to the
+                SingleResultRecipe used to produce them. Items without a
+                recipe, and refined fluids, are base items without ingredients.
+        """
+        item_names = set()
+        for item_name, item in recipes_by_single_result.items():
+            item_names.add(item_name)
+            item_names.update(item.ingredients)
+        self.item_names = sorted(item_names)
+        self.item_ids = {
+            item_name: item_id
+            for item_id, item_name in enumerate(self.item_names)}
+
+        self.counts_produced = array.array('d')
+        self.ingredient_offsets = array.array('l', [0])
+        self.ingredient_ids = array.array('l')
+        self.ingredient_counts = array.array('d')
+        for item_name in self.item_names:
+            item = recipes_by_single_result.get(item_name)
+            if item is None or item_name in REFINED_FLUIDS:
+                self.counts_produced.append(1)
+            else:
+                self.counts_produced.append(item.count_produced)
+                for subitem_name, count in item.ingredients.items():
+                    self.ingredient_ids.append(self.item_ids[subitem_name])
+                    self.ingredient_counts.append(count)
+            self.ingredient_offsets.append(len(self.ingredient_ids))
+        self._find_strongly_connected_components()
+
+    def _find_strongly_connected_components(self):
+        """Finds the strongly connected components using Tarjan's algorithm.
+
+        Tarjan's algorithm finds a component only after finding every
+        component reachable from it, so ingredients get smaller component ids
+        than the items that consume them.
+        """
+        offsets = self.ingredient_offsets
+        ingredient_ids = self.ingredient_ids
+        num_items = len(self.item_names)
+        indices = [-1] * num_items
+        lowlinks = [0] * num_items
+        on_stack = [False] * num_items
+        stack = []
+        next_index = 0
+        self.component_ids = array.array('l', [0] * num_items)
+        self.cyclic_components = {}
+        next_component_id = 0
+
+        for root_id in range(num_items):
+            if indices[root_id] != -1:
+                continue
+            indices[root_id] = lowlinks[root_id] = next_index
+            next_index += 1
+            stack.append(root_id)
+            on_stack[root_id] = True
+            work = [[root_id, offsets[root_id]]]
+            while work:
+                frame = work[-1]
+                item_id, edge = frame
+                if edge < offsets[item_id + 1]:
+                    frame[1] = edge + 1
+                    ingredient_id = ingredient_ids[edge]
+                    if indices[ingredient_id] == -1:
+                        indices[ingredient_id] = next_index
+                        lowlinks[ingredient_id] = next_index
+                        next_index += 1
+                        stack.append(ingredient_id)
+                        on_stack[ingredient_id] = True
+                        work.append([ingredient_id, offsets[ingredient_id]])
+                    elif on_stack[ingredient_id]:
+                        lowlinks[item_id] = min(lowlinks[item_id],
+                                                indices[ingredient_id])
+                    continue
+
+                work.pop()
+                if work:
+                    consumer_id = work[-1][0]
+                    lowlinks[consumer_id] = min(lowlinks[consumer_id],
+                                                lowlinks[item_id])
+                if lowlinks[item_id] != indices[item_id]:
+                    continue
+
+                members = []
+                while True:
+                    member_id = stack.pop()
+                    on_stack[member_id] = False
+                    self.component_ids[member_id] = next_component_id
+                    members.append(member_id)
+                    if member_id == item_id:
+                        break
+                if len(members) > 1 or item_id in ingredient_ids[
+                        offsets[item_id]:offsets[item_id + 1]]:
+                    self.cyclic_components[next_component_id] = tuple(
+                        sorted(members))
+                next_component_id += 1
+
+    def get_production(self, item_name):
+        """Returns a description of how an item is produced.
 
+        Args:
+            item_name: The name of an item e.g. 'iron-gear-wheel'.
 
-def calculate_required_production_rates(items_and_crafting_rates):
+        Returns:
+            A 2-tuple (<count>, <ingredients>) where <count> is the number of
+            items produced by one craft and <ingredients> is a sorted tuple of
+            (<item>, <count>) pairs, or None if the item is not in the graph.
+            Two graphs produce an item in the same way iff the descriptions
+            are equal.
+        """
+        item_id = self.item_ids.get(item_name)
+        if item_id is None:
+            return None
+        return (self.counts_produced[item_id],
+                tuple(sorted(
+                    (self.item_names[self.ingredient_ids[edge]],
+                     self.ingredient_counts[edge])
+                    for edge in range(self.ingredient_offsets[item_id],
+                                      self.ingredient_offsets[item_id + 1]))))
+
+    def count_required_items(self, item_names):
+        """Returns the number of items needed to produce the given items.
+
+        Args:
+            item_names: A collection of the names of the requested items.
+
+        Returns:
+            The number of items in a production plan for item_names,
+            including the requested items themselves.
+        """
+        item_ids = [self.item_ids[item_name] for item_name in item_names
+                    if item_name in self.item_ids]
+        num_unknown = len(set(item_names)) - len(set(item_ids))
+        return num_unknown + sum(
+            len(component) for component in self.topological_order(item_ids))
+
+    def topological_order(self, item_ids):
+        """Returns the items reachable from item_ids, consumers first.
+
+        Returns:
+            A list of tuples of item ids. Each tuple contains the items of a
+            strongly connected component and appears before the components
+            of the ingredients of those items.
+        """
+        offsets = self.ingredient_offsets
+        ingredient_ids = self.ingredient_ids
+        reachable = set(item_ids)
+        pending = list(reachable)
+        while pending:
+            item_id = pending.pop()
+            for edge in range(offsets[item_id], offsets[item_id + 1]):
+                ingredient_id = ingredient_ids[edge]
+                if ingredient_id not in reachable:
+                    reachable.add(ingredient_id)
+                    pending.append(ingredient_id)
+
+        item_id_by_component_id = {self.component_ids[item_id]: item_id
+                                   for item_id in reachable}
+        return [self.cyclic_components.get(component_id, (item_id,))
+                for component_id, item_id in sorted(
+                    item_id_by_component_id.items(), reverse=True)]
+
+
+def calculate_required_production_rates(items_and_crafting_rates,
+                                        database=None):
     """Calculate the complete tree of dependent items given items and rates.
 
     e.g.
@@ -191,6 +508,8 @@ def calculate_required_production_rates(items_and_crafting_rates):
         items_and_crafting_rates: A list of 2-tuples (<item>, <rate>) where
             <item> is the name of an item that can be produced (e.g. 'pipe') and
             <rate> is the number that must be produced per unit time.
+        database: The factorio.recipe_database.RecipeDatabase to use or None to
+            use the current one.
     Returns:
         A list of 3-tuples (<item>, <suppliers>, <consumers>) where <item> is
         the name of the item being produced, <suppliers> is a dictionary
@@ -199,43 +518,454 @@ def calculate_required_production_rates(items_and_crafting_rates):
         one as part of their production. Refining and mining are not included
         in the required production.
     """
-    requirements = {}
+    bill_of_materials = (
+        database or recipe_database.get_current()).bill_of_materials
+    suppliers_by_item = {}
+    consumers_by_item = {}
     for item_name, required_crafting_rate in items_and_crafting_rates:
-        _update_requirements(
-            None, item_name, required_crafting_rate, requirements)
-    return sorted([(r.item_name, r.suppliers, r.consumers)
-                   for r in requirements.values()], key=lambda o: o[0])
-
-
-def _update_requirements(parent_name,
-                         item_name,
-                         required_crafting_rate,
-                         production_node_to_required_rate):
-    if parent_name:
-        production_node_to_required_rate.setdefault(
-            parent_name, _ProductionNode(parent_name)).add_supplier(
-                item_name, required_crafting_rate)
-
-    if item_name in REFINED_FLUIDS:
-        production_node_to_required_rate.setdefault(
-            item_name, _ProductionNode(item_name)).add_requirement(
-                parent_name, required_crafting_rate)
-        return
+        for subitem_name, suppliers, consumers in (
+                bill_of_materials.get_unit_requirements(item_name)):
+            _add_scaled_rates(suppliers_by_item.setdefault(subitem_name, {}),
+                              suppliers,
+                              required_crafting_rate)
+            _add_scaled_rates(consumers_by_item.setdefault(subitem_name, {}),
+                              consumers,
+                              required_crafting_rate)
+
+    return sorted([(item_name, suppliers_by_item[item_name], consumers)
+                   for item_name, consumers in consumers_by_item.items()],
+                  key=lambda o: o[0])
+
+
+def iter_required_production_rates(items_and_crafting_rates, database=None):
+    """Calculate the dependent items given items and rates, incrementally.
+
+    Unlike calculate_required_production_rates, the requirements of each item
+    are yielded as soon as they are known, which allows the results to be
+    used before the whole calculation is finished.
+
+    Args:
+        items_and_crafting_rates: A list of 2-tuples (<item>, <rate>) where
+            <item> is the name of an item that can be produced (e.g. 'pipe') and
+            <rate> is the number that must be produced per unit time.
+        database: The factorio.recipe_database.RecipeDatabase to use or None to
+            use the current one.
+
+    Yields:
+        3-tuples (<item>, <suppliers>, <consumers>) in the format of
+        calculate_required_production_rates. Every item is yielded after the
+        items that consume it, except for items in the same recipe cycle.
+
+    Raises:
+        ValueError: if the recipes needed to produce the items form a cycle
+            that cannot be sustained.
+    """
+    requested_rates = {}
+    for item_name, required_crafting_rate in items_and_crafting_rates:
+        requested_rates[item_name] = (
+            requested_rates.get(item_name, 0) + required_crafting_rate)
+    graph = (database or recipe_database.get_current()).compiled_graph
+    return _iter_solve(graph, requested_rates)
+
+
+def calculate_required_production_rates_batch(item_names, rates, database=None):
+    """Calculate the required production for many combinations of rates.
+
+    The result is equivalent to calling calculate_required_production_rates
+    with zip(item_names, row) for each row in rates but is computed using a
+    single matrix product.
+
+    Args:
+        item_names: A sequence of the names of the items that can be produced
+            e.g. ['pipe', 'iron-gear-wheel'].
+        rates: A N x len(item_names) matrix (e.g. a NumPy array or a list of
+            lists) where rates[i][j] is the number of item_names[j] that must
+            be produced per unit time in the ith plan.
+        database: The factorio.recipe_database.RecipeDatabase to use or None to
+            use the current one.
+
+    Returns:
+        A BatchProductionRates containing the N plans.
+
+    Raises:
+        ImportError: if NumPy is not available.
+    """
+    numpy = _import_numpy()
+    database = database or recipe_database.get_current()
+    edges, unit_matrix = database.bill_of_materials.get_unit_matrix(item_names)
+    rates = numpy.asarray(rates, dtype=float).reshape(-1, len(item_names))
+    return BatchProductionRates(edges, numpy.dot(rates, unit_matrix))
+
+
+class BatchProductionRates(object):
+    """The result of calculate_required_production_rates_batch.
+
+    Iterating over a BatchProductionRates yields each plan, in the same
+    format as calculate_required_production_rates. Plans are only converted
+    into that format as they are iterated over.
+
+    Attributes:
+        edges: A tuple of 2-tuples (<consumer>, <item>) where <item> is the
+            name of an item consumed by <consumer> or <consumer> is None if
+            <item> was requested.
+        rates: A NumPy array where rates[i, j] is the rate at which the item in
+            edges[j] is consumed in the ith plan.
+    """
+
+    def __init__(self, edges, rates):
+        self.edges = edges
+        self.rates = rates
+
+    def __len__(self):
+        return len(self.rates)
+
+    def __iter__(self):
+        for row in self.rates:
+            yield self._to_required_production_rates(row.tolist())
+
+    def _to_required_production_rates(self, row):
+        suppliers_by_item = {}
+        consumers_by_item = {}
+        for (consumer_name, item_name), rate in zip(self.edges, row):
+            consumers_by_item.setdefault(item_name, {})[consumer_name] = rate
+            suppliers_by_item.setdefault(item_name, {})
+            if consumer_name is not None:
+                suppliers_by_item.setdefault(
+                    consumer_name, {})[item_name] = rate
+        return sorted([(item_name, suppliers_by_item[item_name], consumers)
+                       for item_name, consumers in consumers_by_item.items()],
+                      key=lambda o: o[0])
+
+
+def _import_numpy():
+    """Returns the numpy module.
+
+    NumPy is an optional dependency and is slow to import so it is only
+    imported when it is needed.
+
+    Raises:
+        ImportError: if NumPy is not available.
+    """
     try:
-        item = Recipe.get_recipe_by_single_result(item_name)
-    except KeyError:
-        production_node_to_required_rate.setdefault(
-            item_name, _ProductionNode(item_name)).add_requirement(
-                parent_name, required_crafting_rate)
+        import numpy
+    except ImportError:
+        raise ImportError('NumPy is required to calculate production rates '
+                          'in batches')
+    return numpy
+
+
+def _add_scaled_rates(item_to_rate, unit_rates, scale):
+    for item_name, unit_rate in unit_rates:
+        item_to_rate[item_name] = item_to_rate.get(
+            item_name, 0) + unit_rate * scale
+
+
+class BillOfMaterials(object):
+    """The production requirements for one unit of each producible item.
+
+    Production requirements are linear in the requested rates so the
+    requirements for any combination of items can be found by scaling and
+    summing the per-item requirements computed here. The requirements for an
+    item are computed when first requested and then reused.
+    """
+
+    def __init__(self, compiled_graph):
+        """Initialize the bill of materials.
+
+        Args:
+            compiled_graph: The CompiledRecipeGraph used to produce items.
+        """
+        self._compiled_graph = compiled_graph
+        self._item_to_unit_requirements = {}
+        # An LRU cache, since callers may request any list of items.
+        self._item_names_to_unit_matrix = collections.OrderedDict()
+        self._unit_matrix_lock = threading.Lock()
+
+    def get_unit_requirements(self, item_name):
+        """Returns the requirements for producing one unit of an item.
+
+        Args:
+            item_name: The name of the item being produced e.g. 'pipe'.
+
+        Returns:
+            A tuple of 3-tuples (<item>, <suppliers>, <consumers>) where
+            <suppliers> and <consumers> are tuples of (<item>, <rate>) pairs.
+            See calculate_required_production_rates.
+
+        Raises:
+            ValueError: if the recipes needed to produce the item form a cycle.
+        """
+        try:
+            return self._item_to_unit_requirements[item_name]
+        except KeyError:
+            pass
+
+        if item_name not in self._compiled_graph.item_ids:
+            # Item names can come from untrusted input so the requirements of
+            # unknown items, which are trivial, are not cached.
+            return ((item_name, (), ((None, 1),)),)
+
+        suppliers_by_item, consumers_by_item = _solve(
+            self._compiled_graph, {item_name: 1})
+        unit_requirements = tuple(
+            (subitem_name,
+             tuple(suppliers_by_item[subitem_name].items()),
+             tuple(consumers.items()))
+            for subitem_name, consumers in consumers_by_item.items())
+        self._item_to_unit_requirements[item_name] = unit_requirements
+        return unit_requirements
+
+    def reuse_unit_requirements(self, other):
+        """Copies the still valid requirements computed by another instance.
+
+        The requirements for an item are copied if every item that they
+        include is produced in the same way by both instances' graphs, which
+        is the case if the recipes that the item depends on have not changed.
+
+        Args:
+            other: A BillOfMaterials for an older version of the recipes.
+
+        Returns:
+            The number of items whose requirements were copied.
+        """
+        item_to_is_unchanged = {}
+
+        def is_unchanged(item_name):
+            try:
+                return item_to_is_unchanged[item_name]
+            except KeyError:
+                unchanged = item_to_is_unchanged[item_name] = (
+                    self._compiled_graph.get_production(item_name) ==
+                    other._compiled_graph.get_production(item_name))
+                return unchanged
+
+        reused = 0
+        for item_name, unit_requirements in list(
+                other._item_to_unit_requirements.items()):
+            if all(is_unchanged(subitem_name)
+                   for subitem_name, _, _ in unit_requirements):
+                self._item_to_unit_requirements.setdefault(
+                    item_name, unit_requirements)
+                reused += 1
+        return reused
+
+    def get_unit_matrix(self, item_names):
+        """Returns the requirements for several items as a matrix.
+
+        Args:
+            item_names: A sequence of the names of the items being produced.
+
+        Returns:
+            A 2-tuple (<edges>, <matrix>) where <edges> is a tuple of 2-tuples
+            (<consumer>, <item>) and <matrix> is a read-only NumPy array where
+            <matrix>[i, j] is the rate at which <item> in <edges>[j] is
+            consumed by <consumer> in <edges>[j] when producing one unit of
+            item_names[i]. <consumer> is None for the requested items. Both
+            are shared with later calls so they cannot be modified.
+
+        Raises:
+            ImportError: if NumPy is not available.
+            ValueError: if the recipes needed to produce an item form a cycle.
+        """
+        numpy = _import_numpy()
+
+        item_names = tuple(item_names)
+        with self._unit_matrix_lock:
+            unit_matrix = self._item_names_to_unit_matrix.pop(item_names, None)
+            if unit_matrix is not None:
+                self._item_names_to_unit_matrix[item_names] = unit_matrix
+                return unit_matrix
+
+        edge_to_index = {}
+        for item_name in item_names:
+            for subitem_name, _, consumers in self.get_unit_requirements(
+                    item_name):
+                for consumer_name, _ in consumers:
+                    edge_to_index.setdefault(
+                        (consumer_name, subitem_name), len(edge_to_index))
+
+        matrix = numpy.zeros((len(item_names), len(edge_to_index)))
+        for row, item_name in enumerate(item_names):
+            for subitem_name, _, consumers in self.get_unit_requirements(
+                    item_name):
+                for consumer_name, unit_rate in consumers:
+                    matrix[row, edge_to_index[consumer_name, subitem_name]] += (
+                        unit_rate)
+
+        edges = tuple(sorted(edge_to_index, key=edge_to_index.get))
+        matrix.setflags(write=False)
+        unit_matrix = (edges, matrix)
+        with self._unit_matrix_lock:
+            self._item_names_to_unit_matrix[item_names] = unit_matrix
+            while (len(self._item_names_to_unit_matrix) >
+                   MAX_CACHED_UNIT_MATRICES):
+                self._item_names_to_unit_matrix.popitem(last=False)
+        return unit_matrix
+
+
+def _solve(graph, requested_rates):
+    """Computes the suppliers and consumers of every required item.
+
+    Args:
+        graph: The CompiledRecipeGraph used to produce items.
+        requested_rates: A dictionary {<item>: <rate>} of the items requested
+            by the user.
+
+    Returns:
+        A 2-tuple (<suppliers_by_item>, <consumers_by_item>) of dictionaries
+        mapping the name of each required item to its suppliers and consumers.
+        See calculate_required_production_rates.
+    """
+    suppliers_by_item = {}
+    consumers_by_item = {}
+    for item_name, suppliers, consumers in _iter_solve(graph,
+                                                       requested_rates):
+        suppliers_by_item[item_name] = suppliers
+        consumers_by_item[item_name] = consumers
+    return suppliers_by_item, consumers_by_item
+
+
+def _iter_solve(graph, requested_rates):
+    """Yields the suppliers and consumers of every required item.
+
+    Args:
+        graph: The CompiledRecipeGraph used to produce items.
+        requested_rates: A dictionary {<item>: <rate>} of the items requested
+            by the user.
+
+    Yields:
+        3-tuples (<item>, <suppliers>, <consumers>) in the format of
+        calculate_required_production_rates. Every item is yielded after all
+        of its consumers, except for consumers in the same recipe cycle.
+    """
+    consumers_by_id = {}
+    for item_name, required_crafting_rate in sorted(requested_rates.items()):
+        item_id = graph.item_ids.get(item_name)
+        if item_id is None:
+            # Not a recipe result or ingredient so it must be a base item.
+            yield item_name, {}, {None: required_crafting_rate}
+        else:
+            consumers_by_id[item_id] = {None: required_crafting_rate}
+
+    # Every consumer of an item appears before it in topological order so,
+    # by the time an item is reached, its total demand is known and it can be
+    # expanded exactly once. The items in a recipe cycle are expanded together
+    # once their combined demand is known.
+    item_names = graph.item_names
+    suppliers_by_id = {}
+    for component in graph.topological_order(consumers_by_id):
+        if graph.component_ids[component[0]] in graph.cyclic_components:
+            required_crafting_rates = _solve_cycle(graph,
+                                                   component,
+                                                   consumers_by_id)
+        else:
+            required_crafting_rates = [
+                sum(consumers_by_id[component[0]].values())]
+
+        for item_id, required_crafting_rate in zip(component,
+                                                   required_crafting_rates):
+            _expand(graph,
+                    item_id,
+                    required_crafting_rate,
+                    suppliers_by_id,
+                    consumers_by_id)
+
+        for item_id in component:
+            yield (item_names[item_id],
+                   {item_names[subitem_id]: rate
+                    for subitem_id, rate in suppliers_by_id[item_id].items()},
+                   {item_names[consumer_id] if consumer_id is not None
+                    else None: rate
+                    for consumer_id, rate in consumers_by_id[item_id].items()})
+
+
+def _expand(graph,
+            item_id,
+            required_crafting_rate,
+            suppliers_by_id,
+            consumers_by_id):
+    """Adds the suppliers needed to produce an item at the given rate."""
+    suppliers = suppliers_by_id[item_id] = {}
+    start = graph.ingredient_offsets[item_id]
+    end = graph.ingredient_offsets[item_id + 1]
+    if start == end:
         return
 
-    production_node_to_required_rate.setdefault(
-        item_name, _ProductionNode(item_name)).add_requirement(
-            parent_name, required_crafting_rate)
+    count_produced = graph.counts_produced[item_id]
+    for edge in range(start, end):
+        subitem_id = graph.ingredient_ids[edge]
+        rate = (graph.ingredient_counts[edge] * required_crafting_rate
+                / count_produced)
+        suppliers[subitem_id] = rate
+        consumers_by_id.setdefault(subitem_id, {})[item_id] = rate
+
+
+def _solve_cycle(graph, component, consumers_by_id):
+    """Returns the production rates of the items in a recipe cycle.
 
-    for subitem_name, count in item.ingredients.items():
-        _update_requirements(
-            item_name,
-            subitem_name,
-            count * required_crafting_rate / item.count_produced,
-            production_node_to_required_rate)
+    The production rate of each item is the sum of the demand from outside
+    of the cycle and the demand from the other items in the cycle:
+
+        rate[i] = external[i] + sum(units[i][j] * rate[j] for j in component)
+
+    where units[i][j] is the number of item i consumed per unit of item j.
+
+    Raises:
+        ValueError: if the cycle consumes its items at least as fast as it
+            produces them.
+    """
+    index_by_item_id = {item_id: index
+                        for index, item_id in enumerate(component)}
+    matrix = [[float(row == column) for column in range(len(component))]
+              for row in range(len(component))]
+    for column, item_id in enumerate(component):
+        count_produced = graph.counts_produced[item_id]
+        for edge in range(graph.ingredient_offsets[item_id],
+                          graph.ingredient_offsets[item_id + 1]):
+            row = index_by_item_id.get(graph.ingredient_ids[edge])
+            if row is not None:
+                matrix[row][column] -= (
+                    graph.ingredient_counts[edge] / count_produced)
+    external_rates = [sum(consumers_by_id.get(item_id, {}).values())
+                      for item_id in component]
+
+    rates = _solve_linear_system(matrix, external_rates)
+    if rates is None or any(rate < 0 for rate in rates):
+        raise ValueError(
+            'recipe cycle %s cannot be sustained' %
+            ', '.join(repr(graph.item_names[item_id]) for item_id in component))
+    return rates
+
+
+def _solve_linear_system(matrix, vector):
+    """Solves matrix * x = vector using Gaussian elimination.
+
+    Args:
+        matrix: A square matrix as a list of rows, which is modified.
+        vector: A list with one value per row of matrix.
+
+    Returns:
+        A list x or None if the matrix is singular.
+    """
+    size = len(vector)
+    vector = list(vector)
+    for column in range(size):
+        pivot = max(range(column, size),
+                    key=lambda row: abs(matrix[row][column]))
+        if abs(matrix[pivot][column]) < 1e-12:
+            return None
+        matrix[column], matrix[pivot] = matrix[pivot], matrix[column]
+        vector[column], vector[pivot] = vector[pivot], vector[column]
+        for row in range(column + 1, size):
+            factor = matrix[row][column] / matrix[column][column]
+            if factor:
+                for k in range(column, size):
+                    matrix[row][k] -= factor * matrix[column][k]
+                vector[row] -= factor * vector[column]
+
+    solution = [0] * size
+    for row in reversed(range(size)):
+        remainder = vector[row] - sum(matrix[row][k] * solution[k]
+                                      for k in range(row + 1, size))
+        solution[row] = remainder / matrix[row][row]
+    return solution
@@ -0,0 +1,151 @@
+"""An immutable collection of all of the data needed to plan production.
+
+A RecipeDatabase is built completely before it is published and is never
+modified afterwards, so requests that are running while new data is loaded
+keep using a consistent set of recipes, names and icons. Publishing a
+database is a single reference assignment and needs no lock.
+
+Functions that take an optional database argument (e.g.
+factorio.recipe.calculate_required_production_rates) use the most recently
+published database if none is given.
+"""
+
+import collections
+import threading
+
+_current_database = None
+_current_database_lock = threading.Lock()
+
+
+class RecipeDatabase(collections.namedtuple('RecipeDatabase', [
+        'recipes_by_name',
+        'recipes_by_single_result',
+        'compiled_graph',
+        'bill_of_materials',
+        'producers_by_category',
+        'item_names',
+        'recipe_names',
+        'icons'])):
+    """The recipes, producers, names and icons used to plan production.
+
+    The dictionaries in a RecipeDatabase must not be modified.
+
+    Attributes:
+        recipes_by_name: A dictionary mapping recipe names to Recipes.
+        recipes_by_single_result: A dictionary mapping item names to the
+            SingleResultRecipe that produces them.
+        compiled_graph: A factorio.recipe.CompiledRecipeGraph built from
+            recipes_by_single_result.
+        bill_of_materials: A factorio.recipe.BillOfMaterials for
+            compiled_graph.
+        producers_by_category: A dictionary mapping crafting categories to
+            tuples of the production.Producers that support them, fastest
+            first.
+        item_names: A dictionary mapping item names to English names.
+        recipe_names: A dictionary mapping recipe names to English names.
+        icons: A dictionary mapping item names to icon URLs.
+    """
+
+    __slots__ = ()
+
+    def with_recipe_tables(self, recipe_tables):
+        """Returns a copy of the database using the given recipes.
+
+        Args:
+            recipe_tables: A dictionary of recipe tables as returned by
+                factorio.recipe.Recipe.recipe_tables_from_json.
+        """
+        from factorio import recipe
+        return self._replace(
+            recipes_by_name=recipe_tables['recipes_by_name'],
+            recipes_by_single_result=recipe_tables['recipes_by_single_result'],
+            compiled_graph=recipe_tables['compiled_graph'],
+            bill_of_materials=recipe.BillOfMaterials(
+                recipe_tables['compiled_graph']))
+
+    def with_names(self, names):
+        """Returns a copy of the database using the given names.
+
+        Args:
+            names: A dictionary in the format of names.json.
+        """
+        return self._replace(item_names=names['item-names'],
+                             recipe_names=names['recipe-names'])
+
+    def with_icons(self, icons):
+        """Returns a copy of the database using the given icon URLs.
+
+        Args:
+            icons: A dictionary mapping item names to icon URLs.
+        """
+        return self._replace(icons=icons)
+
+
+def create_database(recipe_tables=None, names=None, icons=None,
+                    producers=None):
+    """Returns a new RecipeDatabase.
+
+    Args:
+        recipe_tables: A dictionary of recipe tables as returned by
+            factorio.recipe.Recipe.recipe_tables_from_json or None if there
+            are no recipes.
+        names: A dictionary in the format of names.json or None if there are
+            no English names.
+        icons: A dictionary mapping item names to icon URLs or None if there
+            are no icons.
+        producers: A sequence of production.Producers or None to use
+            production.PRODUCERS.
+    """
+    from factorio import production
+    from factorio import recipe
+
+    if producers is None:
+        producers = production.PRODUCERS
+    if recipe_tables is None:
+        recipe_tables = {
+            'recipes_by_name': {},
+            'recipes_by_single_result': {},
+            'compiled_graph': recipe.CompiledRecipeGraph({}),
+        }
+    database = RecipeDatabase(
+        recipes_by_name=None,
+        recipes_by_single_result=None,
+        compiled_graph=None,
+        bill_of_materials=None,
+        producers_by_category=production.create_producer_index(producers),
+        item_names={},
+        recipe_names={},
+        icons=icons or {})
+    database = database.with_recipe_tables(recipe_tables)
+    if names is not None:
+        database = database.with_names(names)
+    return database
+
+
+def create_database_from_snapshot(snapshot):
+    """Returns a new RecipeDatabase given a snapshot from factorio.snapshot."""
+    return create_database(recipe_tables=snapshot['recipes'],
+                           names=snapshot['names'],
+                           icons=snapshot['icons'])
+
+
+def get_current():
+    """Returns the most recently published RecipeDatabase.
+
+    If no database has been published then an empty one is published and
+    returned, so that every call returns the same database until another is
+    published.
+    """
+    database = _current_database
+    if database is None:
+        with _current_database_lock:
+            if _current_database is None:
+                publish(create_database())
+            database = _current_database
+    return database
+
+
+def publish(database):
+    """Makes the given RecipeDatabase the current one."""
+    global _current_database
+    _current_database = database
@@ -0,0 +1,63 @@
+"""Reads and writes precompiled snapshots of the extracted factorio data.
+
+A snapshot holds the parsed and indexed recipes, the name tables and the
+icon manifest in a single pickle so that they can be loaded without parsing
+JSON or walking the icon directory.
+"""
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+import json
+
+from factorio import recipe
+
+SNAPSHOT_FILE_NAME = 'snapshot.pickle'
+
+# Increment when the format of the snapshot or the pickled classes change.
+_SNAPSHOT_VERSION = 2
+
+
+def create_snapshot(recipes_json_stream, names_json_stream, icon_manifest):
+    """Returns a snapshot of the given data.
+
+    Args:
+        recipes_json_stream: A stream containing the recipe JSON data.
+        names_json_stream: A stream containing the name JSON data.
+        icon_manifest: A dictionary mapping item names to icon URLs.
+    """
+    return {
+        'version': _SNAPSHOT_VERSION,
+        'recipes': recipe.Recipe.recipe_tables_from_json(recipes_json_stream),
+        'names': json.load(names_json_stream),
+        'icons': icon_manifest,
+    }
+
+
+def write_snapshot(snapshot, snapshot_path):
+    """Writes a snapshot created by create_snapshot to a file."""
+    with open(snapshot_path, 'wb') as snapshot_file:
+        pickle.dump(snapshot, snapshot_file, pickle.HIGHEST_PROTOCOL)
+
+
+def read_snapshot(snapshot_path):
+    """Reads a snapshot written by write_snapshot.
+
+    Raises:
+        ValueError: if the snapshot was written by an incompatible version of
+            this module or cannot be unpickled e.g. because it is truncated.
+    """
+    with open(snapshot_path, 'rb') as snapshot_file:
+        try:
+            snapshot = pickle.load(snapshot_file)
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError,
+                IndexError, TypeError) as e:
+            raise ValueError('unreadable snapshot: %s' % e)
+    if not isinstance(snapshot, dict):
+        raise ValueError('unreadable snapshot: %r' % type(snapshot))
+    if snapshot.get('version') != _SNAPSHOT_VERSION:
+        raise ValueError('unsupported snapshot version %r' %
+                         snapshot.get('version'))
+    return snapshot
@@ -0,0 +1,74 @@
+"""Tests for factorio.matrix_solver."""
+
+from __future__ import division
+
+import os.path
+import unittest
+
+from factorio import matrix_solver
+from factorio import recipe
+from factorio import recipe_database
+
+
+@unittest.skipIf(matrix_solver.numpy is None, 'requires NumPy and SciPy')
+class TestMatrixSolver(unittest.TestCase):
+
+    def setUp(self):
+        recipe.Recipe.recipes_from_json(
+            open(os.path.join(os.path.dirname(__file__),
+                              'test-oil-recipe.json'), 'r'))
+        self.solver = matrix_solver.MatrixSolver(
+            recipe_database.get_current().recipes_by_name.values())
+
+    def assertRatesAlmostEqual(self, first, second):
+        self.assertEqual(sorted(first), sorted(second))
+        for recipe_name in first:
+            self.assertAlmostEqual(first[recipe_name], second[recipe_name])
+
+    def test_load_multiple_result_recipe(self):
+        oil_recipe = recipe.Recipe.get_recipe_by_name('advanced-oil-processing')
+        self.assertEqual(oil_recipe.category, 'oil-processing')
+        self.assertEqual(oil_recipe.crafting_time, 5)
+        self.assertEqual(oil_recipe.ingredients,
+                         {'crude-oil': 10, 'water': 5})
+        self.assertEqual(oil_recipe.results,
+                         {'heavy-oil': 1, 'light-oil': 4.5,
+                          'petroleum-gas': 5.5})
+
+    def test_solve_with_cracking(self):
+        # 'basic-oil-processing' produces 4 petroleum gas and 3 light oil per
+        # craft and the light oil is cracked into 2 more petroleum gas, so
+        # 6x = 11 crafts of each are needed.
+        self.assertRatesAlmostEqual(
+            self.solver.solve([('petroleum-gas', 11)]),
+            {'basic-oil-processing': 11 / 6, 'light-oil-cracking': 11 / 6})
+
+    def test_solve_with_byproduct(self):
+        # The 3 heavy oil that each 'basic-oil-processing' craft produces is
+        # turned into solid fuel rather than wasted.
+        self.assertRatesAlmostEqual(
+            self.solver.solve([('solid-fuel', 1)]),
+            {'basic-oil-processing': 2 / 9,
+             'solid-fuel-from-heavy-oil': 1 / 3,
+             'solid-fuel-from-light-oil': 2 / 3})
+
+    def test_solve_base_item(self):
+        self.assertEqual(self.solver.solve([('crude-oil', 10)]), {})
+
+    def test_solve_reuses_basis(self):
+        self.solver.solve([('petroleum-gas', 11)])
+        linprog = matrix_solver.optimize.linprog
+
+        def fail(*args, **kwargs):
+            self.fail('linprog called')
+        matrix_solver.optimize.linprog = fail
+        try:
+            rates = self.solver.solve([('petroleum-gas', 22)])
+        finally:
+            matrix_solver.optimize.linprog = linprog
+        self.assertRatesAlmostEqual(
+            rates,
+            {'basic-oil-processing': 11 / 3, 'light-oil-cracking': 11 / 3})
+
+if __name__ == '__main__':
+    unittest.main()
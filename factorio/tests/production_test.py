@@ -3,6 +3,7 @@
 import unittest
 
 from factorio import production
+from factorio import recipe
 
 class TestProduction(unittest.TestCase):
 
@@ -15,5 +16,69 @@ class TestProduction(unittest.TestCase):
             {'crafting', 'crafting-with-fluid', 'advanced-crafting'})
         self.assertEqual(assembling_machine_3.crafting_speed, 1.25)
 
+    def test_create_producer_index(self):
+        index = production.create_producer_index(production.PRODUCERS)
+        self.assertEqual([p.name for p in index['crafting']],
+                         ['assembling-machine-3',
+                          'assembling-machine-2',
+                          'assembling-machine-1'])
+        self.assertEqual([p.name for p in index['smelting']],
+                         ['electric-furnace'])
+        self.assertNotIn('mining', index)
+
+    def test_get_num_required(self):
+        # 1 gear every 0.5 time units.
+        gear_recipe = recipe.SingleResultRecipe(
+            'iron-gear-wheel', {'iron-plate': 2}, 'iron-gear-wheel', 'item')
+        producer = production.Producer('assembler', {'crafting'}, 1)
+        self.assertEqual(producer.get_num_required(gear_recipe, 2), 1)
+        self.assertEqual(producer.get_num_required(gear_recipe, 2.1), 2)
+        # 0.1 + 0.2 is slightly more than 0.3.
+        self.assertEqual(
+            producer.get_num_required(gear_recipe, (0.1 + 0.2) * 20), 3)
+
+
+class TestProducerPolicy(unittest.TestCase):
+
+    def setUp(self):
+        # 1 gear every 0.5 time units.
+        self.recipe = recipe.SingleResultRecipe(
+            'iron-gear-wheel', {'iron-plate': 2}, 'iron-gear-wheel', 'item')
+        self.ranked_producers = production.create_producer_index(
+            production.PRODUCERS)['crafting']
+
+    def test_fastest(self):
+        producer = production.FastestPolicy().select(
+            self.ranked_producers, self.recipe, 1)
+        self.assertEqual(producer.name, 'assembling-machine-3')
+
+    def test_fixed_tier(self):
+        producer = production.FixedTierPolicy('assembling-machine-2').select(
+            self.ranked_producers, self.recipe, 1)
+        self.assertEqual(producer.name, 'assembling-machine-2')
+
+    def test_fixed_tier_unsupported_category(self):
+        furnaces = production.create_producer_index(
+            production.PRODUCERS)['smelting']
+        producer = production.FixedTierPolicy('assembling-machine-2').select(
+            furnaces, self.recipe, 1)
+        self.assertEqual(producer.name, 'electric-furnace')
+
+    def test_fewest_machines(self):
+        policy = production.FewestMachinesPolicy()
+        # 1 assembling-machine-1 produces 1 gear per time unit.
+        self.assertEqual(
+            policy.select(self.ranked_producers, self.recipe, 1).name,
+            'assembling-machine-1')
+        # 2 assembling-machine-1s, but only 1 assembling-machine-2 (1.5 per
+        # time unit) are needed.
+        self.assertEqual(
+            policy.select(self.ranked_producers, self.recipe, 1.5).name,
+            'assembling-machine-2')
+        # Only 1 assembling-machine-3 (2.5 per time unit) is needed.
+        self.assertEqual(
+            policy.select(self.ranked_producers, self.recipe, 2).name,
+            'assembling-machine-3')
+
 if __name__ == '__main__':
     unittest.main()
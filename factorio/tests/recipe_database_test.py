@@ -0,0 +1,95 @@
+"""Tests for factorio.recipe_database."""
+
+import json
+import os.path
+import unittest
+import warnings
+
+from factorio import names
+from factorio import production
+from factorio import recipe
+from factorio import recipe_database
+
+
+class TestRecipeDatabase(unittest.TestCase):
+
+    def setUp(self):
+        with open(os.path.join(os.path.dirname(__file__),
+                               'test-recipe.json'), 'r') as recipe_json_file:
+            recipe_tables = recipe.Recipe.recipe_tables_from_json(
+                recipe_json_file)
+        with open(os.path.join(os.path.dirname(__file__),
+                               'test-names.json'), 'r') as names_json_file:
+            names_json = json.load(names_json_file)
+        self.database = recipe_database.create_database(
+            recipe_tables=recipe_tables,
+            names=names_json,
+            icons={'pipe': '/factorio-data/icons/pipe.png'})
+        self.original_database = recipe_database.get_current()
+        recipe_database.publish(recipe_database.create_database())
+
+    def tearDown(self):
+        recipe_database.publish(self.original_database)
+
+    def test_explicit_database(self):
+        self.assertEqual(
+            recipe.calculate_required_production_rates([('pipe', 2)],
+                                                       self.database),
+            [('iron-ore', {}, {'iron-plate': 2.0}),
+             ('iron-plate', {'iron-ore': 2.0}, {'pipe': 2.0}),
+             ('pipe', {'iron-plate': 2.0}, {None: 2})])
+        self.assertEqual(
+            names.get_best_item_name('basic-armor', self.database),
+            'Iron armor')
+
+        # The current database is empty so 'pipe' is a base item.
+        self.assertEqual(
+            recipe.calculate_required_production_rates([('pipe', 2)]),
+            [('pipe', {}, {None: 2})])
+        self.assertEqual(names.get_best_item_name('basic-armor'),
+                         'basic-armor')
+
+    def test_get_current_before_publish(self):
+        recipe_database.publish(None)
+        database = recipe_database.get_current()
+        self.assertEqual(database.recipes_by_name, {})
+        self.assertIs(recipe_database.get_current(), database)
+
+    def test_deprecated_class_attributes(self):
+        recipe_database.publish(self.database)
+        with warnings.catch_warnings(record=True) as caught_warnings:
+            warnings.simplefilter('always')
+            self.assertIs(recipe.Recipe.recipes_by_name,
+                          self.database.recipes_by_name)
+            self.assertIs(recipe.SingleResultRecipe.recipes_by_single_result,
+                          self.database.recipes_by_single_result)
+            self.assertEqual(
+                production.Producer.crafting_category_to_producers[
+                    'smelting'],
+                set(self.database.producers_by_category['smelting']))
+            production.Producer.init()
+        self.assertEqual(
+            [warning.category for warning in caught_warnings],
+            [DeprecationWarning] * 4)
+
+    def test_publish(self):
+        recipe_database.publish(self.database)
+        self.assertIs(recipe_database.get_current(), self.database)
+        self.assertEqual(
+            recipe.Recipe.get_recipe_by_name('pipe').ingredients,
+            {'iron-plate': 1})
+
+    def test_loading_does_not_modify_published_database(self):
+        recipe_database.publish(self.database)
+        with open(os.path.join(os.path.dirname(__file__),
+                               'test-cyclic-recipe.json'), 'r') as f:
+            recipe.Recipe.recipes_from_json(f)
+
+        self.assertIsNot(recipe_database.get_current(), self.database)
+        self.assertNotIn('pipe', recipe_database.get_current().recipes_by_name)
+        self.assertIn('pipe', self.database.recipes_by_name)
+        # The names are carried over to the new database.
+        self.assertEqual(names.get_best_item_name('basic-armor'), 'Iron armor')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,7 +3,13 @@
 import os.path
 import unittest
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from factorio import recipe
+from factorio import recipe_database
 
 class TestRecipe(unittest.TestCase):
 
@@ -47,6 +53,22 @@ class TestRecipe(unittest.TestCase):
         self.assertEqual(plastic_bar_recipe.result_type, 'item')
         self.assertEqual(plastic_bar_recipe.count_produced, 2)
 
+    def test_compiled_graph(self):
+        graph = recipe_database.get_current().compiled_graph
+        circuit_id = graph.item_ids['electronic-circuit']
+        self.assertEqual(graph.item_names[circuit_id], 'electronic-circuit')
+        start = graph.ingredient_offsets[circuit_id]
+        end = graph.ingredient_offsets[circuit_id + 1]
+        self.assertEqual(
+            sorted((graph.item_names[graph.ingredient_ids[edge]],
+                    graph.ingredient_counts[edge])
+                   for edge in range(start, end)),
+            [('copper-cable', 3), ('iron-plate', 1)])
+
+        iron_ore_id = graph.item_ids['iron-ore']
+        self.assertEqual(graph.ingredient_offsets[iron_ore_id],
+                         graph.ingredient_offsets[iron_ore_id + 1])
+
     def test_calculate_required_production_rates(self):
         required_rates = recipe.calculate_required_production_rates(
             [('electronic-circuit', 2)])
@@ -155,6 +177,138 @@ class TestRecipe(unittest.TestCase):
                'electronic-circuit': 5.0,
                'iron-gear-wheel': 10.0})])
 
+    def test_calculate_required_production_rates_multiple_items(self):
+        # 'iron-plate' is requested directly and is also an ingredient of
+        # 'iron-gear-wheel'.
+        required_rates = recipe.calculate_required_production_rates(
+            [('iron-gear-wheel', 2), ('iron-plate', 1), ('iron-gear-wheel', 1)])
+        self.assertEqual(
+            required_rates,
+            [('iron-gear-wheel', {'iron-plate': 6.0}, {None: 3}),
+             ('iron-ore', {}, {'iron-plate': 7.0}),
+             ('iron-plate',
+              {'iron-ore': 7.0},
+              {None: 1, 'iron-gear-wheel': 6.0})])
+
+    def test_bill_of_materials(self):
+        bill_of_materials = recipe_database.get_current().bill_of_materials
+        unit_requirements = bill_of_materials.get_unit_requirements('pipe')
+        self.assertEqual(
+            sorted(unit_requirements),
+            [('iron-ore', (), (('iron-plate', 1.0),)),
+             ('iron-plate', (('iron-ore', 1.0),), (('pipe', 1.0),)),
+             ('pipe', (('iron-plate', 1.0),), ((None, 1),))])
+        self.assertIs(bill_of_materials.get_unit_requirements('pipe'),
+                      unit_requirements)
+
+    def test_bill_of_materials_unknown_item(self):
+        bill_of_materials = recipe_database.get_current().bill_of_materials
+        self.assertEqual(
+            bill_of_materials.get_unit_requirements('unknown-item'),
+            (('unknown-item', (), ((None, 1),)),))
+        self.assertNotIn('unknown-item',
+                         bill_of_materials._item_to_unit_requirements)
+
+    @unittest.skipIf(numpy is None, 'requires NumPy')
+    def test_calculate_required_production_rates_batch(self):
+        item_names = ['basic-inserter', 'electronic-circuit', 'pipe']
+        rates = [[5, 0, 1], [0, 2, 0], [1, 1, 1]]
+        batch = recipe.calculate_required_production_rates_batch(
+            item_names, rates)
+        self.assertEqual(len(batch), 3)
+        self.assertEqual(batch.rates.shape, (3, len(batch.edges)))
+        self.assertEqual(
+            list(batch),
+            [recipe.calculate_required_production_rates(zip(item_names, row))
+             for row in rates])
+
+    @unittest.skipIf(numpy is None, 'requires NumPy')
+    def test_unit_matrix_cache_is_bounded(self):
+        bill_of_materials = recipe_database.get_current().bill_of_materials
+        for index in range(recipe.MAX_CACHED_UNIT_MATRICES + 10):
+            bill_of_materials.get_unit_matrix(['pipe', 'unknown-%d' % index])
+        self.assertEqual(len(bill_of_materials._item_names_to_unit_matrix),
+                         recipe.MAX_CACHED_UNIT_MATRICES)
+        edges, matrix = bill_of_materials.get_unit_matrix(['pipe'])
+        self.assertIs(bill_of_materials.get_unit_matrix(['pipe'])[1], matrix)
+
+    @unittest.skipIf(numpy is None, 'requires NumPy')
+    def test_unit_matrix_cannot_be_modified(self):
+        batch = recipe.calculate_required_production_rates_batch(
+            ['pipe'], [[1]])
+        self.assertIsInstance(batch.edges, tuple)
+        bill_of_materials = recipe_database.get_current().bill_of_materials
+        edges, matrix = bill_of_materials.get_unit_matrix(['pipe'])
+        self.assertIs(batch.edges, edges)
+        self.assertRaises(ValueError, matrix.__setitem__, (0, 0), 2)
+        self.assertEqual(
+            list(recipe.calculate_required_production_rates_batch(
+                ['pipe'], [[2]])),
+            [recipe.calculate_required_production_rates([('pipe', 2)])])
+
+    def test_calculate_required_production_rates_cycle(self):
+        recipe.Recipe.recipes_from_json(
+            open(os.path.join(os.path.dirname(__file__),
+                              'test-cyclic-recipe.json'), 'r'))
+        # Each 'scrap' needs 1 'recycled-plate' and each 'recycled-plate'
+        # needs 1/2 'scrap' so producing 1 'scrap' for the user requires
+        # producing 2 'scrap' and 2 'recycled-plate' in total.
+        required_rates = recipe.calculate_required_production_rates(
+            [('scrap', 1)])
+        self.assertEqual(
+            required_rates,
+            [('iron-ore', {}, {'iron-plate': 4.0}),
+             ('iron-plate', {'iron-ore': 4.0}, {'scrap': 4.0}),
+             ('recycled-plate', {'scrap': 1.0}, {'scrap': 2.0}),
+             ('scrap',
+              {'iron-plate': 4.0, 'recycled-plate': 2.0},
+              {None: 1, 'recycled-plate': 1.0})])
+
+    def test_calculate_required_production_rates_unsustainable_cycle(self):
+        recipe.Recipe.recipes_from_json(
+            open(os.path.join(os.path.dirname(__file__),
+                              'test-cyclic-recipe.json'), 'r'))
+        self.assertRaises(ValueError,
+                          recipe.calculate_required_production_rates,
+                          [('widget', 1)])
+
+    def test_iter_required_production_rates(self):
+        requested = [('basic-inserter', 5), ('pipe', 1), ('iron-plate', 2)]
+        required_rates = list(
+            recipe.iter_required_production_rates(requested))
+        self.assertEqual(
+            sorted(required_rates),
+            recipe.calculate_required_production_rates(requested))
+
+        # Every item is yielded after its consumers.
+        seen = set()
+        for item_name, _, consumers in required_rates:
+            for consumer_name in consumers:
+                if consumer_name is not None:
+                    self.assertIn(consumer_name, seen)
+            seen.add(item_name)
+
+    def test_count_required_items(self):
+        graph = recipe_database.get_current().compiled_graph
+        self.assertEqual(graph.count_required_items(['pipe']), 3)
+        self.assertEqual(graph.count_required_items(['pipe', 'unknown']), 4)
+        self.assertEqual(
+            graph.count_required_items(['pipe', 'iron-gear-wheel']),
+            len(recipe.calculate_required_production_rates(
+                [('pipe', 1), ('iron-gear-wheel', 1)])))
+
+    def test_compiled_graph_components(self):
+        recipe.Recipe.recipes_from_json(
+            open(os.path.join(os.path.dirname(__file__),
+                              'test-cyclic-recipe.json'), 'r'))
+        graph = recipe_database.get_current().compiled_graph
+        self.assertEqual(
+            sorted(sorted(graph.item_names[item_id] for item_id in component)
+                   for component in graph.cyclic_components.values()),
+            [['gadget', 'widget'], ['recycled-plate', 'scrap']])
+        self.assertLess(graph.component_ids[graph.item_ids['iron-plate']],
+                        graph.component_ids[graph.item_ids['scrap']])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,75 @@
+"""Tests for factorio.snapshot."""
+
+import os
+import os.path
+import shutil
+import tempfile
+import unittest
+
+from factorio import names
+from factorio import recipe
+from factorio import recipe_database
+from factorio import snapshot
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.snapshot_path = os.path.join(self.temp_dir,
+                                          snapshot.SNAPSHOT_FILE_NAME)
+        with open(os.path.join(os.path.dirname(__file__),
+                               'test-recipe.json'), 'r') as recipe_json_file:
+            with open(os.path.join(os.path.dirname(__file__),
+                                   'test-names.json'), 'r') as names_json_file:
+                snapshot.write_snapshot(
+                    snapshot.create_snapshot(
+                        recipe_json_file,
+                        names_json_file,
+                        {'pipe': '/factorio-data/icons/pipe.png'}),
+                    self.snapshot_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_read_snapshot(self):
+        data = snapshot.read_snapshot(self.snapshot_path)
+        self.assertEqual(data['icons'],
+                         {'pipe': '/factorio-data/icons/pipe.png'})
+
+        database = recipe_database.create_database_from_snapshot(data)
+        self.assertEqual(names.get_best_item_name('basic-armor', database),
+                         'Iron armor')
+        self.assertEqual(database.icons,
+                         {'pipe': '/factorio-data/icons/pipe.png'})
+
+        pipe_recipe = recipe.Recipe.get_recipe_by_single_result('pipe',
+                                                               database)
+        self.assertEqual(pipe_recipe.ingredients, {'iron-plate': 1})
+        self.assertEqual(
+            recipe.calculate_required_production_rates([('pipe', 2)],
+                                                       database),
+            [('iron-ore', {}, {'iron-plate': 2.0}),
+             ('iron-plate', {'iron-ore': 2.0}, {'pipe': 2.0}),
+             ('pipe', {'iron-plate': 2.0}, {None: 2})])
+
+    def test_read_snapshot_wrong_version(self):
+        data = snapshot.read_snapshot(self.snapshot_path)
+        data['version'] = -1
+        snapshot.write_snapshot(data, self.snapshot_path)
+        self.assertRaises(ValueError,
+                          snapshot.read_snapshot,
+                          self.snapshot_path)
+
+    def test_read_snapshot_truncated(self):
+        with open(self.snapshot_path, 'rb') as f:
+            contents = f.read()
+        for length in [0, len(contents) // 2]:
+            with open(self.snapshot_path, 'wb') as f:
+                f.write(contents[:length])
+            self.assertRaises(ValueError,
+                              snapshot.read_snapshot,
+                              self.snapshot_path)
+
+if __name__ == '__main__':
+    unittest.main()